@@ -1 +1 @@
-from fmlib.api.api import API
+from fmlib.api.api import API, register_middleware
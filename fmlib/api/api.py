@@ -3,11 +3,44 @@ send messages through the network using a variety of middlewares
 """
 
 import logging
+import time
+from importlib import import_module
 
-from fmlib.api.rest.interface import RESTInterface
-from fmlib.api.ros import ROSInterface
-from fmlib.api.zyre import ZyreInterface
-from fmlib.utils.messages import MessageFactory
+from fmlib.exceptions.config import InvalidConfig
+from fmlib.monitoring import metrics
+from fmlib.monitoring.tracing import tracer
+from fmlib.utils.messages import Message, MessageFactory
+
+# Interfaces are imported the first time a configuration uses them, so that
+# components do not pay for importing middlewares they do not use
+_middlewares = {'zyre': 'fmlib.api.zyre.ZyreInterface',
+                'ros': 'fmlib.api.ros.ROSInterface',
+                'rest': 'fmlib.api.rest.interface.RESTInterface'}
+
+
+def register_middleware(name, interface):
+    """Registers a middleware that can be configured in the API
+
+    Args:
+        name: The option used in the API configuration
+        interface: The interface class, or its dotted path to import it on first use.
+                   The class is instantiated with the option's configuration as keyword arguments
+    """
+    _middlewares[name] = interface
+
+
+def get_middleware(name):
+    """Returns the interface class of a middleware, importing it if needed
+    """
+    interface = _middlewares.get(name)
+    if interface is None:
+        raise InvalidConfig("Unknown middleware %s, registered middlewares are %s" % (name, list(_middlewares)))
+
+    if isinstance(interface, str):
+        module_name, class_name = interface.rsplit('.', 1)
+        interface = getattr(import_module(module_name), class_name)
+        _middlewares[name] = interface
+    return interface
 
 
 class API:
@@ -22,6 +55,7 @@ class API:
             publish_dict: A dictionary that maps
             middleware_collection: A list of supported middlewares obtained from the config file
             config_params: A dictionary containing the parameters loaded from the config file
+            metrics: Enables the fmlib.monitoring.metrics registry if True
             _mf: An object of type MessageFactory to create message templates
     """
 
@@ -35,6 +69,9 @@ class API:
         self._configure(kwargs)
         self._mf = MessageFactory(kwargs.get('schema', 'unknown'))
 
+        if kwargs.get('metrics', False):
+            metrics.enable()
+
         self.logger.info("Initialized API")
 
     def publish(self, msg, **kwargs):
@@ -50,7 +87,13 @@ class API:
             self.logger.error("Could not get message type from message: %s", msg, exc_info=True)
             return
 
+        # Share one message object, so it is serialized once for every middleware
+        if not isinstance(msg, Message):
+            msg = Message.from_dict(msg)
+
         self.logger.debug("Publishing message of type %s", msg_type)
+        if metrics.registry.enabled:
+            tracer.published(msg)
 
         for option in self.middleware_collection:
             try:
@@ -58,12 +101,19 @@ class API:
                 if not option_dict:
                     continue
                 method = option_dict.get(msg_type.lower()).get('method')
-            except ValueError:
-                self.logger.error("No method defined for message % in option %s", msg_type, option)
+            except (AttributeError, ValueError):
+                self.logger.error("No method defined for message %s in option %s", msg_type, option)
                 continue
 
             self.logger.debug('Using method %s to publish message using %s', method, option)
+            if not metrics.registry.enabled:
+                getattr(self.__dict__[option], method)(msg, **kwargs)
+                continue
+
+            start = time.perf_counter()
             getattr(self.__dict__[option], method)(msg, **kwargs)
+            metrics.api_publish_seconds.observe(time.perf_counter() - start, msg_type, option)
+            metrics.api_published.inc(msg_type, option)
 
     def _configure(self, config_params):
         for option in self.middleware_collection:
@@ -75,13 +125,7 @@ class API:
                 continue
 
             self.logger.debug("Configuring %s API", option)
-            interface = None
-            if option == 'zyre':
-                interface = self.get_zyre_api(config)
-            elif option == 'ros':
-                interface = self.get_ros_api(config)
-            elif option == 'rest':
-                interface = self.get_rest_api(config)
+            interface = self.get_api(option, config)
 
             self.__dict__[option] = interface
             self.interfaces.append(interface)
@@ -90,6 +134,19 @@ class API:
 
         self.logger.debug("Publish dictionary: %s", self.publish_dict)
 
+    @classmethod
+    def get_api(cls, option, config):
+        """Create an interface of a registered middleware
+
+        Args:
+            option: The name the middleware was registered with
+            config: A dictionary containing the API configuration
+
+        Returns:
+            A configured interface object
+        """
+        return get_middleware(option)(**config)
+
     @classmethod
     def get_zyre_api(cls, zyre_config):
         """Create an object of type ZyreInterface
@@ -101,7 +158,7 @@ class API:
             A configured ZyreInterface object
 
         """
-        zyre_api = ZyreInterface(**zyre_config)
+        zyre_api = get_middleware('zyre')(**zyre_config)
         return zyre_api
 
     @classmethod
@@ -114,7 +171,7 @@ class API:
         Returns:
             A configured ROSInterface object
         """
-        return ROSInterface(**ros_config)
+        return get_middleware('ros')(**ros_config)
 
     @classmethod
     def get_rest_api(cls, rest_config):
@@ -127,7 +184,7 @@ class API:
             A configured RESTInterface object
 
         """
-        return RESTInterface(**rest_config)
+        return get_middleware('rest')(**rest_config)
 
     def register_callbacks(self, obj, callback_config=None):
         for option in self.middleware_collection:
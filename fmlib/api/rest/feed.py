@@ -0,0 +1,208 @@
+"""Streaming feed of task status changes
+
+Every status or progress update of a TaskStatus is numbered and fanned out
+once to all connected clients. Clients receive the changes either as
+server-sent events or as JSON lines, and can resume after a disconnect from
+the last sequence number they saw.
+
+The feed lives in the process that updates the tasks, and every client
+holds a request thread for as long as it is connected, so the REST interface
+serving it must run in ``threaded`` mode. In ``simple`` mode one stream
+blocks the only thread, and the forked gunicorn workers never receive the
+events, so RESTInterface rejects the stream in these modes.
+"""
+import json
+import logging
+import threading
+from collections import deque
+
+import falcon
+
+from fmlib.models.events import event_bus, TaskProgressUpdated, TaskStatusChanged
+from fmlib.utils.messages import format_msg
+
+
+class Subscription(object):
+    """Bounded buffer of the changes not yet sent to a client
+
+    When the client is too slow the oldest changes are dropped, the client
+    is told how many were lost and can resume from the feed history.
+    """
+
+    def __init__(self, buffer_size=100):
+        self._buffer = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, entry):
+        with self._condition:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(entry)
+            self._condition.notify()
+
+    def close(self):
+        """Wakes up the client, which ends its stream after the buffered changes
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def get(self, timeout=None):
+        """Returns all buffered changes, waiting up to timeout seconds for one to arrive
+
+        Returns:
+            entries (list): A list of (sequence, event, data) tuples
+            dropped (int): The number of changes dropped since the last call
+        """
+        with self._condition:
+            if not self._buffer and not self.closed:
+                self._condition.wait(timeout)
+            entries = list(self._buffer)
+            self._buffer.clear()
+            dropped, self.dropped = self.dropped, 0
+        return entries, dropped
+
+
+class ChangeFeed(object):
+    """Numbers changes and fans them out to the subscribed clients
+
+    Args:
+        history_size: Number of changes kept to resume subscriptions
+    """
+
+    def __init__(self, history_size=1000):
+        self.logger = logging.getLogger('fms.api.rest.feed')
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._history = deque(maxlen=history_size)
+        self._subscriptions = set()
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def publish(self, event, data):
+        with self._lock:
+            self._sequence += 1
+            entry = (self._sequence, event, data)
+            self._history.append(entry)
+            subscriptions = list(self._subscriptions)
+
+        for subscription in subscriptions:
+            subscription.put(entry)
+
+    def subscribe(self, since=None, buffer_size=100):
+        """Creates a subscription, replaying the changes after sequence number since
+        """
+        subscription = Subscription(buffer_size)
+        with self._lock:
+            if since is not None:
+                missed = [entry for entry in self._history if entry[0] > since]
+                if self._history and since < self._history[0][0] - 1:
+                    subscription.dropped = self._history[0][0] - 1 - since
+                for entry in missed:
+                    subscription.put(entry)
+            self._subscriptions.add(subscription)
+        self.logger.debug("Added subscription, %s clients connected", len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+        self.logger.debug("Removed subscription, %s clients connected", len(self._subscriptions))
+
+    def close(self):
+        """Ends the streams of all connected clients, e.g. when the server shuts down
+
+        Clients connecting afterwards are subscribed as usual.
+        """
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, set()
+        for subscription in subscriptions:
+            subscription.close()
+        self.logger.debug("Closed %s subscriptions", len(subscriptions))
+
+    def on_task_status(self, event):
+        if event.model is not None:
+            self.publish('task-status', format_msg(event.model.to_dict()))
+
+
+task_feed = ChangeFeed()
+
+
+class TaskStatusStream(object):
+    """Streams task status changes
+
+    The stream is sent as server-sent events, or as JSON lines when the
+    ``format=jsonl`` query parameter is given. Clients resume with the
+    Last-Event-ID header or the ``since`` query parameter.
+    """
+
+    # REST interface modes the stream can be served in
+    server_modes = ['threaded']
+
+    def __init__(self, feed=None, buffer_size=100, heartbeat=15, **kwargs):
+        self.feed = feed or task_feed
+        self.buffer_size = buffer_size
+        self.heartbeat = heartbeat
+        event_bus.subscribe(TaskStatusChanged, self.feed.on_task_status)
+        event_bus.subscribe(TaskProgressUpdated, self.feed.on_task_status)
+
+    def on_get(self, request, response):
+        since = request.get_header('Last-Event-ID') or request.get_param('since')
+        try:
+            since = int(since) if since is not None else None
+        except ValueError:
+            raise falcon.HTTPBadRequest(title='Invalid sequence number',
+                                        description='%s is not a sequence number' % since)
+
+        if request.get_param('format') == 'jsonl':
+            response.content_type = 'application/x-ndjson'
+            encode = self._encode_jsonl
+            heartbeat = b'\n'
+        else:
+            response.content_type = 'text/event-stream'
+            encode = self._encode_sse
+            heartbeat = b': keep-alive\n\n'
+
+        response.set_header('Cache-Control', 'no-cache')
+        subscription = self.feed.subscribe(since, self.buffer_size)
+        response.stream = self._stream(subscription, encode, heartbeat)
+
+    def close(self):
+        """Ends the open streams, called by RESTInterface on shutdown
+        """
+        self.feed.close()
+
+    def _stream(self, subscription, encode, heartbeat):
+        try:
+            while True:
+                entries, dropped = subscription.get(self.heartbeat)
+                if dropped:
+                    yield encode((None, 'overflow', {'dropped': dropped}))
+                for entry in entries:
+                    yield encode(entry)
+                if subscription.closed:
+                    break
+                if not entries and not dropped:
+                    yield heartbeat
+        finally:
+            self.feed.unsubscribe(subscription)
+
+    @staticmethod
+    def _encode_sse(entry):
+        sequence, event, data = entry
+        lines = list()
+        if sequence is not None:
+            lines.append('id: %s' % sequence)
+        lines.append('event: %s' % event)
+        lines.append('data: %s' % json.dumps(data, default=str))
+        return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+    @staticmethod
+    def _encode_jsonl(entry):
+        sequence, event, data = entry
+        line = json.dumps({'seq': sequence, 'event': event, 'data': data}, default=str)
+        return (line + '\n').encode('utf-8')
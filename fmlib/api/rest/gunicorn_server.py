@@ -0,0 +1,26 @@
+import logging
+
+import gunicorn.app.base
+
+
+class GunicornServer(gunicorn.app.base.BaseApplication):
+    def __init__(self, app, options=None):
+        self.options = options or {}
+        self.application = app
+        super(GunicornServer, self).__init__()
+        self.logger = logging.getLogger('fms.api.rest.gunicorn')
+
+    def load_config(self):
+        config = dict([(key, value) for key, value in self.options.items()
+                       if key in self.cfg.settings and value is not None])
+        for key, value in config.items():
+            self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return self.application
+
+    def init(self, **kwargs):
+        self.logger.info("Initialised REST interface")
+
+    def start(self):
+        self.run()
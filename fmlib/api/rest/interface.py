@@ -1,48 +1,55 @@
 import falcon
 import logging
+import multiprocessing
+import socketserver
 import threading
 
 from importlib import import_module
 from wsgiref import simple_server
 
-import gunicorn.app.base
-from gunicorn.six import iteritems
 
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, simple_server.WSGIServer):
+    """WSGI server that handles each request in its own thread, so slow
+    resources do not block other clients
+    """
+    daemon_threads = True
 
-class GunicornServer(gunicorn.app.base.BaseApplication):
-    def __init__(self, app, options=None):
-        self.options = options or {}
-        self.application = app
-        super(GunicornServer, self).__init__()
-        self.logger = logging.getLogger('fms.api.rest.gunicorn')
 
-    def load_config(self):
-        config = dict([(key, value) for key, value in iteritems(self.options)
-                       if key in self.cfg.settings and value is not None])
-        for key, value in iteritems(config):
-            self.cfg.set(key.lower(), value)
+class RESTInterface(object):
+    """Serves falcon resources over HTTP
 
-    def load(self):
-        return self.application
+    The ``server`` configuration selects the backend through its ``mode`` key:
 
-    def init(self, **kwargs):
-        self.logger.info("Initialised REST interface")
+        * ``simple``: single threaded ``wsgiref`` server (default)
+        * ``threaded``: ``wsgiref`` server with one thread per request
+        * ``gunicorn``: gunicorn arbiter running in a child process, configured
+          with ``workers``, ``threads``, ``keepalive`` and ``timeout``
 
-    def start(self):
-        self.run()
+    Resources with a ``server_modes`` attribute can only be routed in these
+    modes, e.g. the streams of the feed module. Resources with a ``close``
+    method are closed on shutdown, e.g. to end the open streams.
 
+    Args:
+        server: A dictionary with the server configuration
+    """
+
+    server_modes = ['simple', 'threaded', 'gunicorn']
 
-class RESTInterface(object):
     def __init__(self, server, **kwargs):
         self.server_config = server
         self.ip = server.get('ip', '127.0.0.1')
         self.port = server.get('port', 8080)
+        self.mode = server.get('mode', 'simple')
         self.logger = logging.getLogger('fms.api.rest')
+        if self.mode not in self.server_modes:
+            raise ValueError("Unknown server mode %s, expected one of %s" % (self.mode, self.server_modes))
+
         self.app = falcon.API()
-        self.server = simple_server.make_server(self.ip, self.port, self.app)
+        self.server = None
         self.threads = list()
+        self.resources = list()
         self._configure(**kwargs)
-        self.logger.info("Initialized REST interface")
+        self.logger.info("Initialized REST interface in %s mode", self.mode)
 
     def _configure(self, **kwargs):
         routes = kwargs.get('routes', list())
@@ -54,11 +61,47 @@ class RESTInterface(object):
             self.add_route(path, resource_class, **kwargs)
 
     def add_route(self, route, resource, **kwargs):
+        modes = getattr(resource, 'server_modes', None)
+        if modes is not None and self.mode not in modes:
+            raise ValueError("%s can not be served in %s mode, expected one of %s"
+                             % (resource.__name__, self.mode, modes))
         resource_instance = resource(**kwargs)
         self.app.add_route(route, resource_instance)
+        self.resources.append(resource_instance)
+
+    def _make_server(self):
+        if self.mode == 'threaded':
+            return simple_server.make_server(self.ip, self.port, self.app,
+                                             server_class=ThreadingWSGIServer)
+        return simple_server.make_server(self.ip, self.port, self.app)
+
+    def _gunicorn_options(self):
+        workers = self.server_config.get('workers', multiprocessing.cpu_count() * 2 + 1)
+        threads = self.server_config.get('threads', 1)
+        keepalive = self.server_config.get('keepalive', 2)
+        # The sync worker closes every connection, keep-alive needs the threaded worker
+        worker_class = 'gthread' if threads > 1 or keepalive else 'sync'
+        return {'bind': '%s:%s' % (self.ip, self.port),
+                'workers': workers,
+                'threads': threads,
+                'keepalive': keepalive,
+                'worker_class': worker_class,
+                'timeout': self.server_config.get('timeout', 30),
+                'graceful_timeout': self.server_config.get('graceful_timeout', 5)}
+
+    def _serve_gunicorn(self):
+        # gunicorn is only imported when it is used
+        from fmlib.api.rest.gunicorn_server import GunicornServer
+        GunicornServer(self.app, self._gunicorn_options()).start()
 
     def start(self):
-        x = threading.Thread(target=self.server.serve_forever)
+        if self.mode == 'gunicorn':
+            # The gunicorn arbiter installs signal handlers, so it cannot run in a thread
+            x = multiprocessing.get_context('fork').Process(target=self._serve_gunicorn,
+                                                            name='fms-rest-gunicorn')
+        else:
+            self.server = self._make_server()
+            x = threading.Thread(target=self.server.serve_forever, name='fms-rest')
         self.threads.append(x)
         try:
             x.start()
@@ -66,8 +109,30 @@ class RESTInterface(object):
             self.logger.info('Terminating REST interface')
 
     def shutdown(self):
-        self.server.shutdown()
-        self.threads[0].join()
+        if not self.threads:
+            return
+
+        # Streaming requests would otherwise keep their threads forever
+        for resource in self.resources:
+            if hasattr(resource, 'close'):
+                resource.close()
+
+        if self.mode == 'gunicorn':
+            process = self.threads[0]
+            # SIGTERM triggers a graceful shutdown of the gunicorn workers
+            process.terminate()
+            process.join(self.server_config.get('graceful_timeout', 5) + 1)
+            if process.is_alive():
+                self.logger.warning("Gunicorn did not stop in time, killing it")
+                process.kill()
+                process.join()
+        else:
+            self.server.shutdown()
+            self.threads[0].join()
+            self.server.server_close()
+
+        self.threads = list()
+        self.logger.info('Terminated REST interface')
 
     def run(self):
         pass
@@ -80,5 +145,5 @@ if __name__ == '__main__':
     # from fleet_management.config.loader import Config
     #config = Config(initialize=False)
     # config.configure_logger()
-    api = RESTInterface(ip='127.0.0.1', port=8080)
+    api = RESTInterface({'ip': '127.0.0.1', 'port': 8080})
     api.start()
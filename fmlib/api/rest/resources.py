@@ -1,11 +1,29 @@
+import hashlib
+import json
 import os
+import threading
 import time
 import random
+import uuid
+from datetime import datetime
 
-waitTime = int(os.environ.get('WAIT_TIME', '2'))
+import falcon
+import inflection
+from falcon.util import dt_to_http
+
+from fmlib.models.robot import Robot
+from fmlib.models.tasks import Task, TaskStatus
+from fmlib.monitoring import metrics
+from fmlib.monitoring.db_profiler import profiler
+from fmlib.utils.messages import format_msg
+
+waitTime = float(os.environ.get('WAIT_TIME', '2'))
 
 
 class RandomGenerator(object):
+    def __init__(self, **kwargs):
+        pass
+
     def on_get(self, request, response):
         time.sleep(waitTime)
         number = random.randint(0, 100)
@@ -13,3 +31,187 @@ class RandomGenerator(object):
         response.media = result
 
 
+class CachedResponse(object):
+
+    def __init__(self, body, last_modified):
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+        self.created = time.monotonic()
+
+    def not_modified(self, request):
+        if_none_match = request.get_header('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or \
+                self.etag in [tag.strip() for tag in if_none_match.split(',')]
+
+        if_modified_since = request.get_header_as_datetime('If-Modified-Since')
+        if if_modified_since is not None:
+            return self.last_modified <= if_modified_since.replace(tzinfo=None)
+
+        return False
+
+
+class ResponseCache(object):
+    """Keeps serialized responses for ``ttl`` seconds
+
+    Expired entries are kept until they are replaced, so that a response that
+    did not change keeps its original Last-Modified date.
+    """
+
+    def __init__(self, ttl=1.0, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created < self.ttl:
+            return entry
+
+        body = compute()
+        if entry is not None and entry.body == body:
+            last_modified = entry.last_modified
+        else:
+            last_modified = datetime.utcnow().replace(microsecond=0)
+        new_entry = CachedResponse(body, last_modified)
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._prune()
+            self._entries[key] = new_entry
+        return new_entry
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry.created >= self.ttl]
+        for key in expired or list(self._entries):
+            self._entries.pop(key)
+
+
+class ModelCollection(object):
+    """Read only resource listing the documents of a model
+
+    Query parameters:
+        limit: number of items per page
+        cursor: id of the last item of the previous page, as returned in ``next``
+        fields: comma separated list of fields to include in each item
+
+    Responses carry an ETag and a Last-Modified header, conditional requests
+    get a 304 while the content does not change.
+    """
+
+    model = None
+    id_type = str
+
+    def __init__(self, cache_ttl=1.0, page_size=50, max_page_size=500, **kwargs):
+        self.cache = ResponseCache(cache_ttl)
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+
+    def on_get(self, request, response):
+        limit = request.get_param_as_int('limit', min_value=1, max_value=self.max_page_size)
+        if limit is None:
+            limit = self.page_size
+        cursor = request.get_param('cursor')
+        fields = request.get_param('fields')
+        if fields:
+            fields = [field.strip() for field in fields.split(',')]
+
+        key = (cursor, limit, tuple(fields) if fields else None)
+        entry = self.cache.get(key, lambda: self.get_page(cursor, limit, fields))
+
+        response.set_header('ETag', entry.etag)
+        response.set_header('Last-Modified', dt_to_http(entry.last_modified))
+        response.set_header('Cache-Control', 'no-cache')
+
+        if entry.not_modified(request):
+            response.status = falcon.HTTP_304
+            return
+
+        response.content_type = falcon.MEDIA_JSON
+        response.data = entry.body
+
+    def get_page(self, cursor, limit, fields=None):
+        query = dict()
+        if cursor is not None:
+            query['_id'] = {'$gt': self._parse_cursor(cursor)}
+
+        queryset = self.model.objects.raw(query).order_by([('_id', 1)]).limit(limit + 1)
+        if fields:
+            # Only the requested fields are loaded
+            queryset = queryset.only(*self._projection(fields))
+        documents = list(queryset)
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = str(documents[-1].pk)
+
+        items = [self._project(format_msg(document.to_dict()), fields) for document in documents]
+        return json.dumps({'items': items, 'next': next_cursor}, default=str).encode('utf-8')
+
+    def _projection(self, fields):
+        """Returns the MongoDB names of the requested fields, the id is always returned
+        """
+        meta = self.model._mongometa
+        names = ['_id']
+        for field in fields:
+            model_field = meta.get_field_from_attname(inflection.underscore(field))
+            if model_field is not None and not model_field.primary_key:
+                names.append(model_field.mongo_name)
+        return names
+
+    def _parse_cursor(self, cursor):
+        try:
+            return self.id_type(cursor)
+        except ValueError:
+            raise falcon.HTTPBadRequest(title='Invalid cursor',
+                                        description='Cursor %s is not a valid id' % cursor)
+
+    @staticmethod
+    def _project(item, fields):
+        if not fields:
+            return item
+        return {field: item[field] for field in fields if field in item}
+
+
+class Tasks(ModelCollection):
+    model = Task
+    id_type = uuid.UUID
+
+
+class TaskStatuses(ModelCollection):
+    model = TaskStatus
+    id_type = uuid.UUID
+
+
+class Robots(ModelCollection):
+    model = Robot
+
+
+class Metrics(object):
+    """Exposes the fmlib.monitoring.metrics registry in the Prometheus text format
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry=None, **kwargs):
+        self.registry = registry or metrics.registry
+
+    def on_get(self, request, response):
+        response.content_type = self.content_type
+        response.data = self.registry.render().encode('utf-8')
+
+
+class DBProfile(object):
+    """Reports the slowest and most frequent MongoDB call sites of the fmlib models
+    """
+
+    def __init__(self, **kwargs):
+        self.profiler = profiler
+
+    def on_get(self, request, response):
+        top = request.get_param_as_int('top', min_value=1)
+        response.media = self.profiler.report(top or 10)
@@ -1,14 +1,106 @@
 import logging
+import queue
+from datetime import datetime
 from importlib import import_module
 
+import dateutil.parser
+import inflection
 import rospy
 
-from rospy_message_converter import message_converter
+ROS_PRIMITIVE_TYPES = {'bool', 'byte', 'char', 'int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32',
+                       'int64', 'uint64', 'float32', 'float64', 'string'}
+
+
+def get_ros_msg_class(msg_type, msg_module):
+    msg_module = import_module(msg_module)
+    return getattr(msg_module, msg_type)
+
+
+def _to_ros_time(time_class):
+    def convert(value):
+        if isinstance(value, dict):
+            return time_class(value.get('secs', 0), value.get('nsecs', 0))
+        if isinstance(value, str):
+            value = dateutil.parser.parse(value)
+        if isinstance(value, datetime):
+            value = value.timestamp()
+        return time_class.from_sec(value)
+    return convert
+
+
+class ROSMessageConverter:
+    """Converts fmlib dictionaries to instances of a ROS message class
+
+    The message definition is inspected once, when the converter is created.
+    Fields are looked up in the dictionary by their ROS name and by its
+    camel case version, which is the one used in fmlib messages.
+    """
+
+    _converters = dict()
+
+    def __init__(self, msg_class):
+        self.msg_class = msg_class
+        self._fields = list()
+        for slot, slot_type in zip(msg_class.__slots__, msg_class._slot_types):
+            keys = (slot, inflection.camelize(slot, False))
+            base_type, is_array = self._split_array_type(slot_type)
+            self._fields.append((slot, keys, self._get_field_converter(base_type), is_array))
+
+    @classmethod
+    def get(cls, msg_type, msg_module):
+        """Returns the converter for a message type, creating it on first use
+        """
+        key = (msg_module, msg_type)
+        converter = cls._converters.get(key)
+        if converter is None:
+            converter = cls(get_ros_msg_class(msg_type, msg_module))
+            cls._converters[key] = converter
+        return converter
+
+    @staticmethod
+    def _split_array_type(slot_type):
+        if slot_type.endswith(']'):
+            return slot_type[:slot_type.index('[')], True
+        return slot_type, False
+
+    @classmethod
+    def _get_field_converter(cls, base_type):
+        if base_type in ROS_PRIMITIVE_TYPES:
+            return None
+        if base_type == 'time':
+            return _to_ros_time(rospy.Time)
+        if base_type == 'duration':
+            return _to_ros_time(rospy.Duration)
+        if base_type == 'Header':
+            base_type = 'std_msgs/Header'
+        package, msg_type = base_type.split('/')
+        return cls.get(msg_type, package + '.msg')
+
+    def __call__(self, msg_dict):
+        msg = self.msg_class()
+        for slot, keys, convert, is_array in self._fields:
+            for key in keys:
+                if key in msg_dict:
+                    value = msg_dict[key]
+                    break
+            else:
+                continue
+
+            if convert is not None and value is not None:
+                if is_array:
+                    value = [convert(item) for item in value]
+                else:
+                    value = convert(value)
+            setattr(msg, slot, value)
+        return msg
 
 
 class ROSInterface:
     """
     ROSInterface.
+
+    Messages given to publish are queued, converted and published in batches
+    of ``batch_size`` messages every time the interface runs.
     """
 
     def __init__(self, **kwargs):
@@ -16,6 +108,10 @@ class ROSInterface:
         rospy.init_node('fms_ros_api', anonymous=False, disable_signals=True)
         self.logger = logging.getLogger('fms.api.ros')
         self._publisher_dict = dict()
+        self._converter_dict = dict()
+        self.publish_dict = kwargs.get('publish', dict())
+        self._outbound = queue.Queue(maxsize=kwargs.get('queue_size', 1000))
+        self._batch_size = kwargs.get('batch_size', 100)
 
         rospy.on_shutdown(self.shutdown)
         self._configure(**kwargs)
@@ -32,11 +128,11 @@ class ROSInterface:
             self.add_subscriber(**subscriber)
 
     def _get_ros_msg(self, msg_type, msg_module):
-        msg_module = import_module(msg_module)
-        return getattr(msg_module, msg_type)
+        return get_ros_msg_class(msg_type, msg_module)
 
-    def add_publisher(self, topic, msg_type, msg_module):
+    def add_publisher(self, topic, msg_type, msg_module, payload_only=True):
         msg = self._get_ros_msg(msg_type, msg_module)
+        self._converter_dict[topic] = (ROSMessageConverter.get(msg_type, msg_module), payload_only)
         return rospy.Publisher(topic, msg, queue_size=50)
 
     def add_subscriber(self, topic, msg_type, msg_module, callback):
@@ -44,6 +140,56 @@ class ROSInterface:
         callback = getattr(self, callback)
         return rospy.Subscriber(topic, msg, callback)
 
+    def publish(self, msg, topic=None, **kwargs):
+        """Queues an fmlib message to be published on a ROS topic
+
+        Args:
+            msg: A dictionary with a header and a payload
+            topic: The topic to publish to. If not given, the topic configured
+                   for the message type in the publish dictionary is used
+        """
+        if topic is None:
+            msg_type = msg.get('header', dict()).get('type', '')
+            topic = self.publish_dict.get(msg_type.lower(), dict()).get('topic')
+
+        if topic not in self._publisher_dict:
+            self.logger.error("No publisher configured for topic %s", topic)
+            return
+
+        try:
+            self._outbound.put_nowait((topic, msg))
+        except queue.Full:
+            self.logger.warning("Outbound queue is full, dropping message for %s", topic)
+
+    def flush(self, max_messages=None):
+        """Converts and publishes the queued messages
+
+        Args:
+            max_messages: Maximum number of messages to publish, all queued
+                          messages are published if None
+        """
+        published = 0
+        while max_messages is None or published < max_messages:
+            try:
+                topic, msg = self._outbound.get_nowait()
+            except queue.Empty:
+                break
+            converter, payload_only = self._converter_dict[topic]
+            try:
+                ros_msg = converter(msg.get('payload') if payload_only else msg)
+            except (AttributeError, TypeError, ValueError):
+                self.logger.error("Could not convert message for topic %s", topic, exc_info=True)
+                continue
+            try:
+                self._publisher_dict[topic].publish(ros_msg)
+            except rospy.ROSInterruptException:
+                raise
+            except rospy.ROSException:
+                self.logger.error("Could not publish message on topic %s", topic, exc_info=True)
+                continue
+            published += 1
+        return published
+
     def start(self):
         rospy.loginfo("Started ROS interface of rospy")
         self.logger.error("Started ROS interface!")
@@ -55,8 +201,7 @@ class ROSInterface:
     def run(self):
         if not rospy.is_shutdown():
             try:
-                #self.logger.info('Running')
-                pass
+                self.flush(self._batch_size)
             except (rospy.ROSInterruptException, KeyboardInterrupt):
                 rospy.logerr("Terminating node")
                 self.logger.error('Terminating ROS interface')
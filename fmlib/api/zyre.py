@@ -1,7 +1,12 @@
 import logging
+import time
 
 from ropod.pyre_communicator.base_class import RopodPyre
 
+from fmlib.monitoring import metrics
+from fmlib.monitoring.tracing import tracer
+from fmlib.utils.messages import Message
+
 
 class ZyreInterface(RopodPyre):
     def __init__(self, zyre_node, logger_name='fms.api.zyre', **kwargs):
@@ -19,6 +24,7 @@ class ZyreInterface(RopodPyre):
         self.callback_dict[msg_type] = function.__name__
 
     def receive_msg_cb(self, msg_content):
+        received = time.perf_counter()
         dict_msg = self.convert_zyre_msg_to_dict(msg_content)
         if dict_msg is None:
             self.logger.warning("Message is not a dictionary")
@@ -43,11 +49,33 @@ class ZyreInterface(RopodPyre):
                               message_type, self.callback_dict)
 
         try:
-            if callback:
+            if callback and metrics.registry.enabled:
+                context = tracer.received(dict_msg, received)
+                tracer.callback_started(context)
+                start = time.perf_counter()
+                try:
+                    getattr(self, callback)(dict_msg)
+                finally:
+                    tracer.finished(context)
+                metrics.zyre_callback_seconds.observe(time.perf_counter() - start, message_type, callback)
+                metrics.zyre_received.inc(message_type, callback)
+            elif callback:
                 getattr(self, callback)(dict_msg)
         except AttributeError:
             self.logger.error("Could not execute callback %s ", callback, exc_info=True)
 
+    def _serialize(self, msg):
+        # Acknowledged messages are kept as dictionaries to be resent
+        if isinstance(msg, Message) and not self.acknowledge:
+            return msg.to_json()
+        return msg
+
+    def shout(self, msg, groups=None):
+        super().shout(self._serialize(msg), groups=groups)
+
+    def whisper(self, msg, peer=None, peers=None):
+        super().whisper(self._serialize(msg), peer=peer, peers=peers)
+
     def run(self):
         if self.acknowledge:
             self.resend_message_cb()
@@ -0,0 +1,292 @@
+"""Synthetic fleet load generator
+
+Simulates robots sending pose and status messages and users submitting
+transportation requests at configurable rates. The messages go through the
+real API/ZyreInterface callback path and the model layer, delivered by an
+in-process transport instead of the network.
+
+Latencies are measured from the time a message was scheduled to be sent
+until its callback returns, so they include the time messages wait when
+the component cannot keep up.
+
+Usage: python -m fmlib.benchmarks.fleet_load --robots 50 --users 5 --duration 30
+"""
+import argparse
+import heapq
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymodm.errors import DoesNotExist
+from ropod.structs.status import AvailabilityStatus
+
+from fmlib.api.api import API
+from fmlib.config.builders import Store
+from fmlib.models.requests import TransportationRequest
+from fmlib.models.robot import Robot
+from fmlib.models.tasks import TransportationTask
+from fmlib.utils.messages import Header, Message
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class InProcessTransport:
+    """Delivers encoded messages to ZyreInterface.receive_msg_cb from worker threads
+
+    Args:
+        receive: The function messages are delivered to
+        workers: Number of threads delivering messages, pyre uses one per node
+    """
+
+    def __init__(self, receive, workers=1):
+        self.receive = receive
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._threads = list()
+        self._lock = threading.Lock()
+        self.latencies = dict()
+        self.errors = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._deliver, name='fmlib-load-%s' % i, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def send(self, msg, scheduled):
+        self._queue.put((msg.type, msg.to_json(), scheduled))
+
+    @property
+    def backlog(self):
+        return self._queue.qsize()
+
+    def stop(self, drain=True):
+        if drain:
+            self._queue.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = list()
+
+    def _deliver(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            msg_type, encoded, scheduled = item
+            try:
+                self.receive(encoded)
+            except Exception:
+                logging.getLogger(__name__).error("Callback failed for %s", msg_type, exc_info=True)
+                with self._lock:
+                    self.errors += 1
+            latency = time.monotonic() - scheduled
+            with self._lock:
+                self.latencies.setdefault(msg_type, list()).append(latency)
+            self._queue.task_done()
+
+
+class SimulatedRobot:
+
+    def __init__(self, robot_id, pose_rate, status_rate):
+        self.robot_id = robot_id
+        self.rates = {'ROBOT-POSE': pose_rate, 'ROBOT-STATUS': status_rate}
+        self.x = random.uniform(0, 100)
+        self.y = random.uniform(0, 100)
+
+    def next_message(self, msg_type):
+        if msg_type == 'ROBOT-POSE':
+            self.x += random.uniform(-0.5, 0.5)
+            self.y += random.uniform(-0.5, 0.5)
+            payload = {'robotId': self.robot_id,
+                       'pose': {'referenceId': 'map', 'x': self.x, 'y': self.y,
+                                'theta': random.uniform(-3.14, 3.14)}}
+        else:
+            payload = {'robotId': self.robot_id,
+                       'availability': random.choice([AvailabilityStatus.IDLE, AvailabilityStatus.BUSY])}
+        return Message(payload, Header(msg_type))
+
+
+class SimulatedUser:
+
+    def __init__(self, user_id, request_rate, locations):
+        self.user_id = user_id
+        self.rates = {'TASK-REQUEST': request_rate}
+        self.locations = locations
+
+    def next_message(self, msg_type):
+        pickup, delivery = random.sample(self.locations, 2)
+        earliest = datetime.now() + timedelta(minutes=random.randint(1, 60))
+        payload = {'requestId': str(uuid.uuid4()),
+                   'pickupLocation': pickup,
+                   'deliveryLocation': delivery,
+                   'earliestPickupTime': earliest.isoformat(),
+                   'latestPickupTime': (earliest + timedelta(minutes=5)).isoformat(),
+                   'loadType': 'mobidik',
+                   'loadId': 'load_%s' % random.randint(0, 1000),
+                   'priority': 2,
+                   'hardConstraints': True}
+        return Message(payload, Header('TASK-REQUEST'))
+
+
+class FleetComponent:
+    """Minimal fleet management component handling the simulated messages with the fmlib models
+    """
+
+    callbacks = [{'msg_type': 'ROBOT-POSE', 'component': '.robot_pose_cb'},
+                 {'msg_type': 'ROBOT-STATUS', 'component': '.robot_status_cb'},
+                 {'msg_type': 'TASK-REQUEST', 'component': '.task_request_cb'}]
+
+    def __init__(self, api):
+        self.api = api
+
+    @staticmethod
+    def _get_robot(robot_id):
+        try:
+            return Robot.get_robot(robot_id)
+        except DoesNotExist:
+            return Robot.create_new(robot_id)
+
+    def robot_pose_cb(self, msg):
+        payload = msg['payload']
+        pose = payload['pose']
+        robot = self._get_robot(payload['robotId'])
+        robot.update_position(x=pose['x'], y=pose['y'], theta=pose['theta'])
+
+    def robot_status_cb(self, msg):
+        payload = msg['payload']
+        robot = self._get_robot(payload['robotId'])
+        robot.update_status(availability=payload['availability'])
+
+    def task_request_cb(self, msg):
+        request = TransportationRequest.from_payload(msg['payload'])
+        TransportationTask.from_request(request)
+
+
+def build_api(message_types):
+    zyre_config = {'zyre_node': {'node_name': 'fmlib_load_generator',
+                                 'groups': ['FMLIB-LOAD'],
+                                 'message_types': message_types},
+                   'callbacks': FleetComponent.callbacks,
+                   'publish': dict()}
+    api = API(['zyre'], zyre=zyre_config)
+    component = FleetComponent(api)
+    api.register_callbacks(component)
+    return api, component
+
+
+class LoadGenerator:
+    """Emits the messages of the simulated sources at their configured rates
+
+    Args:
+        sources: Objects with a ``rates`` dictionary (message type to messages
+                 per second) and a ``next_message(msg_type)`` method
+        transport: The transport messages are sent through
+    """
+
+    def __init__(self, sources, transport):
+        self.sources = sources
+        self.transport = transport
+        self.sent = dict()
+
+    def run(self, duration):
+        start = time.monotonic()
+        schedule = list()
+        for idx, source in enumerate(self.sources):
+            for msg_type, rate in source.rates.items():
+                if rate > 0:
+                    # Spread the first messages to avoid synchronized bursts
+                    heapq.heappush(schedule, (start + random.uniform(0, 1 / rate), idx, msg_type))
+
+        while schedule:
+            scheduled, idx, msg_type = heapq.heappop(schedule)
+            if scheduled - start > duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            source = self.sources[idx]
+            self.transport.send(source.next_message(msg_type), scheduled)
+            self.sent[msg_type] = self.sent.get(msg_type, 0) + 1
+            heapq.heappush(schedule, (scheduled + 1 / source.rates[msg_type], idx, msg_type))
+
+        return time.monotonic() - start
+
+
+def report(sent, transport, elapsed):
+    results = {'elapsed': elapsed, 'errors': transport.errors, 'types': dict()}
+    total = 0
+    for msg_type, latencies in sorted(transport.latencies.items()):
+        latencies = sorted(latencies)
+        total += len(latencies)
+        results['types'][msg_type] = {'sent': sent.get(msg_type, 0),
+                                      'processed': len(latencies),
+                                      'throughput': len(latencies) / elapsed,
+                                      'p50': percentile(latencies, 0.5),
+                                      'p90': percentile(latencies, 0.9),
+                                      'p99': percentile(latencies, 0.99),
+                                      'max': latencies[-1]}
+    results['throughput'] = total / elapsed
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--robots', type=int, default=20)
+    parser.add_argument('--pose-rate', type=float, default=1.0, help='Pose messages per robot per second')
+    parser.add_argument('--status-rate', type=float, default=0.2, help='Status messages per robot per second')
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--request-rate', type=float, default=0.5, help='Requests per user per second')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=1, help='Threads delivering messages')
+    parser.add_argument('--store', choices=['memory', 'mongo'], default='memory')
+    parser.add_argument('--db-name', default='fmlib_load')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    Store(args.db_name, backend=args.store)
+
+    message_types = ['ROBOT-POSE', 'ROBOT-STATUS', 'TASK-REQUEST']
+    api, _ = build_api(message_types)
+
+    locations = ['AMK_D_L-1_C%s' % i for i in range(1, 40)]
+    sources = [SimulatedRobot('ropod_%03d' % i, args.pose_rate, args.status_rate) for i in range(args.robots)]
+    sources += [SimulatedUser('user_%s' % i, args.request_rate, locations) for i in range(args.users)]
+
+    transport = InProcessTransport(api.zyre.receive_msg_cb, args.workers)
+    transport.start()
+    generator = LoadGenerator(sources, transport)
+    start = time.monotonic()
+    generator.run(args.duration)
+    backlog = transport.backlog
+    # Throughput includes the time needed to drain the messages still queued
+    transport.stop()
+    elapsed = time.monotonic() - start
+
+    results = report(generator.sent, transport, elapsed)
+    results['backlog_at_end'] = backlog
+    for msg_type, entry in results['types'].items():
+        print("%-14s %8d sent %8d processed %8.1f msg/s  p50 %7.1f ms  p90 %7.1f ms  p99 %7.1f ms"
+              % (msg_type, entry['sent'], entry['processed'], entry['throughput'],
+                 entry['p50'] * 1e3, entry['p90'] * 1e3, entry['p99'] * 1e3))
+    print("Sustained throughput %.1f msg/s, %d messages queued when generation stopped, %d callback errors"
+          % (results['throughput'], backlog, transport.errors))
+
+    if args.output:
+        with open(args.output, 'w') as file_handle:
+            json.dump(results, file_handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
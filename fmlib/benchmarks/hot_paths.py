@@ -0,0 +1,208 @@
+"""Benchmarks of the message and model hot paths
+
+The models run against the in-process store (fmlib.db.memory), so the
+numbers measure fmlib and pymodm and not the network or the database.
+
+Usage:
+    python -m fmlib.benchmarks.hot_paths --output results.json
+    python -m fmlib.benchmarks.hot_paths --baseline baseline.json --threshold 0.2
+
+The process exits with status 1 when a benchmark is slower than the
+baseline by more than the threshold.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from fmlib.api.api import API, register_middleware
+from fmlib.db.memory import MemoryStore
+from fmlib.models.actions import Action
+from fmlib.models.tasks import TaskPlan, TaskStatus, TransportationTask, TransportationTaskConstraints
+from fmlib.utils.messages import MessageFactory, format_document, format_msg
+from ropod.structs.status import ActionStatus, TaskStatus as TaskStatusConst
+
+BENCHMARKS = dict()
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def measure(function, setup=None, number=200, warmup=5):
+    """Times function, calling setup before every call outside the timed section
+
+    Returns:
+        samples (list): The duration of each call in seconds
+    """
+    samples = list()
+    for i in range(warmup + number):
+        args = setup() if setup else tuple()
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+def summarize(samples):
+    median = statistics.median(samples)
+    return {'n': len(samples),
+            'mean': statistics.mean(samples),
+            'median': median,
+            'min': min(samples),
+            'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            'ops_per_sec': 1 / median if median else None}
+
+
+def create_task(plan=False):
+    task = TransportationTask.create_new()
+    if plan:
+        actions = [Action.create_new(type='GOTO'), Action.create_new(type='DOCK')]
+        task.plan = [TaskPlan(robot='ropod_001', actions=actions)]
+        task.save()
+    return task
+
+
+def task_payload():
+    task = create_task()
+    payload = format_msg(task.to_dict())
+    pickup = payload['constraints']['temporal']['pickup']
+    pickup['earliestTime'] = datetime.now().isoformat()
+    pickup['latestTime'] = (datetime.now() + timedelta(minutes=5)).isoformat()
+    payload['constraints']['temporal']['duration'] = {'mean': 10.0, 'variance': 1.0}
+    return payload
+
+
+@benchmark('task_from_payload')
+def bench_task_from_payload(number):
+    payload = task_payload()
+
+    def setup():
+        return dict(payload, taskId=str(uuid.uuid4())),
+
+    return measure(lambda p: TransportationTask.from_payload(p, constraints=TransportationTaskConstraints),
+                   setup, number)
+
+
+@benchmark('task_to_msg')
+def bench_task_to_msg(number):
+    task = create_task()
+    return measure(task.to_msg, number=number)
+
+
+@benchmark('create_message')
+def bench_create_message(number):
+    task = create_task()
+    factory = MessageFactory('ropod')
+    return measure(lambda: factory.create_message(task), number=number)
+
+
+@benchmark('format_msg')
+def bench_format_msg(number):
+    task_dict = create_task().to_dict()
+    return measure(lambda: format_msg(task_dict), number=number)
+
+
+@benchmark('format_document')
+def bench_format_document(number):
+    payload = task_payload()
+    return measure(lambda: format_document(payload), number=number)
+
+
+@benchmark('update_status_archive')
+def bench_update_status_archive(number):
+    return measure(lambda task: task.update_status(TaskStatusConst.COMPLETED),
+                   lambda: (create_task(),), number)
+
+
+@benchmark('update_progress')
+def bench_update_progress(number):
+    task = create_task(plan=True)
+    action_id = task.plan[0].actions[0].action_id
+    task_status = TaskStatus.objects.get({'_id': task.task_id})
+    return measure(lambda: task_status.update_progress(action_id, ActionStatus.ONGOING), number=number)
+
+
+class NullInterface:
+    def __init__(self, **kwargs):
+        pass
+
+    def publish(self, msg, **kwargs):
+        pass
+
+
+@benchmark('api_publish')
+def bench_api_publish(number):
+    register_middleware('null', NullInterface)
+    api = API(middleware=['null'], null={'publish': {'task': {'method': 'publish'}}})
+    msg = create_task().to_msg()
+    return measure(lambda: api.publish(msg), number=number)
+
+
+def run(names=None, number=200):
+    MemoryStore('fmlib_benchmark')
+    results = dict()
+    for name, function in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = summarize(function(number))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the benchmarks whose median is slower than the baseline by more than threshold
+    """
+    regressions = dict()
+    for name, result in results.items():
+        reference = baseline.get('results', dict()).get(name)
+        if reference is None:
+            continue
+        ratio = result['median'] / reference['median']
+        if ratio > 1 + threshold:
+            regressions[name] = ratio
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmarks', nargs='*', help='Benchmarks to run, all by default')
+    parser.add_argument('--number', type=int, default=200, help='Timed calls per benchmark')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare the results against this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed slowdown of the median against the baseline')
+    args = parser.parse_args()
+
+    results = run(args.benchmarks, args.number)
+    for name, result in results.items():
+        print("%-25s median %10.1f us  %12.1f ops/s" % (name, result['median'] * 1e6, result['ops_per_sec']))
+
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'date': datetime.now().isoformat(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as file_handle:
+            json.dump(report, file_handle, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file_handle:
+            baseline = json.load(file_handle)
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions.items():
+            print("REGRESSION %s: %.2fx slower than baseline" % (name, ratio))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Import time of the fmlib entry points
+
+Imports every module in a fresh interpreter with ``python -X importtime``
+and reports its cumulative import time, the median over several runs, and
+the dependencies that contribute the most to it.
+
+Usage: python -m fmlib.benchmarks.import_time fmlib.api fmlib.api.zyre --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ['fmlib.api', 'fmlib.api.zyre', 'fmlib.api.rest.interface', 'fmlib.utils.messages',
+                   'fmlib.models.tasks', 'fmlib.monitoring.version_shouter']
+
+
+def import_times(module):
+    """Imports module in a new interpreter
+
+    Returns:
+        times (dict): The self and cumulative import time in microseconds of every imported module
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+        raise RuntimeError("Could not import %s:\n%s" % (module, process.stderr.strip().splitlines()[-1]))
+
+    times = dict()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module, runs=5, top=5):
+    cumulative = list()
+    times = dict()
+    for _ in range(runs):
+        times = import_times(module)
+        cumulative.append(times[module][1])
+    heaviest = sorted(times.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {'median_ms': statistics.median(cumulative) / 1000,
+            'modules': len(times),
+            'heaviest': [{'module': name, 'self_ms': self_us / 1000} for name, (self_us, _) in heaviest]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help='Number of heaviest dependencies to list')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = dict()
+    for module in args.modules:
+        try:
+            results[module] = measure(module, args.runs, args.top)
+        except RuntimeError as err:
+            print(err)
+            continue
+        print("%-40s %8.1f ms  (%d modules)" % (module, results[module]['median_ms'], results[module]['modules']))
+        for entry in results[module]['heaviest']:
+            print("    %-36s %8.1f ms" % (entry['module'], entry['self_ms']))
+
+    if args.output:
+        with open(args.output, 'w') as file_handle:
+            json.dump(results, file_handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Local load test of the RESTInterface server modes
+
+Starts a RESTInterface in every server mode, serving the RandomGenerator
+resource, and reports the requests per second a pool of concurrent clients
+with persistent connections achieves against it.
+
+Usage: python -m fmlib.benchmarks.rest_server --clients 16 --duration 5
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+
+
+def wait_for_server(ip, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((ip, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def client_loop(ip, port, path, stop_event, counts, errors):
+    conn = http.client.HTTPConnection(ip, port, timeout=30)
+    done = 0
+    while not stop_event.is_set():
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.will_close:
+                conn.close()
+            done += 1
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+    conn.close()
+    counts.append(done)
+
+
+def load_test(ip, port, path, clients, duration):
+    stop_event = threading.Event()
+    counts = list()
+    errors = list()
+    threads = [threading.Thread(target=client_loop, args=(ip, port, path, stop_event, counts, errors))
+               for _ in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return {'requests': sum(counts),
+            'errors': len(errors),
+            'rps': round(sum(counts) / elapsed, 1)}
+
+
+def benchmark_mode(mode, args):
+    # Imported here so that WAIT_TIME is set before the resource module reads it
+    from fmlib.api.rest.interface import RESTInterface
+
+    server_config = {'ip': args.ip, 'port': args.port, 'mode': mode,
+                     'workers': args.workers, 'threads': args.threads, 'keepalive': args.keepalive}
+    routes = [{'path': '/random',
+               'resource': {'module': 'fmlib.api.rest.resources', 'class': 'RandomGenerator'}}]
+    interface = RESTInterface(server_config, routes=routes)
+    interface.start()
+    try:
+        if not wait_for_server(args.ip, args.port):
+            raise RuntimeError("Server in %s mode did not come up" % mode)
+        return load_test(args.ip, args.port, '/random', args.clients, args.duration)
+    finally:
+        interface.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ip', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--modes', nargs='+', default=['simple', 'threaded', 'gunicorn'])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--wait-time', type=float, default=0,
+                        help='Seconds RandomGenerator sleeps per request')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--keepalive', type=int, default=2)
+    args = parser.parse_args()
+
+    os.environ['WAIT_TIME'] = str(args.wait_time)
+
+    results = dict()
+    for mode in args.modes:
+        results[mode] = benchmark_mode(mode, args)
+        print("%-10s %10.1f req/s  (%d requests, %d errors)" % (mode, results[mode]['rps'],
+                                                                results[mode]['requests'],
+                                                                results[mode]['errors']))
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
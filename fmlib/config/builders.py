@@ -1,16 +1,28 @@
 from fmlib.db.mongo import MongoStore, MongoStoreInterface
 
 
-class MongoStoreBuilder:
+class StoreBuilder:
+    """Builds the store interface of the process
+
+    The backend is selected with ``backend``: ``mongo`` (default) connects to
+    a MongoDB server, ``memory`` keeps the models in process, see
+    fmlib.db.memory.MemoryStore.
+    """
 
     def __init__(self):
         self._instance = None
 
-    def __call__(self, db_name, port, **_):
+    def __call__(self, db_name, port=27017, backend='mongo', **kwargs):
         if not self._instance:
-            store = MongoStore(db_name, port)
+            if backend == 'memory':
+                from fmlib.db.memory import MemoryStore
+                store = MemoryStore(db_name, **kwargs)
+            else:
+                store = MongoStore(db_name, port, **kwargs)
             self._instance = MongoStoreInterface(store)
         return self._instance
 
 
-Store = MongoStoreBuilder()
+MongoStoreBuilder = StoreBuilder
+
+Store = StoreBuilder()
@@ -0,0 +1,193 @@
+"""Events from MongoDB change streams
+
+Publishes the changes other processes make to the task, task status and
+robot collections to the fmlib.models.events bus, so that components can
+react to them as to the changes made in-process.
+
+The models are saved with full document replacements, so the changed fields
+are found by comparing every document with the last version seen by the
+stream. The versions this process writes are recorded before the write,
+through the listeners of fmlib.db.spool.breaker, and the changes matching
+them are not published again, since their events were published locally.
+Change streams need a replica set or a sharded cluster; use
+:meth:`ChangeStreamSource.available` to check for them.
+"""
+import logging
+import threading
+from collections import defaultdict
+
+import bson
+from pymongo.errors import PyMongoError
+from ropod.structs.status import ActionStatus
+
+from fmlib.db.spool import breaker, SAVE
+from fmlib.models.events import (CHANGE_STREAM, event_bus, RobotPositionUpdated, RobotsAssigned,
+                                 RobotStatusUpdated, ScheduleUpdated, TaskProgressUpdated, TaskStatusChanged)
+from fmlib.models.robot import Robot
+from fmlib.models.tasks import Task, TaskStatus
+
+
+def project(document, fields):
+    """Returns the compared fields of a document, as they are read back from MongoDB
+    """
+    # Encoding truncates the times to milliseconds, like MongoDB does
+    return bson.BSON.encode({field: document.get(field) for field in fields}).decode()
+
+
+def task_status_events(document, previous, model):
+    if document.get('status') != previous.get('status'):
+        yield TaskStatusChanged(document['_id'], document.get('status'), model=model, source=CHANGE_STREAM)
+    progress = document.get('progress')
+    if progress and progress != previous.get('progress'):
+        # current_action already points to the next action once one is
+        # completed, the changed actions are found by comparing the actions
+        previous_actions = {action.get('action'): action for action in
+                            (previous.get('progress') or dict()).get('actions', list())}
+        for action in progress.get('actions', list()):
+            previous_action = previous_actions.get(action.get('action'))
+            if previous_action is None and action.get('status') == ActionStatus.PLANNED:
+                # Added when the progress is initialized
+                continue
+            if action != previous_action:
+                yield TaskProgressUpdated(document['_id'], action.get('action'), action.get('status'),
+                                          model=model, source=CHANGE_STREAM)
+
+
+def task_events(document, previous, model):
+    if previous and document.get('assigned_robots') != previous.get('assigned_robots'):
+        yield RobotsAssigned(document['_id'], document.get('assigned_robots'), model=model, source=CHANGE_STREAM)
+    schedule = (document.get('start_time'), document.get('finish_time'))
+    if schedule != (previous.get('start_time'), previous.get('finish_time')) and any(schedule):
+        yield ScheduleUpdated(document['_id'], *schedule, model=model, source=CHANGE_STREAM)
+
+
+def robot_events(document, previous, model):
+    position = document.get('position')
+    if position and position != previous.get('position'):
+        yield RobotPositionUpdated(document['_id'], position.get('x'), position.get('y'), position.get('theta'),
+                                   model=model, source=CHANGE_STREAM)
+    status = document.get('status')
+    if status and status != previous.get('status'):
+        yield RobotStatusUpdated(document['_id'], status.get('availability', dict()).get('status'),
+                                 status.get('component_status', dict()).get('status'),
+                                 model=model, source=CHANGE_STREAM)
+
+
+# Model, fields compared between versions and event function of the watched collections
+WATCHED = [(TaskStatus, ['status', 'progress'], task_status_events),
+           (Task, ['assigned_robots', 'start_time', 'finish_time'], task_events),
+           (Robot, ['position', 'status'], robot_events)]
+
+
+class ChangeStreamSource:
+    """Watches the model collections and publishes their changes to the event bus
+
+    Args:
+        bus: The event bus, defaults to fmlib.models.events.event_bus
+        watched: List of (model, fields, events function) tuples
+        max_await_time_ms: Time a stream waits for changes before checking
+                           whether it was stopped
+    """
+
+    def __init__(self, bus=None, watched=None, max_await_time_ms=500, retry_interval=5):
+        self.logger = logging.getLogger(__name__)
+        self.bus = bus or event_bus
+        self.watched = watched or WATCHED
+        self.max_await_time_ms = max_await_time_ms
+        self.retry_interval = retry_interval
+        self._stop = threading.Event()
+        self._threads = list()
+        self._resume_tokens = dict()
+        self._lock = threading.Lock()
+        # Versions written by this process and not seen by the streams yet,
+        # by collection name and document id
+        self._local = defaultdict(lambda: defaultdict(list))
+
+    def available(self):
+        try:
+            with self.watched[0][0]._mongometa.collection.watch(max_await_time_ms=1):
+                return True
+        except (PyMongoError, NotImplementedError, TypeError) as err:
+            # In-process backends do not implement watch
+            self.logger.warning("MongoDB change streams are not available: %s", err)
+            return False
+
+    def start(self):
+        self._stop.clear()
+        breaker.listeners.append(self.on_local_write)
+        for model, fields, events in self.watched:
+            thread = threading.Thread(target=self._watch, args=(model, fields, events),
+                                      name='fmlib-change-stream-%s' % model._mongometa.collection_name,
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        if self.on_local_write in breaker.listeners:
+            breaker.listeners.remove(self.on_local_write)
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = list()
+
+    def on_local_write(self, models, operation):
+        if operation != SAVE:
+            return
+        for model in models:
+            collection_name = model._mongometa.collection_name
+            for watched, fields, _ in self.watched:
+                if isinstance(model, watched) and collection_name == watched._mongometa.collection_name:
+                    document = model.to_son()
+                    with self._lock:
+                        self._local[collection_name][document['_id']].append(project(document, fields))
+
+    def _is_local(self, collection_name, document_id, version):
+        """Whether version was written by this process, forgetting the versions written before it
+        """
+        with self._lock:
+            versions = self._local[collection_name].get(document_id)
+            if not versions or version not in versions:
+                return False
+            del versions[:versions.index(version) + 1]
+            if not versions:
+                del self._local[collection_name][document_id]
+            return True
+
+    def _watch(self, model, fields, events):
+        collection_name = model._mongometa.collection_name
+        # Last seen version of the compared fields of every document
+        versions = {document['_id']: project(document, fields) for document in
+                    model._mongometa.collection.find(projection=fields)}
+
+        while not self._stop.is_set():
+            try:
+                with model._mongometa.collection.watch(full_document='updateLookup',
+                                                       resume_after=self._resume_tokens.get(collection_name),
+                                                       max_await_time_ms=self.max_await_time_ms) as stream:
+                    while not self._stop.is_set():
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        self._resume_tokens[collection_name] = stream.resume_token
+                        self._handle(change, model, fields, events, versions)
+            except PyMongoError:
+                self.logger.error("Change stream of %s failed, retrying", collection_name, exc_info=True)
+                self._stop.wait(self.retry_interval)
+
+    def _handle(self, change, model, fields, events, versions):
+        document_id = change['documentKey']['_id']
+        if change['operationType'] == 'delete':
+            versions.pop(document_id, None)
+            return
+
+        document = change.get('fullDocument')
+        if document is None:
+            # The document was deleted before the change was looked up
+            return
+        previous = versions.get(document_id, dict())
+        versions[document_id] = project(document, fields)
+        if self._is_local(model._mongometa.collection_name, document_id, versions[document_id]):
+            return
+        instance = model.from_document(document)
+        for event in events(document, previous, instance):
+            self.bus.publish(event)
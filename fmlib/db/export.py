@@ -0,0 +1,234 @@
+"""Columnar export of the archived tasks
+
+Streams the archived tasks and their status with projected, batched cursors
+over the archive partitions and flattens every chunk of tasks into NumPy
+columns, which are written out before the next chunk is read::
+
+    export_archive('tasks_2020_03.parquet', start=datetime(2020, 3, 1), end=datetime(2020, 4, 1))
+
+The columns are:
+
+    * task_id, request_id
+    * hard_constraints
+    * pickup_earliest_time, pickup_latest_time, start_time, finish_time
+    * duration_mean, duration_variance
+    * status, delayed
+    * assigned_robots, and the action_id, action_status, action_start_time
+      and action_finish_time of the progress of every action. These have
+      several values per task, they are stored flat with the robot_offsets
+      and action_offsets of every task's first value, in CSR fashion
+
+Missing times are NaT, missing durations NaN and a missing status -1.
+
+Files ending in .parquet are written with pyarrow, one row group per chunk,
+the list columns as Parquet lists. Files ending in .npz hold the columns of
+every chunk as ``<chunk>/<column>`` arrays, see read_npz. Other paths are
+written as Parquet if pyarrow is installed, as npz otherwise.
+"""
+import importlib.util
+import itertools
+import zipfile
+
+import numpy as np
+
+from fmlib.models.tasks import task_archive, task_status_archive
+
+TASK_PROJECTION = {'request': 1, 'assigned_robots': 1, 'constraints.hard': 1, 'constraints.temporal': 1,
+                   'start_time': 1, 'finish_time': 1}
+STATUS_PROJECTION = {'status': 1, 'delayed': 1, 'progress.actions': 1}
+
+OFFSETS = {'robot_offsets': ['assigned_robots'],
+           'action_offsets': ['action_id', 'action_status', 'action_start_time', 'action_finish_time']}
+
+
+def _get(document, *path):
+    for key in path:
+        if not isinstance(document, dict):
+            return None
+        document = document.get(key)
+    return document
+
+
+def _id(value):
+    return str(value) if value is not None else ''
+
+
+def flatten(tasks, statuses):
+    """Returns the columns of a chunk of archived tasks
+
+    Args:
+        tasks: Task documents, projected with TASK_PROJECTION
+        statuses: Status documents, projected with STATUS_PROJECTION, by task id
+
+    Returns:
+        columns (dict): ndarray of every column
+    """
+    rows = {name: list() for name in ['task_id', 'request_id', 'hard_constraints', 'pickup_earliest_time',
+                                      'pickup_latest_time', 'start_time', 'finish_time', 'duration_mean',
+                                      'duration_variance', 'status', 'delayed']}
+    lists = {name: list() for names in OFFSETS.values() for name in names}
+    offsets = {name: [0] for name in OFFSETS}
+
+    for task in tasks:
+        status = statuses.get(task['_id']) or dict()
+        temporal = _get(task, 'constraints', 'temporal') or dict()
+        rows['task_id'].append(_id(task['_id']))
+        rows['request_id'].append(_id(task.get('request')))
+        rows['hard_constraints'].append(_get(task, 'constraints', 'hard') is not False)
+        rows['pickup_earliest_time'].append(_get(temporal, 'pickup', 'earliest_time'))
+        rows['pickup_latest_time'].append(_get(temporal, 'pickup', 'latest_time'))
+        rows['start_time'].append(task.get('start_time'))
+        rows['finish_time'].append(task.get('finish_time'))
+        rows['duration_mean'].append(_get(temporal, 'duration', 'mean'))
+        rows['duration_variance'].append(_get(temporal, 'duration', 'variance'))
+        rows['status'].append(status.get('status', -1))
+        rows['delayed'].append(bool(status.get('delayed')))
+
+        lists['assigned_robots'].extend(str(robot_id) for robot_id in task.get('assigned_robots') or list())
+        offsets['robot_offsets'].append(len(lists['assigned_robots']))
+        for action in _get(status, 'progress', 'actions') or list():
+            lists['action_id'].append(_id(action.get('action')))
+            lists['action_status'].append(action.get('status', -1))
+            lists['action_start_time'].append(action.get('start_time'))
+            lists['action_finish_time'].append(action.get('finish_time'))
+        offsets['action_offsets'].append(len(lists['action_id']))
+
+    columns = dict()
+    for name, values in itertools.chain(rows.items(), lists.items()):
+        if name.endswith('_time'):
+            columns[name] = np.array(values, dtype='datetime64[us]')
+        elif name.startswith('duration'):
+            columns[name] = np.array(values, dtype=np.float64)
+        elif name.endswith('status'):
+            columns[name] = np.array(values, dtype=np.int64)
+        elif name in ('hard_constraints', 'delayed'):
+            columns[name] = np.array(values, dtype=bool)
+        else:
+            columns[name] = np.array(values, dtype=str)
+    for name, values in offsets.items():
+        columns[name] = np.array(values, dtype=np.int64)
+    return columns
+
+
+def iter_columns(query=None, start=None, end=None, chunk_size=10000, active=False):
+    """Yields the columns of the archived tasks, chunk_size tasks at a time
+
+    Args:
+        query: Filter of the task documents
+        start, end: Range of the finish times
+        chunk_size: Tasks per chunk, and documents per cursor batch
+        active: Include the tasks that are not archived
+    """
+    tasks = task_archive.find(query, TASK_PROJECTION, start, end, active=active, batch_size=chunk_size)
+    while True:
+        chunk = list(itertools.islice(tasks, chunk_size))
+        if not chunk:
+            return
+        # The statuses are in the partitions of the same months as their tasks
+        statuses = {document['_id']: document for document in task_status_archive.find(
+            {'_id': {'$in': [task['_id'] for task in chunk]}}, STATUS_PROJECTION, start, end, active=active,
+            batch_size=chunk_size)}
+        yield flatten(chunk, statuses)
+
+
+class NpzWriter:
+    """Writes every chunk's columns as ``<chunk>/<column>`` arrays of an npz file
+    """
+
+    def __init__(self, path):
+        self._file = zipfile.ZipFile(path, 'w', allowZip64=True)
+        self._chunks = 0
+
+    def write(self, columns):
+        for name, values in columns.items():
+            with self._file.open('%05d/%s.npy' % (self._chunks, name), 'w', force_zip64=True) as member:
+                np.lib.format.write_array(member, values, allow_pickle=False)
+        self._chunks += 1
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes every chunk as a row group of a Parquet file, requires pyarrow
+    """
+
+    def __init__(self, path):
+        import pyarrow
+        import pyarrow.parquet
+        self._pyarrow = pyarrow
+        self._path = path
+        self._writer = None
+
+    def write(self, columns):
+        pyarrow = self._pyarrow
+        listed = {name for names in OFFSETS.values() for name in names}
+        arrays, names = list(), list()
+        for name, values in columns.items():
+            if name not in listed and name not in OFFSETS:
+                arrays.append(pyarrow.array(values, from_pandas=True))
+                names.append(name)
+        for offsets_name, list_names in OFFSETS.items():
+            offsets = pyarrow.array(columns[offsets_name].astype(np.int32))
+            for name in list_names:
+                arrays.append(pyarrow.ListArray.from_arrays(offsets, pyarrow.array(columns[name], from_pandas=True)))
+                names.append(name)
+        table = pyarrow.Table.from_arrays(arrays, names=names)
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_writer(path, format=None):
+    """Returns the writer of path, see the module docstring for the format
+    """
+    if format is None:
+        if path.endswith('.parquet'):
+            format = 'parquet'
+        elif path.endswith('.npz'):
+            format = 'npz'
+        else:
+            format = 'parquet' if importlib.util.find_spec('pyarrow') is not None else 'npz'
+    return ParquetWriter(path) if format == 'parquet' else NpzWriter(path)
+
+
+def export_archive(path, query=None, start=None, end=None, chunk_size=10000, format=None, active=False):
+    """Exports the archived tasks to path, see iter_columns for the arguments
+
+    Args:
+        format: ``npz`` or ``parquet``, by default from the extension of path
+
+    Returns:
+        count (int): Number of tasks exported
+    """
+    count = 0
+    writer = open_writer(path, format)
+    try:
+        for columns in iter_columns(query, start, end, chunk_size, active):
+            writer.write(columns)
+            count += len(columns['task_id'])
+    finally:
+        writer.close()
+    return count
+
+
+def read_npz(path):
+    """Returns the columns of an npz export, concatenating its chunks
+    """
+    chunks = dict()
+    with np.load(path) as npz:
+        for key in npz.files:
+            chunk, name = key.split('/', 1)
+            chunks.setdefault(chunk, dict())[name] = npz[key]
+    columns = dict()
+    for chunk in sorted(chunks):
+        for name, values in chunks[chunk].items():
+            if name in OFFSETS and name in columns:
+                # Shift the chunk's offsets past the values of the chunks before it
+                values = values[1:] + columns[name][-1][-1]
+            columns.setdefault(name, list()).append(values)
+    return {name: np.concatenate(values) for name, values in columns.items()}
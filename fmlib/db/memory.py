@@ -0,0 +1,227 @@
+"""In-process store backend
+
+Keeps the models in an in-memory database provided by mongomock, so that
+pymodm models and their query sets, e.g. ``by_status`` or ``get_task``,
+work unchanged without a MongoDB server.
+
+When a path is given, writes are appended to a journal file and the
+database can be saved to a snapshot file. On start, the snapshot is
+loaded and the journal replayed on top of it. Bulk writes are journaled as
+the single writes they consist of, and dropped collections and databases
+are journaled too.
+
+The store registers its database with pymodm through the private
+``pymodm.connection._CONNECTIONS``, which is only known to work with the
+pymodm 0.4 series pinned in pyproject.toml.
+"""
+import logging
+import os
+import threading
+
+import mongomock
+from bson import json_util
+from pymodm import connection
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne, uri_parser
+
+JOURNALED_METHODS = ['insert_one', 'insert_many', 'replace_one', 'update_one', 'update_many',
+                     'delete_one', 'delete_many', 'bulk_write', 'drop']
+
+# Collection method of every bulk write request type
+BULK_METHODS = {InsertOne: 'insert_one', ReplaceOne: 'replace_one', UpdateOne: 'update_one',
+                UpdateMany: 'update_many', DeleteOne: 'delete_one', DeleteMany: 'delete_many'}
+
+
+def request_entry(collection, request):
+    """Returns the journal entry of a bulk write request
+
+    pymongo does not expose the arguments of the requests, they are read
+    from their private attributes.
+    """
+    method_name = BULK_METHODS[type(request)]
+    if isinstance(request, InsertOne):
+        args = [request._doc]
+    elif isinstance(request, (DeleteOne, DeleteMany)):
+        args = [request._filter]
+    else:
+        args = [request._filter, request._doc]
+    kwargs = {'upsert': request._upsert} if isinstance(request, (ReplaceOne, UpdateOne, UpdateMany)) else dict()
+    return {'collection': collection, 'method': method_name, 'args': args, 'kwargs': kwargs}
+
+
+class JournaledCollection:
+    """Proxy of a mongomock collection that appends every write to the store journal
+    """
+
+    def __init__(self, collection, store):
+        self._collection = collection
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in JOURNALED_METHODS:
+            return self._store.journaled(self._collection.name, name, attr)
+        return attr
+
+
+class JournaledDatabase:
+    """Proxy of a mongomock database returning journaled collections
+    """
+
+    def __init__(self, database, store):
+        self._database = database
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if name == 'drop_collection':
+            return self._store.journaled(None, name, attr)
+        return attr
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    @property
+    def client(self):
+        return JournaledClient(self._database.client, self._store)
+
+    def get_collection(self, name, **kwargs):
+        return JournaledCollection(self._database.get_collection(name, **kwargs), self._store)
+
+
+class JournaledClient:
+    """Proxy of the mongomock client journaling the dropped databases
+    """
+
+    def __init__(self, client, store):
+        self._client = client
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name == 'drop_database':
+            return self._store.journaled(None, name, attr)
+        return attr
+
+
+class MemoryStore:
+    """Store keeping all models in process
+
+    Args:
+        db_name: Name of the database
+        alias: pymodm connection alias the models use
+        path: Directory of the snapshot and journal files. Nothing is
+              persisted if None
+        fsync: Whether to fsync the journal after every write
+    """
+
+    def __init__(self, db_name, alias='default', path=None, fsync=False, **kwargs):
+        self.logger = logging.getLogger(__name__)
+        self.db_name = db_name
+        self.alias = alias
+        self.path = path
+        self.fsync = fsync
+        self._lock = threading.RLock()
+        self._journal = None
+        self._client = mongomock.MongoClient()
+
+        if path is None:
+            database = self._client[db_name]
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+            self._journal = open(self.journal_file, 'a')
+            database = JournaledDatabase(self._client[db_name], self)
+
+        conn_string = 'mongodb://localhost/%s' % db_name
+        connection._CONNECTIONS[alias] = connection.ConnectionInfo(parsed_uri=uri_parser.parse_uri(conn_string),
+                                                                   conn_string=conn_string,
+                                                                   database=database)
+        self.logger.info("Initialized in-memory store %s", db_name)
+
+    @property
+    def snapshot_file(self):
+        return os.path.join(self.path, '%s.snapshot.json' % self.db_name)
+
+    @property
+    def journal_file(self):
+        return os.path.join(self.path, '%s.journal.jsonl' % self.db_name)
+
+    def connect(self):
+        pass
+
+    @property
+    def connected(self):
+        return True
+
+    def journaled(self, collection, method_name, method):
+        """Wraps a write method of collection, or of the database or client if None
+        """
+        def write(*args, **kwargs):
+            with self._lock:
+                result = method(*args, **kwargs)
+                if method_name == 'bulk_write':
+                    entries = [request_entry(collection, request) for request in args[0]]
+                else:
+                    entries = [{'collection': collection, 'method': method_name, 'args': args, 'kwargs': kwargs}]
+                for entry in entries:
+                    self._journal.write(json_util.dumps(entry) + '\n')
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            return result
+        return write
+
+    def snapshot(self):
+        """Saves the database to the snapshot file and starts a new journal
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            database = self._client[self.db_name]
+            collections = {name: list(database[name].find())
+                           for name in database.list_collection_names()}
+            tmp_file = self.snapshot_file + '.tmp'
+            with open(tmp_file, 'w') as file_handle:
+                file_handle.write(json_util.dumps(collections))
+                file_handle.flush()
+                os.fsync(file_handle.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+            self._journal.close()
+            self._journal = open(self.journal_file, 'w')
+        self.logger.debug("Saved snapshot of %s", self.db_name)
+
+    def close(self):
+        if self._journal is not None:
+            self.snapshot()
+            self._journal.close()
+            self._journal = None
+
+    def _load(self):
+        database = self._client[self.db_name]
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file) as file_handle:
+                collections = json_util.loads(file_handle.read())
+            for name, documents in collections.items():
+                if documents:
+                    database[name].insert_many(documents)
+
+        if not os.path.exists(self.journal_file):
+            return
+        replayed = 0
+        with open(self.journal_file) as file_handle:
+            for line in file_handle:
+                try:
+                    entry = json_util.loads(line)
+                except ValueError:
+                    # A crash can leave the last line incomplete
+                    self.logger.warning("Ignoring incomplete journal entry")
+                    break
+                if entry['collection'] is not None:
+                    target = database[entry['collection']]
+                elif entry['method'] == 'drop_database':
+                    target = self._client
+                else:
+                    target = database
+                getattr(target, entry['method'])(*entry['args'], **entry['kwargs'])
+                replayed += 1
+        self.logger.info("Replayed %s journal entries of %s", replayed, self.db_name)
@@ -4,8 +4,53 @@ from pymodm import connection
 from pymodm import connect
 from pymongo.errors import ServerSelectionTimeoutError
 
+from fmlib.db.routing import COLLECTION_GROUPS, router
+from fmlib.db.spool import breaker, WriteSpool
+from fmlib.monitoring.db_profiler import profiler
+from fmlib.monitoring.db_listeners import CommandMetrics, CommandTracer
+
+# MongoClient options that can be set in the store config
+CLIENT_OPTIONS = ['maxPoolSize', 'minPoolSize', 'maxIdleTimeMS', 'waitQueueTimeoutMS', 'socketTimeoutMS',
+                  'readPreference', 'w', 'wtimeoutMS', 'journal', 'retryWrites']
+
 
 class MongoStore:
+    """Connects the fmlib models to MongoDB
+
+    Args:
+        db_name: Name of the database
+        port: Port of the MongoDB server
+        ip: Address of the MongoDB server
+        connectTimeoutMS: Server selection timeout, in seconds
+        alias: Connection alias of the store
+        profile: Enables the command profiler
+        spool_path: File the writes made while MongoDB is unavailable are
+                    spooled to, they are only kept in memory if None
+        reconnect_interval: Seconds between reconnection attempts while
+                            MongoDB is unavailable
+        routes: Dictionary of connection aliases to their config. The config
+                takes the same keys as the store, they default to the values of
+                the store, and ``collections``, the names of the collections
+                routed to that alias. The collections of the aliases ``hot``
+                and ``archive`` default to fmlib.db.routing.HOT_COLLECTIONS and
+                ARCHIVE_COLLECTIONS
+        maxPoolSize, minPoolSize, maxIdleTimeMS, waitQueueTimeoutMS,
+        socketTimeoutMS, readPreference, w, wtimeoutMS, journal, retryWrites:
+                Passed to the MongoClient of the store and of its routes
+
+    Example config routing the archives to their own database::
+
+        store:
+          db_name: fms
+          port: 27017
+          maxPoolSize: 50
+          w: 1
+          routes:
+            archive:
+              db_name: fms_archive
+              maxPoolSize: 5
+              readPreference: secondaryPreferred
+    """
 
     def __init__(self, db_name, port=27017, **kwargs):
         self.logger = logging.getLogger(__name__)
@@ -15,18 +60,26 @@ class MongoStore:
         self._connected = False
         self._connection_timeout = kwargs.get('connectTimeoutMS', 30) * 1000
         self.alias = kwargs.get("alias", "default")
+        self.options = {key: value for key, value in kwargs.items() if key in CLIENT_OPTIONS}
+        self.routes = kwargs.get('routes') or dict()
+        if kwargs.get('profile', False):
+            profiler.enable()
 
         self.connect()
+        breaker.configure(self.ping, WriteSpool(kwargs.get('spool_path')), kwargs.get('reconnect_interval', 5))
 
     def connect(self):
         if self._connected:
             return
 
-        connection_str = "mongodb://%s:%s/%s" % (self.ip, self.port, self.db_name)
-
         try:
-            # Default timeout is 30s
-            connect(connection_str, alias=self.alias, serverSelectionTimeoutMS=self._connection_timeout)
+            self._connect(self.alias, self.db_name, self.ip, self.port, self.options)
+            for alias, route in self.routes.items():
+                options = dict(self.options)
+                options.update({key: value for key, value in route.items() if key in CLIENT_OPTIONS})
+                self._connect(alias, route.get('db_name', self.db_name), route.get('ip', self.ip),
+                              route.get('port', self.port), options)
+                router.route(route.get('collections', COLLECTION_GROUPS.get(alias, list())), alias)
             self._connected = True
         except ServerSelectionTimeoutError as err:
             self.logger.critical("Cannot connect to MongoDB", exc_info=True)
@@ -35,8 +88,20 @@ class MongoStore:
 
         self.logger.info("Connected to %s on port %s", self.db_name, self.port)
 
+    def _connect(self, alias, db_name, ip, port, options):
+        connection_str = "mongodb://%s:%s/%s" % (ip, port, db_name)
+        # Default timeout is 30s
+        connect(connection_str, alias=alias, serverSelectionTimeoutMS=self._connection_timeout,
+                event_listeners=[CommandMetrics(), CommandTracer(), profiler], **options)
+
+    def ping(self):
+        connection._get_db(alias=self.alias).client.admin.command('ping')
+
     @property
     def connected(self):
+        if not breaker.closed:
+            # Reconnecting in the background
+            return False
         if not self._connected:
             self.connect()
 
@@ -50,18 +115,11 @@ class MongoStoreInterface:
         self._store = mongo_store
 
     def save(self, model):
-        if self._store.connected:
-            try:
-                model.save()
-            except ServerSelectionTimeoutError as err:
-                self.logger.error(err)
+        # Writes are spooled by the models while MongoDB is unavailable
+        model.save()
 
     def archive(self, model):
-        if self._store.connected:
-            try:
-                model.archive()
-            except ServerSelectionTimeoutError as err:
-                self.logger.error(err)
+        model.archive()
 
     def update(self, model, **kwargs):
         if self._store.connected:
@@ -74,5 +132,8 @@ class MongoStoreInterface:
         if self._store.connected:
             try:
                 connection._get_db(alias=self._store.alias).client.drop_database(self._store.db_name)
+                for alias in getattr(self._store, 'routes', dict()):
+                    database = connection._get_db(alias=alias)
+                    database.client.drop_database(database.name)
             except ServerSelectionTimeoutError as err:
                 self.logger.error(err)
@@ -0,0 +1,175 @@
+"""Monthly partitions of the archive collections
+
+Archived documents are written to one collection per month, e.g.
+``task_archive_2020_03``, instead of one ever-growing collection. The
+partitions are listed from the database, so queries over a time range only
+visit the months it overlaps, and old months are dropped as whole
+collections::
+
+    with task_archive.partition(TransportationTask, task.finish_time):
+        task.save()
+
+    for document in task_archive.find({'assigned_robots': 'ropod_001'},
+                                      start=datetime(2020, 3, 1), end=datetime(2020, 4, 1)):
+        ...
+
+    task_archive.drop(before=datetime(2020, 1, 1))
+
+Queries also span the active collection of the model and the collection the
+archive was written to before it was partitioned.
+"""
+import logging
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+from pymodm import connection
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import ConnectionFailure
+
+from fmlib.db.routing import router, switch_route
+from fmlib.db.spool import breaker
+
+
+def next_month(time):
+    if time.month == 12:
+        return datetime(time.year + 1, 1, 1)
+    return datetime(time.year, time.month + 1, 1)
+
+
+class PartitionedArchive:
+    """Archive of a model partitioned by month
+
+    Args:
+        model: The MongoModel class whose documents are archived
+        collection_name: Name of the unpartitioned archive, the partitions
+                         are named after it and routed like it
+        time_field: Field the time range of a query is applied to, if any.
+                    The partitions are pruned in any case
+    """
+
+    def __init__(self, model, collection_name, time_field=None):
+        self.model = model
+        self.collection_name = collection_name
+        self.time_field = time_field
+        self._pattern = re.compile(r'^%s_(\d{4})_(\d{2})$' % re.escape(collection_name))
+        self._indexed = set()
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def database(self):
+        return connection._get_db(router.alias(self.collection_name, self.model._mongometa.connection_alias))
+
+    def partition_name(self, time):
+        return '%s_%04d_%02d' % (self.collection_name, time.year, time.month)
+
+    def indexes(self, model=None):
+        indexes = list((model or self.model)._mongometa.indexes)
+        if self.time_field is not None:
+            indexes.append(IndexModel([(self.time_field, ASCENDING)]))
+        return indexes
+
+    @contextmanager
+    def partition(self, model=None, time=None):
+        """Switches model to the partition of time, creating its indexes on first use
+
+        The indexes are created through the circuit breaker: while MongoDB is
+        unavailable they are skipped, and created on the next use after it
+        reconnects, so that the archived documents can still be spooled.
+
+        Args:
+            model: The model class to switch, self.model by default
+            time: Time of the archived document, now by default
+        """
+        model = model or self.model
+        name = self.partition_name(time or datetime.now())
+        with switch_route(model, name, route=self.collection_name):
+            key = (model._mongometa.connection_alias, name)
+            if key not in self._indexed:
+                indexes = self.indexes(model)
+                try:
+                    if indexes:
+                        breaker.read(model._mongometa.collection.create_indexes, indexes)
+                    self._indexed.add(key)
+                except ConnectionFailure:
+                    self.logger.warning("Could not create the indexes of %s, retrying on its next use", name)
+            yield model
+
+    def partitions(self, start=None, end=None):
+        """Returns the names of the partitions overlapping [start, end), oldest first
+        """
+        selected = list()
+        for name in self.database.list_collection_names():
+            match = self._pattern.match(name)
+            if match is None:
+                continue
+            first = datetime(int(match.group(1)), int(match.group(2)), 1)
+            if (end is None or first < end) and (start is None or next_month(first) > start):
+                selected.append((first, name))
+        return [name for _, name in sorted(selected)]
+
+    def collections(self, start=None, end=None, active=True):
+        """Returns the collections a query over [start, end) visits
+        """
+        collections = list()
+        if active:
+            collections.append(self.model._mongometa.collection)
+        database = self.database
+        if self.collection_name in database.list_collection_names():
+            collections.append(database.get_collection(self.collection_name))
+        collections.extend(database.get_collection(name) for name in self.partitions(start, end))
+        return collections
+
+    def _query(self, query, start, end):
+        query = dict(query or dict())
+        if self.time_field is not None and (start is not None or end is not None):
+            time_range = dict()
+            if start is not None:
+                time_range['$gte'] = start
+            if end is not None:
+                time_range['$lt'] = end
+            query[self.time_field] = time_range
+        return query
+
+    def find(self, query=None, projection=None, start=None, end=None, active=True, batch_size=0):
+        """Yields the documents matching query in the collections overlapping [start, end)
+
+        Args:
+            query: Filter of the documents
+            projection: Fields returned
+            start, end: Time range, see the time_field of the archive
+            active: Include the active collection of the model
+            batch_size: Documents per cursor batch, the server's default if 0
+        """
+        query = self._query(query, start, end)
+        for collection in self.collections(start, end, active):
+            yield from collection.find(query, projection, batch_size=batch_size)
+
+    def objects(self, query=None, start=None, end=None, active=True):
+        """Like find, yielding model instances
+        """
+        for document in self.find(query, start=start, end=end, active=active):
+            yield self.model.from_document(document)
+
+    def count(self, query=None, start=None, end=None, active=True):
+        query = self._query(query, start, end)
+        return sum(collection.count_documents(query) for collection in self.collections(start, end, active))
+
+    def drop(self, before):
+        """Drops the partitions of the months ending before or at before
+
+        The unpartitioned archive written before the partitions were
+        introduced is never dropped, it needs to be dropped by hand.
+
+        Returns:
+            names (list): The partitions dropped
+        """
+        database = self.database
+        dropped = list()
+        for name in self.partitions(end=before):
+            match = self._pattern.match(name)
+            if next_month(datetime(int(match.group(1)), int(match.group(2)), 1)) <= before:
+                database.drop_collection(name)
+                self._indexed = {key for key in self._indexed if key[1] != name}
+                dropped.append(name)
+        return dropped
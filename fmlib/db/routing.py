@@ -0,0 +1,82 @@
+"""Routing of collections to connection aliases
+
+pymodm models read and write through the connection alias in their
+``_mongometa``. The router maps collection names to aliases so that, e.g.,
+the archive collections can live on another database or server than the
+hot state, see the ``routes`` argument of fmlib.db.mongo.MongoStore.
+"""
+from contextlib import contextmanager
+from importlib import import_module
+
+from pymodm import MongoModel
+from pymodm.connection import DEFAULT_CONNECTION_ALIAS
+from pymodm.context_managers import switch_collection, switch_connection
+
+HOT_COLLECTIONS = ['task', 'task_status', 'robot']
+ARCHIVE_COLLECTIONS = ['task_archive', 'task_status_archive', 'robot_archive']
+
+COLLECTION_GROUPS = {'hot': HOT_COLLECTIONS, 'archive': ARCHIVE_COLLECTIONS}
+
+# Modules of the fmlib models, imported before the routes are applied
+MODEL_MODULES = ['fmlib.models.actions', 'fmlib.models.requests', 'fmlib.models.robot', 'fmlib.models.tasks',
+                 'fmlib.models.users']
+
+
+def _model_classes(cls=MongoModel):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _model_classes(subclass)
+
+
+class Router:
+
+    def __init__(self):
+        self.routes = dict()
+
+    def route(self, collections, alias):
+        """Routes the collections to alias and updates the models
+
+        The fmlib models are imported first, so that they are routed even if
+        the application imports them after the store is built.
+        """
+        for collection in collections:
+            self.routes[collection] = alias
+        for module in MODEL_MODULES:
+            import_module(module)
+        self.apply()
+
+    def alias(self, collection, default=DEFAULT_CONNECTION_ALIAS):
+        return self.routes.get(collection, default)
+
+    def apply(self, models=None):
+        """Sets the connection alias of the models whose collection is routed
+
+        Called by route(), models defined afterwards outside of fmlib.models
+        need to be passed explicitly.
+        """
+        for model in models or _model_classes():
+            meta = model._mongometa
+            if meta.collection_name in self.routes:
+                meta.connection_alias = self.routes[meta.collection_name]
+
+    def clear(self):
+        for model in _model_classes():
+            if model._mongometa.collection_name in self.routes:
+                model._mongometa.connection_alias = DEFAULT_CONNECTION_ALIAS
+        self.routes = dict()
+
+
+router = Router()
+
+
+@contextmanager
+def switch_route(model, collection_name, route=None):
+    """Switches model to collection_name and to the alias that collection is routed to
+
+    Args:
+        route: Collection name the alias is looked up by, collection_name by
+               default, e.g. the archive a partition belongs to
+    """
+    alias = router.alias(route or collection_name, model._mongometa.connection_alias)
+    with switch_collection(model, collection_name), switch_connection(model, alias):
+        yield
@@ -0,0 +1,247 @@
+"""Circuit breaker and write spool for MongoDB outages
+
+Without the breaker every write made while MongoDB is down blocks for the
+server selection timeout and is then dropped. Once enabled by
+fmlib.db.mongo.MongoStore, the first failed write opens the circuit: the
+writes that follow fail fast and are appended to a local spool, while a
+background thread pings the server. When it answers, the spooled writes are
+replayed in order before the circuit closes again. Reads made through the
+breaker while the circuit is not closed raise StoreUnavailable immediately
+instead of waiting for the server selection timeout.
+
+The spool stores the documents of the models, references are not cascaded
+when replaying.
+"""
+import logging
+import os
+import threading
+
+from bson import json_util
+from pymodm import connection
+from pymongo.errors import ConnectionFailure
+
+SAVE = 'save'
+DELETE = 'delete'
+
+CLOSED = 'closed'
+OPEN = 'open'
+REPLAYING = 'replaying'
+
+
+class StoreUnavailable(ConnectionFailure):
+    """Raised by the reads made while the circuit is open
+    """
+
+
+class WriteSpool:
+    """Append-only log of the writes made while MongoDB was unavailable
+
+    Args:
+        path: File the writes are appended to. They are kept in memory, and
+              lost when the process exits, if None
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = list()
+        if path is not None and os.path.exists(path):
+            with open(path) as file_handle:
+                self._entries = [line for line in file_handle if line.endswith('\n')]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, entry):
+        line = json_util.dumps(entry) + '\n'
+        if self.path is not None:
+            with open(self.path, 'a') as file_handle:
+                file_handle.write(line)
+        self._entries.append(line)
+
+    def read(self, start=0):
+        return [json_util.loads(line) for line in self._entries[start:]]
+
+    def truncate(self, done):
+        """Removes the first done entries
+        """
+        self._entries = self._entries[done:]
+        if self.path is not None:
+            tmp_file = self.path + '.tmp'
+            with open(tmp_file, 'w') as file_handle:
+                file_handle.writelines(self._entries)
+            os.replace(tmp_file, self.path)
+
+
+def replay_entry(entry):
+    collection = connection._get_db(entry['alias']).get_collection(entry['collection'])
+    if entry['operation'] == SAVE:
+        collection.replace_one({'_id': entry['id']}, entry['document'], upsert=True)
+    elif entry['operation'] == DELETE:
+        collection.delete_one({'_id': entry['id']})
+
+
+class CircuitBreaker:
+    """Guards the model writes, see the module docstring
+
+    The breaker is disabled until configured, and writes failing then are
+    only logged.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.enabled = False
+        self.state = CLOSED
+        self.spool = WriteSpool()
+        self.ping = None
+        self.reconnect_interval = 5
+        # Called with (models, operation) before every write
+        self.listeners = list()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def configure(self, ping, spool=None, reconnect_interval=5):
+        """Enables the breaker
+
+        Args:
+            ping: Function raising ConnectionFailure while MongoDB is unavailable
+            spool: The WriteSpool of the writes made while the circuit is open
+            reconnect_interval: Seconds between reconnection attempts
+        """
+        self.ping = ping
+        self.spool = spool if spool is not None else WriteSpool()
+        self.reconnect_interval = reconnect_interval
+        self.enabled = True
+        if len(self.spool):
+            # Writes spooled before a restart
+            self.trip()
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    def write(self, model, operation, write, *args, **kwargs):
+        """Calls write, or spools the operation on model when MongoDB is unavailable
+        """
+        return self.write_many([model], operation, write, *args, **kwargs)
+
+    def write_many(self, models, operation, write, *args, **kwargs):
+        """Like write, for one write of several models, e.g. an insert_many
+
+        The operation is spooled for every model.
+        """
+        for listener in self.listeners:
+            listener(models, operation)
+        with self._lock:
+            if self.enabled and self.state != CLOSED:
+                self._spool(models, operation)
+                return
+        try:
+            return write(*args, **kwargs)
+        except ConnectionFailure:
+            if not self.enabled:
+                logging.warning('Could not save models to MongoDB')
+                return
+            self.logger.warning("MongoDB is unavailable, spooling writes", exc_info=True)
+            with self._lock:
+                self._spool(models, operation)
+            self.trip()
+
+    def read(self, read, *args, **kwargs):
+        """Returns read(), raising StoreUnavailable right away while MongoDB is unavailable
+
+        A read failing with the circuit closed opens it, like a failed write.
+        """
+        if self.enabled and self.state != CLOSED:
+            raise StoreUnavailable("MongoDB is unavailable")
+        try:
+            return read(*args, **kwargs)
+        except StoreUnavailable:
+            raise
+        except ConnectionFailure as error:
+            if not self.enabled:
+                raise
+            self.logger.warning("MongoDB is unavailable, reads fail until it reconnects")
+            self.trip()
+            raise StoreUnavailable(str(error)) from error
+
+    def _spool(self, models, operation):
+        for model in models:
+            meta = model._mongometa
+            document = model.to_son()
+            entry = {'operation': operation,
+                     'alias': meta.connection_alias,
+                     'collection': meta.collection_name,
+                     'id': document['_id']}
+            if operation == SAVE:
+                entry['document'] = document
+            self.spool.append(entry)
+
+    def trip(self):
+        with self._lock:
+            if self.state == OPEN:
+                return
+            self.state = OPEN
+            if self._thread is not None:
+                # Still reconnecting, the thread closes the circuit
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._reconnect, name='fmlib-mongo-reconnect', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        thread = self._thread
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def _reconnect(self):
+        try:
+            self._reconnect_loop()
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _reconnect_loop(self):
+        while not self._stop.wait(self.reconnect_interval):
+            try:
+                self.ping()
+            except ConnectionFailure:
+                continue
+            with self._lock:
+                self.state = REPLAYING
+            if self._replay():
+                self.logger.info("Reconnected to MongoDB")
+                return
+            with self._lock:
+                self.state = OPEN
+
+    def _replay(self):
+        """Replays the spool, including the writes spooled meanwhile, and closes the circuit
+
+        Returns:
+            True if the spool was replayed, False if MongoDB failed again
+        """
+        done = 0
+        while True:
+            with self._lock:
+                if done == len(self.spool):
+                    self.spool.truncate(done)
+                    self.state = CLOSED
+                    # A trip from now on starts a new thread
+                    self._thread = None
+                    return True
+            for entry in self.spool.read(done):
+                try:
+                    replay_entry(entry)
+                except ConnectionFailure:
+                    self.logger.warning("MongoDB failed while replaying the spool")
+                    with self._lock:
+                        self.spool.truncate(done)
+                    return False
+                done += 1
+            self.logger.debug("Replayed %s spooled writes", done)
+
+
+breaker = CircuitBreaker()
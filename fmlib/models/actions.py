@@ -25,6 +25,35 @@ class Duration(EmbeddedMongoModel):
         self.variance = variance
 
 
+class DurationStatistics(MongoModel):
+    """Running duration statistics of an action type between two locations
+
+    The variance is kept as the sum of squared differences from the mean
+    (m2), so that batches of observations can be merged incrementally.
+    """
+    key = fields.CharField(primary_key=True)
+    action_type = fields.CharField()
+    start_location = fields.CharField(blank=True)
+    end_location = fields.CharField(blank=True)
+    count = fields.IntegerField(default=0)
+    mean = fields.FloatField(default=0.0)
+    m2 = fields.FloatField(default=0.0)
+
+    class Meta:
+        ignore_unknown_fields = True
+
+    @staticmethod
+    def make_key(action_type, start_location=None, end_location=None):
+        return '%s|%s|%s' % (action_type, start_location or '', end_location or '')
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def to_duration(self):
+        return Duration(mean=self.mean, variance=self.variance)
+
+
 class Action(MongoModel, EmbeddedMongoModel):
 
     action_id = fields.UUIDField(primary_key=True)
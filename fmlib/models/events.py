@@ -0,0 +1,186 @@
+"""Events emitted when the state of tasks and robots changes
+
+The models publish the events to the in-process ``event_bus`` after the
+change was saved. Components subscribe to an event type, or to a base type
+to receive all its subtypes, instead of re-querying the database::
+
+    event_bus.subscribe(TaskStatusChanged, self.task_status_cb)
+
+Callbacks run synchronously in the thread that changed the model and should
+return quickly. Changes made by other processes can be received through
+MongoDB change streams, see fmlib.db.change_streams.
+"""
+import logging
+import threading
+import time
+
+LOCAL = 'local'
+CHANGE_STREAM = 'change_stream'
+
+
+class Event:
+    """Base of all events
+
+    Attributes:
+        model: The model whose state changed
+        source: ``local`` for changes made in this process, ``change_stream``
+                for changes received from MongoDB
+        timestamp: Time the event was created, in seconds since the epoch
+    """
+
+    __slots__ = ['model', 'source', 'timestamp']
+
+    def __init__(self, model=None, source=LOCAL):
+        self.model = model
+        self.source = source
+        self.timestamp = time.time()
+
+    def __repr__(self):
+        attrs = ', '.join('%s=%r' % (name, getattr(self, name)) for name in self._fields())
+        return '%s(%s)' % (type(self).__name__, attrs)
+
+    @classmethod
+    def _fields(cls):
+        return [name for klass in reversed(cls.__mro__) for name in getattr(klass, '__slots__', [])
+                if name not in Event.__slots__]
+
+
+class TaskEvent(Event):
+
+    __slots__ = ['task_id']
+
+    def __init__(self, task_id, **kwargs):
+        super().__init__(**kwargs)
+        self.task_id = task_id
+
+
+class TaskCreated(TaskEvent):
+
+    __slots__ = []
+
+
+class TaskStatusChanged(TaskEvent):
+
+    __slots__ = ['status']
+
+    def __init__(self, task_id, status, **kwargs):
+        super().__init__(task_id, **kwargs)
+        self.status = status
+
+
+class RobotsAssigned(TaskEvent):
+
+    __slots__ = ['robot_ids']
+
+    def __init__(self, task_id, robot_ids, **kwargs):
+        super().__init__(task_id, **kwargs)
+        self.robot_ids = robot_ids
+
+
+class ScheduleUpdated(TaskEvent):
+
+    __slots__ = ['start_time', 'finish_time']
+
+    def __init__(self, task_id, start_time, finish_time, **kwargs):
+        super().__init__(task_id, **kwargs)
+        self.start_time = start_time
+        self.finish_time = finish_time
+
+
+class PickupConstraintUpdated(TaskEvent):
+
+    __slots__ = ['earliest_time', 'latest_time']
+
+    def __init__(self, task_id, earliest_time, latest_time, **kwargs):
+        super().__init__(task_id, **kwargs)
+        self.earliest_time = earliest_time
+        self.latest_time = latest_time
+
+
+class TaskProgressUpdated(TaskEvent):
+
+    __slots__ = ['action_id', 'action_status']
+
+    def __init__(self, task_id, action_id, action_status, **kwargs):
+        super().__init__(task_id, **kwargs)
+        self.action_id = action_id
+        self.action_status = action_status
+
+
+class RobotEvent(Event):
+
+    __slots__ = ['robot_id']
+
+    def __init__(self, robot_id, **kwargs):
+        super().__init__(**kwargs)
+        self.robot_id = robot_id
+
+
+class RobotPositionUpdated(RobotEvent):
+
+    __slots__ = ['x', 'y', 'theta']
+
+    def __init__(self, robot_id, x, y, theta, **kwargs):
+        super().__init__(robot_id, **kwargs)
+        self.x = x
+        self.y = y
+        self.theta = theta
+
+
+class RobotStatusUpdated(RobotEvent):
+
+    __slots__ = ['availability', 'component_status']
+
+    def __init__(self, robot_id, availability, component_status, **kwargs):
+        super().__init__(robot_id, **kwargs)
+        self.availability = availability
+        self.component_status = component_status
+
+
+class EventBus:
+    """Delivers published events to the callbacks subscribed to their type or base types
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._subscribers = dict()
+        self._dispatch = dict()
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type, callback):
+        with self._lock:
+            callbacks = self._subscribers.setdefault(event_type, list())
+            if callback not in callbacks:
+                callbacks.append(callback)
+            self._dispatch = dict()
+
+    def unsubscribe(self, event_type, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(event_type, list())
+            if callback in callbacks:
+                callbacks.remove(callback)
+            self._dispatch = dict()
+
+    def clear(self):
+        with self._lock:
+            self._subscribers = dict()
+            self._dispatch = dict()
+
+    def _callbacks(self, event_type):
+        callbacks = self._dispatch.get(event_type)
+        if callbacks is None:
+            with self._lock:
+                callbacks = [callback for klass in event_type.__mro__
+                             for callback in self._subscribers.get(klass, list())]
+                self._dispatch[event_type] = callbacks
+        return callbacks
+
+    def publish(self, event):
+        for callback in self._callbacks(type(event)):
+            try:
+                callback(event)
+            except Exception:
+                self.logger.error("Event subscriber %s failed on %s", callback, event, exc_info=True)
+
+
+event_bus = EventBus()
@@ -1,10 +1,9 @@
-import logging
-
 from pymodm import MongoModel, fields
-from pymongo.errors import ServerSelectionTimeoutError
 from ropod.structs.task import TaskPriority
 
+from fmlib.db.spool import breaker, SAVE
 from fmlib.models.users import User
+from fmlib.monitoring.metrics import model_operation_seconds, timed_method
 from fmlib.utils.messages import Document
 
 
@@ -34,11 +33,9 @@ class TransportationRequest(TaskRequest):
     hard_constraints = fields.BooleanField(default=True)
     _task_template = None
 
+    @timed_method(model_operation_seconds, 'save')
     def save(self):
-        try:
-            super().save(cascade=True)
-        except ServerSelectionTimeoutError:
-            logging.warning('Could not save models to MongoDB')
+        breaker.write(self, SAVE, super().save, cascade=True)
 
     @classmethod
     def from_payload(cls, payload):
@@ -1,13 +1,13 @@
-import logging
-
+from fmlib.db.routing import switch_route
+from fmlib.db.spool import breaker, DELETE, SAVE
 from fmlib.models.actions import Action
 from fmlib.models.environment import Position
+from fmlib.models.events import event_bus, RobotPositionUpdated, RobotStatusUpdated
 from fmlib.models.tasks import Task
+from fmlib.monitoring.metrics import model_operation_seconds, timed_method
 from pymodm import EmbeddedMongoModel, fields, MongoModel
-from pymodm.context_managers import switch_collection
 from pymodm.manager import Manager
 from pymodm.queryset import QuerySet
-from pymongo.errors import ServerSelectionTimeoutError
 from ropod.structs.status import AvailabilityStatus, ComponentStatus as ComponentStatusConst
 
 
@@ -95,7 +95,7 @@ class Version(EmbeddedMongoModel):
 class RobotQuerySet(QuerySet):
 
     def get_robot(self, robot_id):
-        return self.get({'_id': robot_id})
+        return breaker.read(self.get, {'_id': robot_id})
 
 
 RobotManager = Manager.from_queryset(RobotQuerySet)
@@ -115,16 +115,15 @@ class Robot(MongoModel):
         archive_collection = 'robot_archive'
         ignore_unknown_fields = True
 
+    @timed_method(model_operation_seconds, 'save')
     def save(self):
-        try:
-            super().save(cascade=True)
-        except ServerSelectionTimeoutError:
-            logging.warning('Could not save models to MongoDB')
+        breaker.write(self, SAVE, super().save, cascade=True)
 
+    @timed_method(model_operation_seconds, 'archive')
     def archive(self):
-        with switch_collection(self, self.Meta.archive_collection):
-            super().save()
-        self.delete()
+        with switch_route(self, self.Meta.archive_collection):
+            breaker.write(self, SAVE, super().save)
+        breaker.write(self, DELETE, self.delete)
 
     @staticmethod
     def get_robot(robot_id):
@@ -133,6 +132,21 @@ class Robot(MongoModel):
     def update_position(self, **kwargs):
         self.position.update_2d_pose(**kwargs)
         self.save()
+        event_bus.publish(RobotPositionUpdated(self.robot_id, self.position.x, self.position.y,
+                                               self.position.theta, model=self))
+
+    def update_status(self, availability=None, component_status=None, issues=None):
+        """Updates the availability and/or the health status of the robot
+        """
+        if self.status is None:
+            self.status = RobotStatus(availability=Availability(), component_status=ComponentStatus())
+        if availability is not None:
+            self.status.availability.status = availability
+        if component_status is not None:
+            self.status.component_status.update_status(component_status, issues)
+        self.save()
+        event_bus.publish(RobotStatusUpdated(self.robot_id, self.status.availability.status,
+                                             self.status.component_status.status, model=self))
 
     @classmethod
     def create_new(cls, robot_id, **kwargs):
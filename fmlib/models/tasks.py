@@ -1,19 +1,22 @@
-import logging
 import uuid
 from datetime import datetime, timedelta
 
 import dateutil.parser
 from pymodm import EmbeddedMongoModel, fields, MongoModel
-from pymodm.context_managers import switch_collection
 from pymodm.errors import DoesNotExist
 from pymodm.manager import Manager
 from pymodm.queryset import QuerySet
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo import ASCENDING, IndexModel
 from ropod.structs.status import ActionStatus, TaskStatus as TaskStatusConst
 from ropod.utils.timestamp import TimeStamp
 
+from fmlib.db.partitions import PartitionedArchive
+from fmlib.db.spool import breaker, DELETE, SAVE
 from fmlib.models.actions import Action, ActionProgress
+from fmlib.models.events import (event_bus, PickupConstraintUpdated, RobotsAssigned, ScheduleUpdated,
+                                 TaskCreated, TaskProgressUpdated, TaskStatusChanged)
 from fmlib.models.requests import TaskRequest
+from fmlib.monitoring.metrics import model_operation_seconds, timed_method
 from fmlib.utils.messages import Document
 from fmlib.utils.messages import Message
 
@@ -26,7 +29,7 @@ class TaskQuerySet(QuerySet):
         if isinstance(task_id, str):
             task_id = uuid.UUID(task_id)
 
-        return self.get({'_id': task_id})
+        return breaker.read(self.get, {'_id': task_id})
 
 
 class TaskStatusQuerySet(QuerySet):
@@ -107,21 +110,21 @@ class Task(MongoModel):
         archive_collection = 'task_archive'
         ignore_unknown_fields = True
         meta_model = 'task'
+        indexes = [IndexModel([('start_time', ASCENDING)])]
 
+    @timed_method(model_operation_seconds, 'save')
     def save(self):
-        try:
-            super().save(cascade=True)
-        except ServerSelectionTimeoutError:
-            logging.warning('Could not save models to MongoDB')
+        breaker.write(self, SAVE, super().save, cascade=True)
 
     @classmethod
     def create_new(cls, **kwargs):
         if 'task_id' not in kwargs.keys():
             kwargs.update(task_id=uuid.uuid4())
-        elif 'constraints' not in kwargs.keys():
+        if 'constraints' not in kwargs.keys():
             kwargs.update(constraints=TaskConstraints())
         task = cls(**kwargs)
         task.save()
+        event_bus.publish(TaskCreated(task.task_id, model=task))
         task.update_status(TaskStatusConst.UNALLOCATED)
         return task
 
@@ -133,6 +136,7 @@ class Task(MongoModel):
             document[key] = value.from_payload(document.pop(key))
         task = cls.from_document(document)
         task.save()
+        event_bus.publish(TaskCreated(task.task_id, model=task))
         task.update_status(TaskStatusConst.UNALLOCATED)
         return task
 
@@ -140,7 +144,8 @@ class Task(MongoModel):
         dict_repr = self.to_son().to_dict()
         dict_repr.pop('_cls')
         dict_repr["task_id"] = str(dict_repr.pop('_id'))
-        dict_repr["constraints"] = self.constraints.to_dict()
+        if self.constraints is not None:
+            dict_repr["constraints"] = self.constraints.to_dict()
         return dict_repr
 
     def to_msg(self):
@@ -172,10 +177,13 @@ class Task(MongoModel):
         self.constraints.hard = boolean
         self.save()
 
-    def archive(self):
-        with switch_collection(Task, Task.Meta.archive_collection):
-            super().save()
-        self.delete()
+    @timed_method(model_operation_seconds, 'archive')
+    def archive(self, time=None):
+        """Moves the task to the archive partition of time, by default its finish time or now
+        """
+        with task_archive.partition(Task, time or self.finish_time):
+            breaker.write(self, SAVE, super().save)
+        breaker.write(self, DELETE, self.delete)
 
     def update_status(self, status):
         try:
@@ -184,9 +192,12 @@ class Task(MongoModel):
         except DoesNotExist:
             task_status = TaskStatus(task=self.task_id, status=status)
         task_status.save()
+        event_bus.publish(TaskStatusChanged(self.task_id, status, model=task_status))
         if status in [TaskStatusConst.COMPLETED, TaskStatusConst.CANCELED, TaskStatusConst.ABORTED]:
-            task_status.archive()
-            self.archive()
+            # The task and its status go to the same partition
+            time = self.finish_time or datetime.now()
+            task_status.archive(time)
+            self.archive(time)
 
     def assign_robots(self, robot_ids):
         self.assigned_robots = robot_ids
@@ -195,6 +206,7 @@ class Task(MongoModel):
         self.plan[0].robot = robot_ids[0]
         self.update_status(TaskStatusConst.ALLOCATED)
         self.save()
+        event_bus.publish(RobotsAssigned(self.task_id, robot_ids, model=self))
 
     def unassign_robots(self):
         self.assigned_robots = list()
@@ -212,6 +224,7 @@ class Task(MongoModel):
         self.start_time = schedule['start_time']
         self.finish_time = schedule['finish_time']
         self.save()
+        event_bus.publish(ScheduleUpdated(self.task_id, self.start_time, self.finish_time, model=self))
 
     def is_executable(self):
         current_time = TimeStamp()
@@ -228,7 +241,7 @@ class Task(MongoModel):
 
     @property
     def status(self):
-        return TaskStatus.objects.get({"_id": self.task_id})
+        return breaker.read(TaskStatus.objects.get, {"_id": self.task_id})
 
     @classmethod
     def get_task(cls, task_id):
@@ -237,7 +250,7 @@ class Task(MongoModel):
 
     @staticmethod
     def get_task_status(task_id):
-        return TaskStatus.objects.get({'_id': task_id})
+        return breaker.read(TaskStatus.objects.get, {'_id': task_id})
 
 
     @staticmethod
@@ -262,7 +275,7 @@ class Task(MongoModel):
         return tasks_by_robot
 
     def update_progress(self, action_id, action_status, **kwargs):
-        status = TaskStatus.objects.get({"_id": self.task_id})
+        status = breaker.read(TaskStatus.objects.get, {"_id": self.task_id})
         status.update_progress(action_id, action_status, **kwargs)
 
 
@@ -370,22 +383,46 @@ class TransportationTask(Task):
                                          latest_time=datetime.now() + timedelta(minutes=1))
             temporal = TransportationTemporalConstraints(pickup=pickup, duration=InterTimepointConstraint())
             kwargs.update(constraints=TransportationTaskConstraints(temporal=temporal))
-        task = super().create_new(**kwargs)
-        task.save()
-        return task
+        return super().create_new(**kwargs)
 
-    @classmethod
-    def from_request(cls, request):
+    @staticmethod
+    def constraints_from_request(request):
         pickup = TimepointConstraint(earliest_time=request.earliest_pickup_time, latest_time=request.latest_pickup_time)
         temporal = TransportationTemporalConstraints(pickup=pickup, duration=InterTimepointConstraint())
-        constraints = TransportationTaskConstraints(hard=request.hard_constraints, temporal=temporal)
-        task = cls.create_new(request=request.request_id, constraints=constraints)
+        return TransportationTaskConstraints(hard=request.hard_constraints, temporal=temporal)
+
+    @classmethod
+    def from_request(cls, request):
+        task = cls.create_new(request=request.request_id, constraints=cls.constraints_from_request(request))
         return task
 
-    def archive(self):
-        with switch_collection(TransportationTask, Task.Meta.archive_collection):
+    @classmethod
+    def create_many(cls, requests):
+        """Creates the tasks of the requests and their unallocated TaskStatus
+
+        The documents are built in memory and written with one insert_many
+        per collection instead of two saves per task.
+
+        Returns:
+            tasks (list): The TransportationTask of every request, in order
+        """
+        tasks = [cls(task_id=uuid.uuid4(), request=request.request_id,
+                     constraints=cls.constraints_from_request(request)) for request in requests]
+        if not tasks:
+            return tasks
+        task_statuses = [TaskStatus(task=task.task_id, status=TaskStatusConst.UNALLOCATED) for task in tasks]
+        breaker.write_many(tasks, SAVE, cls.objects.bulk_create, tasks)
+        breaker.write_many(task_statuses, SAVE, TaskStatus.objects.bulk_create, task_statuses)
+        for task, task_status in zip(tasks, task_statuses):
+            event_bus.publish(TaskCreated(task.task_id, model=task))
+            event_bus.publish(TaskStatusChanged(task.task_id, TaskStatusConst.UNALLOCATED, model=task_status))
+        return tasks
+
+    @timed_method(model_operation_seconds, 'archive')
+    def archive(self, time=None):
+        with task_archive.partition(TransportationTask, time or self.finish_time):
             super().save()
-        self.delete()
+        breaker.write(self, DELETE, self.delete)
 
     @property
     def duration(self):
@@ -402,6 +439,8 @@ class TransportationTask(Task):
     def update_pickup_constraint(self, earliest_time, latest_time):
         self.pickup_constraint.update(earliest_time, latest_time)
         self.save()
+        event_bus.publish(PickupConstraintUpdated(self.task_id, self.pickup_constraint.earliest_time,
+                                                  self.pickup_constraint.latest_time, model=self))
 
     @classmethod
     def get_earliest_task(cls, tasks=None):
@@ -483,17 +522,40 @@ class TaskStatus(MongoModel):
     class Meta:
         archive_collection = 'task_status_archive'
         ignore_unknown_fields = True
+        indexes = [IndexModel([('status', ASCENDING)])]
 
-    def archive(self):
-        with switch_collection(TaskStatus, TaskStatus.Meta.archive_collection):
-            super().save()
-        self.delete()
+    @timed_method(model_operation_seconds, 'save')
+    def save(self, **kwargs):
+        breaker.write(self, SAVE, super().save, **kwargs)
+
+    @timed_method(model_operation_seconds, 'archive')
+    def archive(self, time=None):
+        with task_status_archive.partition(TaskStatus, time):
+            breaker.write(self, SAVE, super().save)
+        breaker.write(self, DELETE, self.delete)
 
     def update_progress(self, action_id, action_status, **kwargs):
-        self.refresh_from_db()
+        breaker.read(self.refresh_from_db)
         if not self.progress:
             self.progress = TaskProgress()
             self.progress.initialize(action_id, self.task.plan)
             self.save()
         self.progress.update(action_id, action_status, **kwargs)
         self.save(cascade=True)
+        event_bus.publish(TaskProgressUpdated(self.task_id, action_id, action_status, model=self))
+
+    @property
+    def task_id(self):
+        """Id of the task, read without dereferencing the task
+        """
+        return self.to_son()['_id']
+
+    def to_dict(self):
+        dict_repr = self.to_son().to_dict()
+        dict_repr.pop('_cls')
+        dict_repr["task_id"] = str(dict_repr.pop('_id'))
+        return dict_repr
+
+
+task_archive = PartitionedArchive(Task, Task.Meta.archive_collection, time_field='finish_time')
+task_status_archive = PartitionedArchive(TaskStatus, TaskStatus.Meta.archive_collection)
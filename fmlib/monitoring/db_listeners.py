@@ -0,0 +1,48 @@
+"""pymongo command listeners feeding the metrics registry and the tracer
+
+Kept apart from the metrics and tracing modules, so that components that
+do not use MongoDB do not import pymongo.
+"""
+from pymongo import monitoring
+
+from fmlib.monitoring import metrics
+from fmlib.monitoring.tracing import tracer
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo command listener observing the duration of every MongoDB command
+    """
+
+    def __init__(self):
+        self._collections = dict()
+
+    def started(self, event):
+        if metrics.registry.enabled:
+            collection = event.command.get(event.command_name)
+            self._collections[(event.connection_id, event.request_id)] = \
+                collection if isinstance(collection, str) else ''
+
+    def succeeded(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            metrics.db_command_seconds.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            metrics.db_command_seconds.observe(event.duration_micros / 1e6, event.command_name, collection)
+            metrics.db_command_failures.inc(event.command_name, collection)
+
+
+class CommandTracer(monitoring.CommandListener):
+    """pymongo command listener adding the duration of every command to the traced message
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        tracer.add_db_time(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        tracer.add_db_time(event.duration_micros / 1e6)
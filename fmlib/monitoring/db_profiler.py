@@ -0,0 +1,167 @@
+"""MongoDB command profiling attributed to fmlib model methods
+
+The profiler is a pymongo command listener. When a command starts, it walks
+the stack of the calling thread up to the innermost fmlib model method,
+e.g. ``Task.get_tasks_by_robot`` or ``Robot.save``, and attributes the
+latency and the number of documents of the command to that call site.
+
+Profiling is disabled by default, enable it with ``MongoStore(..., profile=True)``
+or :meth:`CommandProfiler.enable`.
+"""
+import sys
+import threading
+
+from pymongo import monitoring
+
+from fmlib.monitoring.tracing import tracer
+
+
+def _count_documents(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+        if batch is not None:
+            return len(batch)
+    n = reply.get('n')
+    return n if isinstance(n, int) else 0
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    qualname = getattr(code, 'co_qualname', None)
+    if qualname:
+        return qualname
+    owner = frame.f_locals.get('self')
+    if owner is not None:
+        return '%s.%s' % (type(owner).__name__, code.co_name)
+    owner = frame.f_locals.get('cls')
+    if isinstance(owner, type):
+        return '%s.%s' % (owner.__name__, code.co_name)
+    return '%s.%s' % (frame.f_globals.get('__name__'), code.co_name)
+
+
+class CallSiteStats:
+
+    __slots__ = ['calls', 'seconds', 'max_seconds', 'documents', 'failures']
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.documents = 0
+        self.failures = 0
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'seconds': self.seconds,
+                'mean_seconds': self.seconds / self.calls if self.calls else 0.0,
+                'max_seconds': self.max_seconds,
+                'documents': self.documents,
+                'failures': self.failures}
+
+
+class CommandProfiler(monitoring.CommandListener):
+    """Aggregates MongoDB commands per (call site, command, collection)
+
+    Args:
+        packages: Module prefixes whose functions count as call sites
+        depth: Number of nested call sites included in the attribution, e.g.
+               with depth 2 ``Task.update_status > TaskStatus.archive``
+    """
+
+    def __init__(self, packages=('fmlib.models',), depth=1, enabled=False):
+        self.packages = tuple(packages)
+        self.depth = depth
+        self.enabled = enabled
+        self._pending = dict()
+        self._stats = dict()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self._stats = dict()
+
+    def call_site(self, frame=None):
+        frame = frame or sys._getframe(1)
+        sites = list()
+        while frame is not None and len(sites) < self.depth:
+            if frame.f_globals.get('__name__', '').startswith(self.packages):
+                sites.insert(0, _frame_name(frame))
+            frame = frame.f_back
+        return ' > '.join(sites) if sites else 'unknown'
+
+    def started(self, event):
+        if not self.enabled:
+            return
+        collection = event.command.get(event.command_name)
+        key = (self.call_site(sys._getframe(1)), event.command_name,
+               collection if isinstance(collection, str) else '')
+        self._pending[(event.connection_id, event.request_id)] = key
+
+    def succeeded(self, event):
+        key = self._pending.pop((event.connection_id, event.request_id), None)
+        if key is not None:
+            self._record(key, event.duration_micros / 1e6, _count_documents(event.reply))
+
+    def failed(self, event):
+        key = self._pending.pop((event.connection_id, event.request_id), None)
+        if key is not None:
+            self._record(key, event.duration_micros / 1e6, 0, failed=True)
+
+    def _record(self, key, seconds, documents, failed=False):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = CallSiteStats()
+                self._stats[key] = stats
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.documents += documents
+            stats.failures += int(failed)
+
+    def report(self, top=10):
+        """Returns the slowest and the most frequent call sites
+
+        The round trips per inbound message are taken from the tracer, and are
+        only available while the metrics registry is enabled.
+        """
+        with self._lock:
+            entries = [dict(site=site, command=command, collection=collection, **stats.to_dict())
+                       for (site, command, collection), stats in self._stats.items()]
+
+        round_trips = dict()
+        for (msg_type,) in tracer.round_trips.labels():
+            total, count = tracer.round_trips.get(msg_type)
+            round_trips[msg_type] = {'messages': count,
+                                     'mean': total / count if count else 0.0,
+                                     'p90': tracer.round_trips.quantile(0.9, msg_type)}
+
+        return {'slowest': sorted(entries, key=lambda entry: entry['seconds'], reverse=True)[:top],
+                'most_frequent': sorted(entries, key=lambda entry: entry['calls'], reverse=True)[:top],
+                'round_trips_per_message': round_trips}
+
+    def format_report(self, top=10):
+        report = self.report(top)
+        lines = ['Slowest call sites (total time):']
+        for entry in report['slowest']:
+            lines.append('  %(seconds)10.4fs %(calls)8d calls %(documents)8d docs  '
+                         '%(site)s [%(command)s %(collection)s]' % entry)
+        lines.append('Most frequent call sites:')
+        for entry in report['most_frequent']:
+            lines.append('  %(calls)8d calls %(mean_seconds)10.6fs mean  %(site)s [%(command)s %(collection)s]'
+                         % entry)
+        lines.append('Round trips per inbound message:')
+        for msg_type, entry in sorted(report['round_trips_per_message'].items()):
+            lines.append('  %-30s %6.2f mean %6s p90 (%d messages)' % (msg_type, entry['mean'], entry['p90'],
+                                                                      entry['messages']))
+        return '\n'.join(lines)
+
+
+profiler = CommandProfiler()
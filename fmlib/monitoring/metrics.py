@@ -0,0 +1,315 @@
+"""Lightweight counters and latency histograms for the fmlib hot paths
+
+Metrics are registered in a module level registry, which is disabled by
+default. While disabled, instrumented code only pays for checking the
+``enabled`` flag. The registry renders its metrics in the Prometheus text
+exposition format.
+"""
+import abc
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    if extra:
+        pairs.append('%s="%s"' % extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _quantile(sorted_values, q):
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class Metric(abc.ABC):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._values = dict()
+
+    def clear(self):
+        with self._lock:
+            self._values = dict()
+
+    def labels(self):
+        """Returns the label values of every recorded sample
+        """
+        with self._lock:
+            return list(self._values)
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.type)]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values, key=lambda item: [str(label) for label in item[0]]):
+            lines.extend(self._render_sample(labels, value))
+        return lines
+
+    @abc.abstractmethod
+    def _render_sample(self, labels, value):
+        """Returns the exposition lines of the sample with the given labels
+        """
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def _render_sample(self, labels, value):
+        return ['%s%s %s' % (self.name, _format_labels(self.labelnames, labels), _format_value(value))]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                sample = [[0] * len(self.buckets), 0.0, 0]
+                self._values[labels] = sample
+            sample[0][idx] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the duration of its block
+        """
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def get(self, *labels):
+        """Returns the (sum, count) of the observations with the given labels
+        """
+        sample = self._values.get(labels)
+        if sample is None:
+            return 0.0, 0
+        return sample[1], sample[2]
+
+    def _render_sample(self, labels, value):
+        bucket_counts, total, count = value
+        lines = list()
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            lines.append('%s_bucket%s %s' % (self.name,
+                                             _format_labels(self.labelnames, labels, ('le', _format_value(bound))),
+                                             cumulative))
+        label_str = _format_labels(self.labelnames, labels)
+        lines.append('%s_sum%s %s' % (self.name, label_str, _format_value(total)))
+        lines.append('%s_count%s %s' % (self.name, label_str, count))
+        return lines
+
+
+class Summary(Metric):
+    """Reports quantiles over a sliding window of the latest observations
+    """
+    type = 'summary'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, quantiles=(0.5, 0.9, 0.99),
+                 window=1024):
+        super().__init__(name, documentation, labelnames, registry)
+        self.quantiles = quantiles
+        self.window = window
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                sample = [deque(maxlen=self.window), 0.0, 0]
+                self._values[labels] = sample
+            sample[0].append(value)
+            sample[1] += value
+            sample[2] += 1
+
+    def get(self, *labels):
+        """Returns the (sum, count) of all the observations with the given labels
+        """
+        sample = self._values.get(labels)
+        if sample is None:
+            return 0.0, 0
+        return sample[1], sample[2]
+
+    def quantile(self, q, *labels):
+        """Returns the q quantile of the observations in the window, None if there are none
+        """
+        with self._lock:
+            sample = self._values.get(labels)
+            observations = sorted(sample[0]) if sample else None
+        if not observations:
+            return None
+        return _quantile(observations, q)
+
+    def _render_sample(self, labels, value):
+        observations, total, count = value
+        observations = sorted(observations)
+        lines = list()
+        for q in self.quantiles:
+            estimate = _quantile(observations, q) if observations else float('nan')
+            lines.append('%s%s %s' % (self.name,
+                                      _format_labels(self.labelnames, labels, ('quantile', q)),
+                                      _format_value(estimate)))
+        label_str = _format_labels(self.labelnames, labels)
+        lines.append('%s_sum%s %s' % (self.name, label_str, _format_value(total)))
+        lines.append('%s_count%s %s' % (self.name, label_str, count))
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Registry:
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def register(self, metric_class, name, documentation, labelnames=(), **kwargs):
+        """Returns the metric called name, creating it if it does not exist yet
+        """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(name, documentation, labelnames, registry=self, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError("Metric %s is already registered as a %s" % (name, metric.type))
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def summary(self, name, documentation, labelnames=(), quantiles=(0.5, 0.9, 0.99), window=1024):
+        return self.register(Summary, name, documentation, labelnames, quantiles=quantiles, window=window)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def clear(self):
+        for metric in list(self._metrics.values()):
+            metric.clear()
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format
+        """
+        lines = list()
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def enable():
+    registry.enable()
+
+
+def disable():
+    registry.disable()
+
+
+def timed_method(histogram, operation):
+    """Decorates a model method to observe its duration, labelled by operation and model class
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            if not histogram.registry.enabled:
+                return function(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(self, *args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, operation, type(self).__name__)
+        return wrapper
+    return decorator
+
+
+api_published = registry.counter('fmlib_api_published_total',
+                                 'Messages published by the API', ['type', 'middleware'])
+api_publish_seconds = registry.histogram('fmlib_api_publish_seconds',
+                                         'Time spent publishing a message', ['type', 'middleware'])
+zyre_received = registry.counter('fmlib_zyre_received_total',
+                                 'Messages received through zyre', ['type', 'callback'])
+zyre_callback_seconds = registry.histogram('fmlib_zyre_callback_seconds',
+                                           'Time spent in zyre message callbacks', ['type', 'callback'])
+model_operation_seconds = registry.histogram('fmlib_model_operation_seconds',
+                                             'Time spent saving and archiving models', ['operation', 'model'])
+db_command_seconds = registry.histogram('fmlib_db_command_seconds',
+                                        'Duration of MongoDB commands', ['command', 'collection'])
+db_command_failures = registry.counter('fmlib_db_command_failures_total',
+                                       'Failed MongoDB commands', ['command', 'collection'])
+
@@ -0,0 +1,157 @@
+"""End-to-end message latency tracing
+
+Uses the ``msgId`` and ``timestamp`` of the message headers to split the
+latency of every received message into hops:
+
+    * transit: from the sender's header timestamp to the reception
+    * dispatch: from the reception to the start of the callback
+    * callback: time spent in the callback
+    * db: time spent in MongoDB commands issued by the callback
+
+Messages published while a callback runs are linked to the message that
+triggered it, e.g. a TASK published while handling a TASK-REQUEST, and the
+time between both is reported per (parent type, type) chain.
+
+Latencies are aggregated as summaries in the fmlib.monitoring.metrics
+registry and are only recorded while it is enabled. The transit hop compares
+clocks of different machines and is only meaningful when they are synced.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from fmlib.monitoring import metrics
+
+
+def parse_timestamp(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp)
+    except (AttributeError, ValueError):
+        import dateutil.parser
+        return dateutil.parser.parse(timestamp)
+
+
+def seconds_since(timestamp):
+    """Returns the seconds elapsed since an ISO formatted timestamp
+    """
+    sent = parse_timestamp(timestamp)
+    now = datetime.now(timezone.utc) if sent.tzinfo else datetime.now()
+    return (now - sent).total_seconds()
+
+
+class TraceContext:
+
+    __slots__ = ['msg_id', 'msg_type', 'received', 'callback_started', 'db_seconds', 'db_commands']
+
+    def __init__(self, msg_id, msg_type, received=None):
+        self.msg_id = msg_id
+        self.msg_type = msg_type
+        self.received = received if received is not None else time.perf_counter()
+        self.callback_started = None
+        self.db_seconds = 0.0
+        self.db_commands = 0
+
+
+class Tracer:
+    """Records per hop latencies of the messages handled in this process
+
+    Args:
+        registry: The metrics registry the latencies are reported to
+        max_links: Number of message links kept to reconstruct chains
+    """
+
+    def __init__(self, registry=None, max_links=10000):
+        self.registry = registry or metrics.registry
+        self.max_links = max_links
+        self.hop_seconds = self.registry.summary('fmlib_trace_hop_seconds',
+                                                 'Latency of received messages per hop', ['type', 'hop'])
+        self.chain_seconds = self.registry.summary('fmlib_trace_chain_seconds',
+                                                   'Time from receiving a message to publishing a message '
+                                                   'caused by it', ['parent_type', 'type'])
+        self.round_trips = self.registry.summary('fmlib_trace_db_round_trips',
+                                                 'MongoDB commands issued per received message', ['type'])
+        self._local = threading.local()
+        self._links = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        """The trace context of the message handled by the calling thread, if any
+        """
+        return getattr(self._local, 'context', None)
+
+    def received(self, msg, received=None):
+        """Starts tracing a received message in the calling thread
+
+        Args:
+            msg: The received message as a dictionary
+            received: perf_counter value of the reception, defaults to now
+
+        Returns:
+            context (TraceContext): None if the registry is disabled
+        """
+        if not self.registry.enabled:
+            return None
+        header = msg.get('header', dict())
+        msg_type = header.get('type')
+        context = TraceContext(header.get('msgId'), msg_type, received)
+
+        timestamp = header.get('timestamp')
+        if timestamp:
+            try:
+                self.hop_seconds.observe(seconds_since(timestamp), msg_type, 'transit')
+            except (TypeError, ValueError, OverflowError):
+                pass
+
+        self._local.context = context
+        return context
+
+    def callback_started(self, context):
+        if context is None:
+            return
+        context.callback_started = time.perf_counter()
+        self.hop_seconds.observe(context.callback_started - context.received, context.msg_type, 'dispatch')
+
+    def finished(self, context):
+        if context is None:
+            return
+        if context.callback_started is not None:
+            self.hop_seconds.observe(time.perf_counter() - context.callback_started,
+                                     context.msg_type, 'callback')
+        self.hop_seconds.observe(context.db_seconds, context.msg_type, 'db')
+        self.round_trips.observe(context.db_commands, context.msg_type)
+        self._local.context = None
+
+    def published(self, msg):
+        """Links a message published by the calling thread to the message it is handling
+        """
+        context = self.current
+        if context is None:
+            return
+        header = msg.get('header', dict())
+        msg_type = header.get('type')
+        self.chain_seconds.observe(time.perf_counter() - context.received, context.msg_type, msg_type)
+        with self._lock:
+            self._links[header.get('msgId')] = (context.msg_id, msg_type)
+            if len(self._links) > self.max_links:
+                self._links.popitem(last=False)
+
+    def add_db_time(self, seconds):
+        context = self.current
+        if context is not None:
+            context.db_seconds += seconds
+            context.db_commands += 1
+
+    def chain(self, msg_id):
+        """Returns the msgIds leading to msg_id, starting from the first message of the chain
+        """
+        chain = [msg_id]
+        with self._lock:
+            while chain[0] in self._links and len(chain) <= self.max_links:
+                chain.insert(0, self._links[chain[0]][0])
+        return chain
+
+
+tracer = Tracer()
+
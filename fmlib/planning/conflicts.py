@@ -0,0 +1,107 @@
+"""Schedule conflict detection over the whole fleet
+
+Loads the start and finish times of all scheduled tasks with one projected
+query and checks every robot's schedule at once with NumPy: the tasks are
+sorted by (robot, start time) and each one is compared with the latest
+finish time of the tasks before it on the same robot. Overlaps are reported
+as conflicts, free time between tasks as idle gaps::
+
+    report = check_schedules(min_gap=timedelta(minutes=1))
+    for robot_id, entry in report.items():
+        for first, second, overlap in entry['conflicts']:
+            ...
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from fmlib.models.tasks import Task
+
+PROJECTION = {'assigned_robots': 1, 'start_time': 1, 'finish_time': 1}
+
+
+def load_schedules(query=None):
+    """Returns the schedules of the tasks assigned to robots as arrays
+
+    A task assigned to several robots appears once per robot.
+
+    Args:
+        query: Additional filter of the task documents
+
+    Returns:
+        robot_ids (ndarray): Robot of every entry
+        task_ids (ndarray): Task of every entry
+        starts (ndarray): Start times as datetime64[us]
+        finishes (ndarray): Finish times as datetime64[us], the start time if unknown
+    """
+    scheduled = {'start_time': {'$ne': None}, 'assigned_robots.0': {'$exists': True}}
+    query = {'$and': [query, scheduled]} if query else scheduled
+    robot_ids, task_ids, starts, finishes = list(), list(), list(), list()
+    for document in Task._mongometa.collection.find(query, PROJECTION):
+        finish = document.get('finish_time') or document['start_time']
+        for robot_id in document['assigned_robots']:
+            robot_ids.append(robot_id)
+            task_ids.append(document['_id'])
+            starts.append(document['start_time'])
+            finishes.append(finish)
+    return (np.array(robot_ids, dtype=object), np.array(task_ids, dtype=object),
+            np.array(starts, dtype='datetime64[us]'), np.array(finishes, dtype='datetime64[us]'))
+
+
+def find_conflicts(robot_ids, task_ids, starts, finishes, min_gap=timedelta(0)):
+    """Finds the overlapping tasks and the idle gaps of every robot
+
+    Args:
+        robot_ids, task_ids, starts, finishes: Arrays as returned by load_schedules
+        min_gap: Shorter idle gaps are not reported
+
+    Returns:
+        report (dict): For every robot, ``conflicts`` as a list of (task_id,
+                       overlapping task_id, overlap in seconds) and ``gaps`` as
+                       a list of (task_id, next task_id, gap in seconds)
+    """
+    report = dict()
+    if len(robot_ids) == 0:
+        return report
+
+    robots, codes = np.unique(robot_ids, return_inverse=True)
+    starts = starts.astype('datetime64[us]').astype(np.int64)
+    finishes = finishes.astype('datetime64[us]').astype(np.int64)
+    order = np.lexsort((starts, codes))
+    codes, task_ids, starts, finishes = codes[order], task_ids[order], starts[order], finishes[order]
+
+    # Offset every robot's times past the previous robot's, so that one
+    # cumulative maximum does not carry over between robots
+    low = min(starts.min(), finishes.min())
+    span = max(starts.max(), finishes.max()) - low + 1
+    offset = codes * span - low
+    latest = np.maximum.accumulate(finishes + offset)
+    # Index of the task finishing last among the tasks before each one
+    index = np.arange(len(codes))
+    latest_index = np.maximum.accumulate(np.where(finishes + offset == latest, index, 0))
+
+    same_robot = codes[1:] == codes[:-1]
+    previous_finish = latest[:-1] - offset[1:]
+    previous_task = task_ids[latest_index[:-1]]
+    difference = (starts[1:] - previous_finish) / 1e6
+    # A task may end inside the one it overlaps
+    overlap = (np.minimum(previous_finish, finishes[1:]) - starts[1:]) / 1e6
+
+    robots = robots.tolist()
+    for robot_id in robots:
+        report[robot_id] = {'conflicts': list(), 'gaps': list()}
+
+    min_gap = min_gap.total_seconds()
+    gaps = (difference > 0) & (difference >= min_gap)
+    for key, mask, seconds in [('conflicts', difference < 0, overlap), ('gaps', gaps, difference)]:
+        selected = np.flatnonzero(same_robot & mask)
+        for code, first, second, amount in zip(codes[selected + 1].tolist(), previous_task[selected].tolist(),
+                                               task_ids[selected + 1].tolist(), seconds[selected].tolist()):
+            report[robots[code]][key].append((first, second, amount))
+    return report
+
+
+def check_schedules(query=None, min_gap=timedelta(0)):
+    """Checks the schedules of all robots, see find_conflicts
+    """
+    return find_conflicts(*load_schedules(query), min_gap=min_gap)
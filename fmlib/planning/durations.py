@@ -0,0 +1,161 @@
+"""Online action duration statistics
+
+Learns the mean and variance of the action durations from the start and
+finish times of the completed actions, per action type and (start, end)
+location pair. Observations are buffered and merged in batches: the
+statistics of a batch are computed with NumPy, combined with the running
+statistics with the parallel form of Welford's algorithm, and written back
+with one bulk write::
+
+    learner = DurationLearner.from_db()
+    learner.subscribe()
+    duration = learner.estimate('GOTO', 'AMK_D_L-1_C39', 'AMK_D_L-1_C40')
+"""
+import threading
+import uuid
+
+import numpy as np
+from pymongo import ReplaceOne
+from pymongo.errors import ConnectionFailure
+from ropod.structs.status import ActionStatus
+
+from fmlib.models.actions import Action, DurationStatistics
+from fmlib.db.spool import breaker, SAVE
+from fmlib.models.events import event_bus, TaskProgressUpdated
+from fmlib.models.tasks import task_status_archive
+
+
+def action_key(document):
+    """Returns the statistics key of an action document
+    """
+    locations = document.get('locations') or list()
+    return DurationStatistics.make_key(document.get('type'), locations[0] if locations else None,
+                                       locations[-1] if locations else None)
+
+
+def merge(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """Combines the (count, mean, m2) of two sets of observations, element-wise for arrays
+    """
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta ** 2 * count_a * count_b / count
+    return count, mean, m2
+
+
+class DurationLearner:
+    """Running duration statistics fed by the completed actions
+
+    Args:
+        batch_size: Number of observations buffered before they are merged
+                    and written back
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.statistics = dict()
+        self._pending = list()
+        self._lock = threading.Lock()
+        # Serializes the flushes, so that an older batch is never written last
+        self._flush_lock = threading.Lock()
+
+    @classmethod
+    def from_db(cls, subscribe=True, **kwargs):
+        learner = cls(**kwargs)
+        for statistics in DurationStatistics.objects.all():
+            learner.statistics[statistics.key] = statistics
+        if subscribe:
+            learner.subscribe()
+        return learner
+
+    def subscribe(self, bus=None):
+        (bus or event_bus).subscribe(TaskProgressUpdated, self.on_progress)
+
+    def unsubscribe(self, bus=None):
+        (bus or event_bus).unsubscribe(TaskProgressUpdated, self.on_progress)
+
+    def on_progress(self, event):
+        # Change streams skip the writes of this process, so every completion is observed once
+        if event.action_status != ActionStatus.COMPLETED or event.model is None:
+            return
+        action_progress = event.model.progress.get_action(event.action_id)
+        self.observe(event.action_id, action_progress.start_time, action_progress.finish_time)
+
+    def observe(self, action_id, start_time, finish_time):
+        """Buffers the duration of an action, flushing when the batch is full
+        """
+        if start_time is None or finish_time is None or finish_time < start_time:
+            return
+        if isinstance(action_id, str):
+            action_id = uuid.UUID(action_id)
+        with self._lock:
+            self._pending.append((action_id, (finish_time - start_time).total_seconds()))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def observe_archive(self, query=None):
+        """Learns from the actions of the archived tasks, with one projected query
+        """
+        for document in task_status_archive.find(query, {'progress.actions': 1}, active=False):
+            for action in (document.get('progress') or dict()).get('actions', list()):
+                if action.get('status') == ActionStatus.COMPLETED:
+                    self.observe(action.get('action'), action.get('start_time'), action.get('finish_time'))
+        self.flush()
+
+    def flush(self):
+        """Merges the buffered observations and writes the updated statistics back
+        """
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, list()
+        if not pending:
+            return
+
+        action_ids = list({action_id for action_id, _ in pending})
+        try:
+            documents = breaker.read(list, Action._mongometa.collection.find({'_id': {'$in': action_ids}},
+                                                                             {'type': 1, 'locations': 1}))
+        except ConnectionFailure:
+            # Kept for the next flush
+            with self._lock:
+                self._pending = pending + self._pending
+            return
+        keys = {document['_id']: action_key(document) for document in documents}
+        observations = [(keys[action_id], seconds) for action_id, seconds in pending if action_id in keys]
+        if not observations:
+            return
+
+        batch_keys, inverse = np.unique([key for key, _ in observations], return_inverse=True)
+        durations = np.array([seconds for _, seconds in observations])
+        counts = np.bincount(inverse)
+        means = np.bincount(inverse, weights=durations) / counts
+        m2s = np.bincount(inverse, weights=(durations - means[inverse]) ** 2)
+
+        with self._lock:
+            previous = [self.statistics.get(key) for key in batch_keys.tolist()]
+            counts, means, m2s = merge(np.array([stats.count if stats else 0 for stats in previous]),
+                                       np.array([stats.mean if stats else 0.0 for stats in previous]),
+                                       np.array([stats.m2 if stats else 0.0 for stats in previous]),
+                                       counts, means, m2s)
+            updated = list()
+            for key, count, mean, m2 in zip(batch_keys.tolist(), counts.tolist(), means.tolist(), m2s.tolist()):
+                action_type, start_location, end_location = key.split('|')
+                statistics = DurationStatistics(key=key, action_type=action_type,
+                                                start_location=start_location or None,
+                                                end_location=end_location or None,
+                                                count=count, mean=mean, m2=m2)
+                self.statistics[key] = statistics
+                updated.append(statistics)
+        breaker.write_many(updated, SAVE, DurationStatistics._mongometa.collection.bulk_write,
+                           [ReplaceOne({'_id': statistics.key}, statistics.to_son(), upsert=True)
+                            for statistics in updated], ordered=False)
+
+    def estimate(self, action_type, start_location=None, end_location=None):
+        """Returns the learned Duration, None if the action was never observed
+        """
+        statistics = self.statistics.get(DurationStatistics.make_key(action_type, start_location, end_location))
+        return statistics.to_duration() if statistics is not None else None
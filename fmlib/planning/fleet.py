@@ -0,0 +1,214 @@
+"""Compact fleet state
+
+Keeps the pose and status of every robot in NumPy arrays, one row per robot,
+so that fleet-wide questions are answered with vectorized operations instead
+of hydrating every Robot model. The state is loaded with one projected query
+and kept in sync through the robot events of fmlib.models.events::
+
+    fleet = FleetState.from_db()
+    idle = fleet.robots(fleet.mask(availability=AvailabilityStatus.IDLE))
+    closest = fleet.nearest(x, y, k=3, availability=AvailabilityStatus.IDLE)
+"""
+import threading
+
+import numpy as np
+from ropod.structs.status import AvailabilityStatus, ComponentStatus as ComponentStatusConst
+
+from fmlib.models.events import event_bus, RobotPositionUpdated, RobotStatusUpdated
+from fmlib.models.robot import Robot
+
+# Fields of the robot documents the state is loaded from
+PROJECTION = {'position': 1, 'status.availability.status': 1, 'status.component_status.status': 1}
+
+
+class FleetState:
+    """Pose, availability and component status of the robots in NumPy arrays
+
+    Robots without a known position have NaN coordinates and are ignored by
+    the distance queries.
+
+    Args:
+        capacity: Initial number of rows, the arrays grow as robots are added
+    """
+
+    def __init__(self, capacity=64):
+        self.robot_ids = list()
+        self._rows = dict()
+        self._poses = np.full((capacity, 3), np.nan)
+        self._availability = np.full(capacity, AvailabilityStatus.NO_COMMUNICATION, dtype=np.int16)
+        self._component_status = np.full(capacity, ComponentStatusConst.OPTIMAL, dtype=np.int16)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_db(cls, subscribe=True):
+        """Loads the state of all robots with one projected query
+
+        Args:
+            subscribe: Keep the state in sync with the robot events
+        """
+        fleet = cls()
+        for document in Robot._mongometa.collection.find({}, PROJECTION):
+            fleet.load_document(document)
+        if subscribe:
+            fleet.subscribe()
+        return fleet
+
+    def load_document(self, document):
+        position = document.get('position') or dict()
+        status = document.get('status') or dict()
+        self.update_position(document['_id'], position.get('x'), position.get('y'), position.get('theta'))
+        self.update_status(document['_id'], (status.get('availability') or dict()).get('status'),
+                           (status.get('component_status') or dict()).get('status'))
+
+    def subscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.subscribe(RobotPositionUpdated, self.on_position)
+        bus.subscribe(RobotStatusUpdated, self.on_status)
+
+    def unsubscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.unsubscribe(RobotPositionUpdated, self.on_position)
+        bus.unsubscribe(RobotStatusUpdated, self.on_status)
+
+    def on_position(self, event):
+        self.update_position(event.robot_id, event.x, event.y, event.theta)
+
+    def on_status(self, event):
+        self.update_status(event.robot_id, event.availability, event.component_status)
+
+    def __len__(self):
+        return len(self.robot_ids)
+
+    def __contains__(self, robot_id):
+        return robot_id in self._rows
+
+    @property
+    def poses(self):
+        """(n, 3) array of the x, y and theta of the robots, in the order of robot_ids
+        """
+        return self._poses[:len(self)]
+
+    @property
+    def availability(self):
+        return self._availability[:len(self)]
+
+    @property
+    def component_status(self):
+        return self._component_status[:len(self)]
+
+    def row(self, robot_id):
+        """Returns the row of robot_id, adding the robot if it is not in the state
+        """
+        row = self._rows.get(robot_id)
+        if row is not None:
+            return row
+        with self._lock:
+            if robot_id in self._rows:
+                return self._rows[robot_id]
+            row = len(self.robot_ids)
+            if row == len(self._poses):
+                self._grow()
+            self._rows[robot_id] = row
+            self.robot_ids.append(robot_id)
+        return row
+
+    def _grow(self):
+        capacity = 2 * len(self._poses)
+        poses = np.full((capacity, 3), np.nan)
+        poses[:len(self._poses)] = self._poses
+        availability = np.full(capacity, AvailabilityStatus.NO_COMMUNICATION, dtype=np.int16)
+        availability[:len(self._availability)] = self._availability
+        component_status = np.full(capacity, ComponentStatusConst.OPTIMAL, dtype=np.int16)
+        component_status[:len(self._component_status)] = self._component_status
+        self._poses, self._availability, self._component_status = poses, availability, component_status
+
+    def remove(self, robot_id):
+        """Removes a robot, moving the last row into its place
+        """
+        with self._lock:
+            row = self._rows.pop(robot_id)
+            last = len(self.robot_ids) - 1
+            if row != last:
+                moved = self.robot_ids[last]
+                self.robot_ids[row] = moved
+                self._rows[moved] = row
+                self._poses[row] = self._poses[last]
+                self._availability[row] = self._availability[last]
+                self._component_status[row] = self._component_status[last]
+            self.robot_ids.pop()
+            # The freed row is reused by the next robot added
+            self._poses[last] = np.nan
+            self._availability[last] = AvailabilityStatus.NO_COMMUNICATION
+            self._component_status[last] = ComponentStatusConst.OPTIMAL
+
+    def update_position(self, robot_id, x, y, theta):
+        with self._lock:
+            row = self.row(robot_id)
+            self._poses[row] = [np.nan if value is None else value for value in (x, y, theta)]
+
+    def update_status(self, robot_id, availability=None, component_status=None):
+        with self._lock:
+            row = self.row(robot_id)
+            if availability is not None:
+                self._availability[row] = availability
+            if component_status is not None:
+                self._component_status[row] = component_status
+
+    def pose(self, robot_id):
+        return tuple(self._poses[self._rows[robot_id]].tolist())
+
+    def mask(self, availability=None, component_status=None):
+        """Returns a boolean array selecting the robots with the given status
+
+        Args:
+            availability: An availability status or a list of them, any if None
+            component_status: A component status or a list of them, any if None
+        """
+        with self._lock:
+            mask = np.ones(len(self), dtype=bool)
+            if availability is not None:
+                mask &= np.isin(self.availability, availability)
+            if component_status is not None:
+                mask &= np.isin(self.component_status, component_status)
+        return mask
+
+    def robots(self, mask):
+        return [self.robot_ids[row] for row in np.flatnonzero(mask)]
+
+    def count_by_availability(self):
+        with self._lock:
+            values, counts = np.unique(self.availability, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+    def distances(self, x, y):
+        """Euclidean distance of every robot to (x, y), NaN if its position is unknown
+        """
+        with self._lock:
+            poses = self.poses
+            return np.hypot(poses[:, 0] - x, poses[:, 1] - y)
+
+    def within(self, x, y, radius, **status):
+        """Returns the (robot_id, distance) of the robots within radius of (x, y), closest first
+
+        Args:
+            status: availability and/or component_status, see mask()
+        """
+        with self._lock:
+            distances = self.distances(x, y)
+            rows = np.flatnonzero((distances <= radius) & self.mask(**status))
+            rows = rows[np.argsort(distances[rows], kind='stable')]
+            return [(self.robot_ids[row], float(distances[row])) for row in rows]
+
+    def nearest(self, x, y, k=1, **status):
+        """Returns the (robot_id, distance) of the k robots closest to (x, y)
+
+        Args:
+            status: availability and/or component_status, see mask()
+        """
+        with self._lock:
+            distances = self.distances(x, y)
+            rows = np.flatnonzero(~np.isnan(distances) & self.mask(**status))
+            if k < len(rows):
+                rows = rows[np.argpartition(distances[rows], k)[:k]]
+            rows = rows[np.argsort(distances[rows], kind='stable')]
+            return [(self.robot_ids[row], float(distances[row])) for row in rows]
@@ -0,0 +1,261 @@
+"""Interval index over task pickup windows and schedules
+
+Replaces the linear scans over the tasks, e.g. in
+TransportationTask.get_earliest_task, with interval trees answering:
+
+    * the tasks whose interval overlaps [t0, t1]
+    * the tasks whose interval starts at or before t, e.g. executable tasks
+    * the task with the earliest start
+
+in O(log n + k) for k results. The trees are treaps ordered by the start of
+the intervals and augmented with the maximum end of every subtree, so they
+are updated incrementally as constraints and schedules change::
+
+    index = TaskIntervalIndex.from_db()
+    index.subscribe()
+    candidates = index.pickup.overlapping(now, now + timedelta(minutes=10))
+"""
+import random
+import threading
+
+from ropod.structs.status import TaskStatus as TaskStatusConst
+
+from fmlib.models.events import event_bus, PickupConstraintUpdated, ScheduleUpdated, TaskCreated, TaskStatusChanged
+from fmlib.models.tasks import Task
+
+# Tasks with these statuses are archived and removed from the index
+FINISHED = (TaskStatusConst.COMPLETED, TaskStatusConst.CANCELED, TaskStatusConst.ABORTED)
+
+
+class _Node:
+
+    __slots__ = ['key', 'end', 'max_end', 'priority', 'left', 'right']
+
+    def __init__(self, key, end):
+        self.key = key
+        self.end = end
+        self.max_end = end
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+
+    def update(self):
+        self.max_end = self.end
+        for child in (self.left, self.right):
+            if child is not None and child.max_end > self.max_end:
+                self.max_end = child.max_end
+
+
+def _split(node, key):
+    """Splits node into the subtrees with keys < key and >= key
+    """
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        node.update()
+        return node, right
+    left, node.left = _split(node.left, key)
+    node.update()
+    return left, node
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.update()
+        return left
+    right.left = _merge(left, right.left)
+    right.update()
+    return right
+
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key == node.key:
+        return _merge(node.left, node.right)
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    else:
+        node.right = _remove(node.right, key)
+    node.update()
+    return node
+
+
+class IntervalTree:
+    """Intervals [start, end] identified by a key, e.g. a task id
+
+    The keys of the intervals need to be comparable with each other.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._intervals = dict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __contains__(self, key):
+        return key in self._intervals
+
+    def get(self, key):
+        return self._intervals.get(key)
+
+    def add(self, key, start, end):
+        """Adds or moves the interval of key
+        """
+        with self._lock:
+            self.remove(key)
+            node_key = (start, key)
+            left, right = _split(self._root, node_key)
+            self._root = _merge(_merge(left, _Node(node_key, end)), right)
+            self._intervals[key] = (start, end)
+
+    def remove(self, key):
+        with self._lock:
+            interval = self._intervals.pop(key, None)
+            if interval is not None:
+                self._root = _remove(self._root, (interval[0], key))
+
+    def overlapping(self, start, end):
+        """Returns the (key, start, end) of the intervals overlapping [start, end], ordered by start
+        """
+        results = list()
+        with self._lock:
+            stack, node = list(), self._root
+            while stack or node is not None:
+                # Skip the subtrees ending before start
+                while node is not None and node.max_end >= start:
+                    stack.append(node)
+                    node = node.left
+                if not stack:
+                    break
+                node = stack.pop()
+                if node.key[0] > end:
+                    break
+                if node.end >= start:
+                    results.append((node.key[1], node.key[0], node.end))
+                node = node.right
+        return results
+
+    def starting_before(self, time):
+        """Returns the (key, start, end) of the intervals starting at or before time, ordered by start
+        """
+        results = list()
+        with self._lock:
+            stack, node = list(), self._root
+            while stack or node is not None:
+                while node is not None:
+                    stack.append(node)
+                    node = node.left
+                node = stack.pop()
+                if node.key[0] > time:
+                    break
+                results.append((node.key[1], node.key[0], node.end))
+                node = node.right
+        return results
+
+    def earliest(self):
+        """Returns the (key, start, end) of the interval with the earliest start, None if empty
+        """
+        with self._lock:
+            node = self._root
+            if node is None:
+                return None
+            while node.left is not None:
+                node = node.left
+            return node.key[1], node.key[0], node.end
+
+
+class TaskIntervalIndex:
+    """Interval trees of the pickup windows and the schedules of the tasks
+
+    Attributes:
+        pickup: IntervalTree of the [earliest_time, latest_time] pickup windows
+        schedule: IntervalTree of the [start_time, finish_time] schedules
+    """
+
+    def __init__(self):
+        self.pickup = IntervalTree()
+        self.schedule = IntervalTree()
+
+    @classmethod
+    def from_db(cls, subscribe=True):
+        """Loads the intervals of all tasks with one projected query
+
+        Args:
+            subscribe: Keep the index in sync with the task events
+        """
+        index = cls()
+        projection = {'constraints.temporal.pickup': 1, 'start_time': 1, 'finish_time': 1}
+        for document in Task._mongometa.collection.find({}, projection):
+            pickup = ((document.get('constraints') or dict()).get('temporal') or dict()).get('pickup') or dict()
+            index.update_pickup(document['_id'], pickup.get('earliest_time'), pickup.get('latest_time'))
+            index.update_schedule(document['_id'], document.get('start_time'), document.get('finish_time'))
+        if subscribe:
+            index.subscribe()
+        return index
+
+    def subscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.subscribe(TaskCreated, self.on_task_created)
+        bus.subscribe(PickupConstraintUpdated, self.on_pickup)
+        bus.subscribe(ScheduleUpdated, self.on_schedule)
+        bus.subscribe(TaskStatusChanged, self.on_status)
+
+    def unsubscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.unsubscribe(TaskCreated, self.on_task_created)
+        bus.unsubscribe(PickupConstraintUpdated, self.on_pickup)
+        bus.unsubscribe(ScheduleUpdated, self.on_schedule)
+        bus.unsubscribe(TaskStatusChanged, self.on_status)
+
+    def on_task_created(self, event):
+        task = event.model
+        pickup = getattr(getattr(task.constraints, 'temporal', None), 'pickup', None)
+        if pickup is not None:
+            self.update_pickup(event.task_id, pickup.earliest_time, pickup.latest_time)
+        self.update_schedule(event.task_id, task.start_time, task.finish_time)
+
+    def on_pickup(self, event):
+        self.update_pickup(event.task_id, event.earliest_time, event.latest_time)
+
+    def on_schedule(self, event):
+        self.update_schedule(event.task_id, event.start_time, event.finish_time)
+
+    def on_status(self, event):
+        if event.status in FINISHED:
+            self.remove(event.task_id)
+
+    def update_pickup(self, task_id, earliest_time, latest_time):
+        if earliest_time is None or latest_time is None:
+            self.pickup.remove(task_id)
+        else:
+            self.pickup.add(task_id, earliest_time, latest_time)
+
+    def update_schedule(self, task_id, start_time, finish_time):
+        if start_time is None:
+            self.schedule.remove(task_id)
+        else:
+            self.schedule.add(task_id, start_time, finish_time if finish_time is not None else start_time)
+
+    def remove(self, task_id):
+        self.pickup.remove(task_id)
+        self.schedule.remove(task_id)
+
+    def executable(self, time):
+        """Returns the ids of the scheduled tasks starting at or before time
+        """
+        return [task_id for task_id, _, _ in self.schedule.starting_before(time)]
+
+    def earliest_pickup(self):
+        """Returns the id of the task with the earliest pickup, None if there is none
+        """
+        earliest = self.pickup.earliest()
+        return earliest[0] if earliest is not None else None
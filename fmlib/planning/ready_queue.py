@@ -0,0 +1,178 @@
+"""Timer-driven queue of the tasks ready to be executed
+
+Instead of polling Task.is_executable for every scheduled task, the queue
+keeps the scheduled tasks in a heap keyed on their start time and a timer
+thread sleeps until the earliest one is due. The callback is called once
+per task, when its start time is reached::
+
+    queue = ReadyQueue.from_db(self.dispatch)
+    queue.subscribe()
+    queue.start()
+
+The queue holds the tasks whose status is SCHEDULED and that have a start
+time, whichever of the two is set last. Tasks are re-keyed when their
+schedule is updated and dropped when their status changes again, e.g. when
+they are dispatched. After a restart, from_db rebuilds the queue with the
+same rule, through an indexed query over the scheduled tasks.
+"""
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime
+
+from ropod.structs.status import TaskStatus as TaskStatusConst
+
+from fmlib.db.spool import breaker
+from fmlib.models.events import event_bus, ScheduleUpdated, TaskStatusChanged
+from fmlib.models.tasks import Task, TaskStatus
+
+
+class ReadyQueue:
+    """Calls callback with the task id of every task when its start time is reached
+
+    Args:
+        callback: Called from the timer thread, it should return quickly
+        clock: Function returning the current time, comparable with the start times
+    """
+
+    def __init__(self, callback, clock=datetime.now):
+        self.logger = logging.getLogger(__name__)
+        self.callback = callback
+        self.clock = clock
+        self._heap = list()
+        self._entries = dict()
+        # Ids of the SCHEDULED tasks, queued once they have a start time
+        self._scheduled = set()
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_db(cls, callback, **kwargs):
+        """Builds the queue from the SCHEDULED tasks
+        """
+        queue = cls(callback, **kwargs)
+        task_ids = [document['_id'] for document in
+                    TaskStatus._mongometa.collection.find({'status': TaskStatusConst.SCHEDULED}, {'_id': 1})]
+        queue._scheduled.update(task_ids)
+        for document in Task._mongometa.collection.find({'_id': {'$in': task_ids}, 'start_time': {'$ne': None}},
+                                                        {'start_time': 1}):
+            queue.schedule(document['_id'], document['start_time'])
+        return queue
+
+    def subscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.subscribe(ScheduleUpdated, self.on_schedule)
+        bus.subscribe(TaskStatusChanged, self.on_status)
+
+    def unsubscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.unsubscribe(ScheduleUpdated, self.on_schedule)
+        bus.unsubscribe(TaskStatusChanged, self.on_status)
+
+    def on_schedule(self, event):
+        with self._condition:
+            if event.task_id not in self._scheduled:
+                return
+            if event.start_time is None:
+                self.cancel(event.task_id)
+            else:
+                self.schedule(event.task_id, event.start_time)
+
+    def on_status(self, event):
+        if event.status != TaskStatusConst.SCHEDULED:
+            with self._condition:
+                self._scheduled.discard(event.task_id)
+                self.cancel(event.task_id)
+            return
+        document = breaker.read(Task._mongometa.collection.find_one, {'_id': event.task_id}, {'start_time': 1})
+        with self._condition:
+            self._scheduled.add(event.task_id)
+            if document is not None and document.get('start_time') is not None:
+                self.schedule(event.task_id, document['start_time'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, task_id):
+        return task_id in self._entries
+
+    def schedule(self, task_id, start_time):
+        """Adds the task, or moves it to its new start time
+        """
+        with self._condition:
+            self._invalidate(task_id)
+            entry = [start_time, next(self._counter), task_id]
+            self._entries[task_id] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                # The timer thread may be sleeping until a later start time
+                self._condition.notify()
+
+    def cancel(self, task_id):
+        with self._condition:
+            self._invalidate(task_id)
+
+    def _invalidate(self, task_id):
+        entry = self._entries.pop(task_id, None)
+        if entry is not None:
+            # Removed lazily when it reaches the top of the heap
+            entry[2] = None
+
+    def next_start_time(self):
+        with self._condition:
+            self._drop_invalid()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_invalid(self):
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+
+    def pop_ready(self):
+        """Removes and returns the ids of the tasks whose start time was reached
+        """
+        ready = list()
+        with self._condition:
+            now = self.clock()
+            self._drop_invalid()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, task_id = heapq.heappop(self._heap)
+                del self._entries[task_id]
+                ready.append(task_id)
+                self._drop_invalid()
+        return ready
+
+    def start(self):
+        with self._condition:
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='fmlib-ready-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                start_time = self.next_start_time()
+                if start_time is None:
+                    self._condition.wait()
+                    continue
+                delay = (start_time - self.clock()).total_seconds()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+            for task_id in self.pop_ready():
+                try:
+                    self.callback(task_id)
+                except Exception:
+                    self.logger.error("Ready queue callback failed for task %s", task_id, exc_info=True)
@@ -0,0 +1,169 @@
+"""Spatial index of the available robots
+
+A uniform grid over the robot positions answering k-nearest and
+within-radius queries by visiting only the cells around the query point.
+Only robots whose availability is in ``statuses`` are indexed, so busy or
+disconnected robots cost nothing at query time. The grid is updated
+incrementally from the robot events of fmlib.models.events::
+
+    index = GridIndex.from_fleet(FleetState.from_db(), cell_size=5.0)
+    index.subscribe()
+    robots = index.nearest(pickup.x, pickup.y, k=3)
+"""
+import math
+import threading
+
+from ropod.structs.status import AvailabilityStatus
+
+from fmlib.models.events import event_bus, RobotPositionUpdated, RobotStatusUpdated
+
+
+class GridIndex:
+    """Uniform grid of robot positions
+
+    Args:
+        cell_size: Side of the grid cells, in map units. Queries are fastest
+                   when a cell holds a few robots
+        statuses: Availability statuses of the indexed robots
+    """
+
+    def __init__(self, cell_size=5.0, statuses=(AvailabilityStatus.IDLE,)):
+        self.cell_size = cell_size
+        self.statuses = set(statuses)
+        self._cells = dict()
+        # Position and cell of every robot, indexed or not
+        self._positions = dict()
+        self._availability = dict()
+        self._indexed = dict()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_fleet(cls, fleet, **kwargs):
+        """Builds the index from a fmlib.planning.fleet.FleetState
+        """
+        index = cls(**kwargs)
+        for robot_id, (x, y, _), availability in zip(fleet.robot_ids, fleet.poses.tolist(),
+                                                      fleet.availability.tolist()):
+            index.update_status(robot_id, availability)
+            index.update_position(robot_id, x, y)
+        return index
+
+    def subscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.subscribe(RobotPositionUpdated, self.on_position)
+        bus.subscribe(RobotStatusUpdated, self.on_status)
+
+    def unsubscribe(self, bus=None):
+        bus = bus or event_bus
+        bus.unsubscribe(RobotPositionUpdated, self.on_position)
+        bus.unsubscribe(RobotStatusUpdated, self.on_status)
+
+    def on_position(self, event):
+        self.update_position(event.robot_id, event.x, event.y)
+
+    def on_status(self, event):
+        if event.availability is not None:
+            self.update_status(event.robot_id, event.availability)
+
+    def __len__(self):
+        return len(self._indexed)
+
+    def __contains__(self, robot_id):
+        return robot_id in self._indexed
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def update_position(self, robot_id, x, y):
+        with self._lock:
+            if x is None or y is None or math.isnan(x) or math.isnan(y):
+                self._positions.pop(robot_id, None)
+            else:
+                self._positions[robot_id] = (x, y, self._cell(x, y))
+            self._reindex(robot_id)
+
+    def update_status(self, robot_id, availability):
+        with self._lock:
+            self._availability[robot_id] = availability
+            self._reindex(robot_id)
+
+    def remove(self, robot_id):
+        with self._lock:
+            self._positions.pop(robot_id, None)
+            self._availability.pop(robot_id, None)
+            self._reindex(robot_id)
+
+    def _reindex(self, robot_id):
+        position = self._positions.get(robot_id)
+        indexed = position if self._availability.get(robot_id) in self.statuses else None
+        previous = self._indexed.get(robot_id)
+        if previous is not None and (indexed is None or previous[2] != indexed[2]):
+            cell = self._cells[previous[2]]
+            del cell[robot_id]
+            if not cell:
+                del self._cells[previous[2]]
+        if indexed is None:
+            self._indexed.pop(robot_id, None)
+            return
+        self._cells.setdefault(indexed[2], dict())[robot_id] = indexed
+        self._indexed[robot_id] = indexed
+
+    def _ring(self, center, radius):
+        """Yields the occupied cells at Chebyshev distance radius from center
+        """
+        cx, cy = center
+        if radius == 0:
+            cells = [(cx, cy)]
+        else:
+            cells = [(cx + dx, cy + dy) for dx in range(-radius, radius + 1) for dy in (-radius, radius)]
+            cells += [(cx + dx, cy + dy) for dx in (-radius, radius) for dy in range(-radius + 1, radius)]
+        for cell in cells:
+            robots = self._cells.get(cell)
+            if robots:
+                yield robots
+
+    def within(self, x, y, radius):
+        """Returns the (robot_id, distance) of the indexed robots within radius of (x, y), closest first
+        """
+        with self._lock:
+            (min_cx, min_cy), (max_cx, max_cy) = self._cell(x - radius, y - radius), self._cell(x + radius, y + radius)
+            results = list()
+            if (max_cx - min_cx + 1) * (max_cy - min_cy + 1) > len(self._cells):
+                cells = self._cells.values()
+            else:
+                cells = [self._cells[(cx, cy)] for cx in range(min_cx, max_cx + 1)
+                         for cy in range(min_cy, max_cy + 1) if (cx, cy) in self._cells]
+            for robots in cells:
+                for robot_id, (rx, ry, _) in robots.items():
+                    distance = math.hypot(rx - x, ry - y)
+                    if distance <= radius:
+                        results.append((robot_id, distance))
+        results.sort(key=lambda result: result[1])
+        return results
+
+    def nearest(self, x, y, k=1):
+        """Returns the (robot_id, distance) of the k indexed robots closest to (x, y)
+        """
+        with self._lock:
+            center = self._cell(x, y)
+            candidates = list()
+            seen = 0
+            radius = 0
+            while seen < len(self._indexed):
+                if 8 * radius > len(self._cells):
+                    # The ring has more cells than are occupied, e.g. far from
+                    # any robot, compare with all the robots instead
+                    candidates = [(robot_id, math.hypot(rx - x, ry - y))
+                                  for robot_id, (rx, ry, _) in self._indexed.items()]
+                    break
+                for robots in self._ring(center, radius):
+                    seen += len(robots)
+                    candidates.extend((robot_id, math.hypot(rx - x, ry - y))
+                                      for robot_id, (rx, ry, _) in robots.items())
+                # Robots in the rings not visited yet are at least this far
+                if len(candidates) >= k and sorted(distance for _, distance in candidates)[k - 1] \
+                        <= radius * self.cell_size:
+                    break
+                radius += 1
+        candidates.sort(key=lambda result: result[1])
+        return candidates[:k]
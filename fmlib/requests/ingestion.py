@@ -0,0 +1,275 @@
+"""Bulk ingestion of transportation requests from JSON lines exports
+
+Feeding an export line by line through TransportationRequest.from_payload
+costs one Document, one dateutil parse and one save per request, plus two
+saves per task. The ingestion generator instead reads the file in chunks of
+lines, decodes, validates and converts every chunk, and writes it with one
+insert_many for the requests and, through TransportationTask.create_many,
+one for the tasks and one for their status. Only one chunk is held in memory
+at a time.
+
+The generator yields an IngestionProgress after every chunk is written. Its
+offset is the position in the file after the chunk, and the run can be
+resumed from it::
+
+    for progress in ingest('orders.jsonl', checkpoint='orders.checkpoint'):
+        logging.info("%.0f%% ingested", 100 * progress.fraction)
+
+With a checkpoint file, the offset and the counts of the progress are saved
+after every chunk and read when the ingestion starts again.
+
+Every line is a request payload, e.g. as produced by
+TransportationRequest.to_dict or formatted for a message, or a message with
+such a payload. Invalid lines, and requests whose request_id was already
+ingested, are skipped and reported in the progress.
+"""
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+
+import dateutil.parser
+import inflection
+from pymongo.errors import BulkWriteError
+
+from fmlib.db.spool import breaker, SAVE
+from fmlib.models.requests import TransportationRequest
+from fmlib.models.tasks import Task, TransportationTask
+
+# Request fields, by their key in the payload
+FIELDS = {inflection.camelize(name, False): name for name in ['request_id', 'user_id', 'pickup_location',
+                                                                 'delivery_location', 'earliest_pickup_time',
+                                                                 'latest_pickup_time', 'load_type', 'load_id',
+                                                                 'priority', 'hard_constraints']}
+FIELDS.update({name: name for name in list(FIELDS.values())})
+DUPLICATE_KEY = 11000
+TIME_FIELDS = ('earliest_pickup_time', 'latest_pickup_time')
+TRUE_STRINGS = ('true', 'yes', '1')
+FALSE_STRINGS = ('false', 'no', '0')
+
+
+class IngestionProgress:
+    """State of an ingestion after a chunk was written
+
+    Attributes:
+        offset: Position in the file after the chunk, to resume from
+        size: Size of the file
+        lines: Lines read so far
+        requests: Requests written so far
+        errors: (offset, error) of the invalid lines of the chunk
+    """
+
+    __slots__ = ['offset', 'size', 'lines', 'requests', 'errors']
+
+    def __init__(self, offset, size, lines=0, requests=0, errors=None):
+        self.offset = offset
+        self.size = size
+        self.lines = lines
+        self.requests = requests
+        self.errors = errors or list()
+
+    @property
+    def fraction(self):
+        return self.offset / self.size if self.size else 1.0
+
+    def __repr__(self):
+        return "<IngestionProgress offset=%s/%s lines=%s requests=%s errors=%s>" % (
+            self.offset, self.size, self.lines, self.requests, len(self.errors))
+
+
+def read_checkpoint(path):
+    """Returns the offset, lines and requests saved in the checkpoint file, zeros if there is none
+    """
+    if path is None or not os.path.exists(path):
+        return 0, 0, 0
+    with open(path) as file_handle:
+        checkpoint = json.load(file_handle)
+    return checkpoint['offset'], checkpoint['lines'], checkpoint['requests']
+
+
+def write_checkpoint(path, progress):
+    tmp_file = path + '.tmp'
+    with open(tmp_file, 'w') as file_handle:
+        json.dump({'offset': progress.offset, 'lines': progress.lines, 'requests': progress.requests}, file_handle)
+    os.replace(tmp_file, path)
+
+
+def parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        # A format fromisoformat does not support, e.g. a Z suffix
+        return dateutil.parser.parse(value)
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS + FALSE_STRINGS:
+        return value.strip().lower() in TRUE_STRINGS
+    raise ValueError("Invalid boolean %r" % (value,))
+
+
+def to_request(payload):
+    """Validates a request payload and converts it into a TransportationRequest
+
+    Raises:
+        ValueError: If the payload is not a valid request
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Expected a JSON object")
+    if isinstance(payload.get('payload'), dict):
+        payload = payload['payload']
+    kwargs = {FIELDS[key]: value for key, value in payload.items() if key in FIELDS}
+
+    if kwargs.get('request_id') is None:
+        raise ValueError("Missing request_id")
+    kwargs['request_id'] = uuid.UUID(str(kwargs['request_id']))
+    for name in TIME_FIELDS:
+        if kwargs.get(name) is None:
+            raise ValueError("Missing %s" % name)
+        kwargs[name] = parse_time(kwargs[name])
+    if kwargs['earliest_pickup_time'] > kwargs['latest_pickup_time']:
+        raise ValueError("earliest_pickup_time is after latest_pickup_time")
+    if 'priority' in kwargs:
+        kwargs['priority'] = int(kwargs['priority'])
+    if 'hard_constraints' in kwargs:
+        kwargs['hard_constraints'] = parse_bool(kwargs['hard_constraints'])
+    return TransportationRequest(**kwargs)
+
+
+def read_chunks(file_handle, chunk_size, offset=0):
+    """Yields the (offset, line) of up to chunk_size lines and the offset after them
+
+    Args:
+        file_handle: File opened in binary mode, at offset
+    """
+    chunk = list()
+    for line in file_handle:
+        chunk.append((offset, line))
+        offset += len(line)
+        if len(chunk) == chunk_size:
+            yield chunk, offset
+            chunk = list()
+    if chunk:
+        yield chunk, offset
+
+
+def convert(chunk):
+    """Returns the (offset, request) of a chunk of lines and the (offset, error) of the invalid ones
+    """
+    requests, errors = list(), list()
+    for offset, line in chunk:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            requests.append((offset, to_request(json.loads(line.decode('utf-8')))))
+        except (ValueError, TypeError) as error:
+            errors.append((offset, str(error)))
+    return requests, errors
+
+
+def _duplicate(offset, request_id):
+    return offset, "Duplicate request_id %s" % request_id
+
+
+def write(requests, create_tasks=True, resumed=False):
+    """Inserts the new requests of a chunk and creates their tasks
+
+    The requests whose request_id appears earlier in the chunk or is already
+    in the database are skipped and reported as duplicates.
+
+    Args:
+        requests: (offset, TransportationRequest) of the chunk
+        resumed: The chunk is the first after a checkpoint, and may have been
+                 written partially by an interrupted run. Its requests
+                 already in the database are not reported, and their
+                 missing tasks are created
+
+    Returns:
+        written (int): Number of requests inserted
+        errors (list): (offset, error) of the duplicates
+    """
+    unique, errors = dict(), list()
+    for offset, request in requests:
+        if request.request_id in unique:
+            errors.append(_duplicate(offset, request.request_id))
+        else:
+            unique[request.request_id] = (offset, request)
+    if not unique:
+        return 0, errors
+
+    existing = {document['_id'] for document in TransportationRequest._mongometa.collection.find(
+        {'_id': {'$in': list(unique)}}, {'_id': 1})}
+    task_requests = [request for request_id, (_, request) in unique.items() if request_id not in existing]
+    if existing and resumed:
+        with_tasks = {document['request'] for document in Task._mongometa.collection.find(
+            {'request': {'$in': list(existing)}}, {'request': 1})}
+        task_requests += [unique[request_id][1] for request_id in existing if request_id not in with_tasks]
+    elif existing:
+        errors.extend(_duplicate(unique[request_id][0], request_id) for request_id in existing)
+
+    new = [request for request_id, (_, request) in unique.items() if request_id not in existing]
+    written = len(new)
+    if new:
+        try:
+            breaker.write_many(new, SAVE, TransportationRequest._mongometa.collection.insert_many,
+                               [request.to_son() for request in new], ordered=False)
+        except BulkWriteError as error:
+            # Inserted meanwhile by another process
+            failed = {new[write_error['index']].request_id for write_error in error.details['writeErrors']
+                      if write_error['code'] == DUPLICATE_KEY}
+            if len(failed) < len(error.details['writeErrors']):
+                raise
+            errors.extend(_duplicate(unique[request_id][0], request_id) for request_id in failed)
+            task_requests = [request for request in task_requests if request.request_id not in failed]
+            written -= len(failed)
+    if create_tasks and task_requests:
+        TransportationTask.create_many(task_requests)
+    return written, sorted(errors)
+
+
+def ingest(path, chunk_size=1000, offset=None, checkpoint=None, create_tasks=True):
+    """Ingests the transportation requests of a JSON lines file, see the module docstring
+
+    Args:
+        path: The JSON lines file
+        chunk_size: Lines decoded and written at once
+        offset: Position in the file to start from, by default the
+                checkpoint's offset or the beginning of the file. The lines
+                and requests of the progress are then counted from there
+        checkpoint: File the progress is saved to after every chunk
+        create_tasks: Create a TransportationTask for every request
+
+    Yields:
+        progress (IngestionProgress): After every chunk
+    """
+    logger = logging.getLogger(__name__)
+    lines, written = 0, 0
+    if offset is None:
+        offset, lines, written = read_checkpoint(checkpoint)
+    progress = IngestionProgress(offset, os.path.getsize(path), lines, written)
+    resumed = offset > 0
+    with open(path, 'rb') as file_handle:
+        file_handle.seek(offset)
+        for chunk, offset in read_chunks(file_handle, chunk_size, offset):
+            requests, errors = convert(chunk)
+            # Only the first chunk may have been partially written by an interrupted run
+            written, duplicates = write(requests, create_tasks, resumed=resumed)
+            resumed = False
+            errors = sorted(errors + duplicates)
+            for error_offset, error in errors:
+                logger.warning("Skipping invalid request at offset %s: %s", error_offset, error)
+            progress.offset = offset
+            progress.lines += len(chunk)
+            progress.requests += written
+            progress.errors = errors
+            if checkpoint is not None:
+                write_checkpoint(checkpoint, progress)
+            yield progress
@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture
+def store(request):
+    """An empty in-memory store, one database per test
+    """
+    pytest.importorskip('ropod')
+    pytest.importorskip('mongomock')
+    from fmlib.db.memory import MemoryStore
+    return MemoryStore('fmlib_test_%s' % request.node.name)
@@ -0,0 +1,12 @@
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('mongomock')
+
+
+def test_hot_path_benchmarks_run():
+    from fmlib.benchmarks import hot_paths
+
+    results = hot_paths.run(number=2)
+    assert set(results) == set(hot_paths.BENCHMARKS)
+    assert not hot_paths.compare(results, {'results': results}, threshold=0)
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('ropod')
+
+
+def test_progress_events_report_the_changed_actions():
+    from fmlib.db.change_streams import task_status_events
+    from ropod.structs.status import ActionStatus
+
+    previous = {'status': 5, 'progress': {'current_action': 'a1', 'actions': [
+        {'action': 'a1', 'status': ActionStatus.ONGOING}, {'action': 'a2', 'status': ActionStatus.PLANNED}]}}
+    document = {'_id': 'task_1', 'status': 5, 'progress': {'current_action': 'a2', 'actions': [
+        {'action': 'a1', 'status': ActionStatus.COMPLETED}, {'action': 'a2', 'status': ActionStatus.PLANNED}]}}
+
+    events = list(task_status_events(document, previous, None))
+    assert [(event.action_id, event.action_status) for event in events] == [('a1', ActionStatus.COMPLETED)]
+
+
+def test_local_writes_are_not_published_again():
+    from fmlib.db.change_streams import ChangeStreamSource, robot_events
+    from fmlib.db.spool import SAVE
+    from fmlib.models.environment import Position
+    from fmlib.models.events import EventBus, RobotPositionUpdated
+    from fmlib.models.robot import Robot
+
+    bus = EventBus()
+    received = list()
+    bus.subscribe(RobotPositionUpdated, received.append)
+    source = ChangeStreamSource(bus=bus)
+    versions = dict()
+
+    def change(robot):
+        document = robot.to_son().to_dict()
+        return {'operationType': 'replace', 'documentKey': {'_id': robot.robot_id}, 'fullDocument': document}
+
+    robot = Robot(robot_id='ropod_001', position=Position(x=1.0, y=2.0, theta=0.0))
+    source.on_local_write([robot], SAVE)
+    source._handle(change(robot), Robot, ['position', 'status'], robot_events, versions)
+    assert received == list()
+
+    robot.position = Position(x=3.0, y=2.0, theta=0.0)
+    source._handle(change(robot), Robot, ['position', 'status'], robot_events, versions)
+    assert [event.x for event in received] == [3.0]
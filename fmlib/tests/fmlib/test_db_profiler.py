@@ -0,0 +1,124 @@
+import threading
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('pymongo')
+
+from fmlib.monitoring.db_profiler import CommandProfiler
+
+request_ids = count()
+
+
+def command_event(command_name, collection, seconds=0.01, reply=None):
+    return SimpleNamespace(command_name=command_name, command={command_name: collection},
+                           connection_id=('localhost', 27017), request_id=next(request_ids),
+                           duration_micros=int(seconds * 1e6), reply=reply or {'n': 1, 'ok': 1})
+
+
+class Task:
+    """Model like call sites, profiled as part of this module
+
+    The events are sent from the methods themselves, which are then the
+    innermost call sites of the module.
+    """
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def save(self):
+        event = command_event('update', 'task', seconds=0.02)
+        self.profiler.started(event)
+        self.profiler.succeeded(event)
+
+    def archive(self):
+        self.save()
+        event = command_event('delete', 'task')
+        self.profiler.started(event)
+        self.profiler.succeeded(event)
+
+    @classmethod
+    def get_tasks(cls, profiler):
+        event = command_event('find', 'task', reply={'cursor': {'firstBatch': [{}, {}, {}]}, 'ok': 1})
+        profiler.started(event)
+        profiler.succeeded(event)
+
+
+def entries(report):
+    return {(entry['site'], entry['command'], entry['collection']): entry for entry in report['most_frequent']}
+
+
+def test_commands_are_grouped_per_call_site():
+    profiler = CommandProfiler(packages=(__name__,), enabled=True)
+    task = Task(profiler)
+    task.save()
+    task.save()
+    task.archive()
+    Task.get_tasks(profiler)
+
+    report = entries(profiler.report())
+    assert sorted(report) == [('Task.archive', 'delete', 'task'), ('Task.get_tasks', 'find', 'task'),
+                              ('Task.save', 'update', 'task')]
+    save = report[('Task.save', 'update', 'task')]
+    assert (save['calls'], save['documents'], save['failures']) == (3, 3, 0)
+    assert save['seconds'] == pytest.approx(0.06)
+    assert save['max_seconds'] == pytest.approx(0.02)
+    assert report[('Task.get_tasks', 'find', 'task')]['documents'] == 3
+    assert profiler.report()['slowest'][0]['site'] == 'Task.save'
+
+
+def test_nested_call_sites():
+    profiler = CommandProfiler(packages=(__name__,), depth=2, enabled=True)
+    task = Task(profiler)
+    # Called from threads, so that this test is not a call site itself
+    for method in (task.save, task.archive):
+        thread = threading.Thread(target=method)
+        thread.start()
+        thread.join()
+
+    assert sorted(entries(profiler.report())) == [('Task.archive', 'delete', 'task'),
+                                                  ('Task.archive > Task.save', 'update', 'task'),
+                                                  ('Task.save', 'update', 'task')]
+
+
+def test_unknown_call_sites_and_failures():
+    profiler = CommandProfiler(enabled=True)
+    event = command_event('insert', 'robot')
+    profiler.started(event)
+    profiler.failed(event)
+
+    entry, = profiler.report()['most_frequent']
+    assert (entry['site'], entry['calls'], entry['failures']) == ('unknown', 1, 1)
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = CommandProfiler(packages=(__name__,))
+    Task(profiler).save()
+    assert profiler.report()['most_frequent'] == []
+
+    profiler.enable()
+    Task(profiler).save()
+    profiler.clear()
+    assert profiler.report()['most_frequent'] == []
+
+
+def test_db_profile_resource_reports_the_call_sites():
+    pytest.importorskip('ropod')
+    testing = pytest.importorskip('falcon.testing')
+    from fmlib.api.rest.interface import RESTInterface
+    from fmlib.api.rest.resources import DBProfile
+
+    profiler = CommandProfiler(packages=(__name__,), enabled=True)
+    interface = RESTInterface({'mode': 'threaded'})
+    interface.add_route('/db/profile', DBProfile)
+    interface.resources[0].profiler = profiler
+    task = Task(profiler)
+    task.archive()
+    task.archive()
+
+    response = testing.TestClient(interface.app).simulate_get('/db/profile', params={'top': 1})
+    assert response.status_code == 200
+    slowest, = response.json['slowest']
+    assert (slowest['site'], slowest['command'], slowest['calls']) == ('Task.save', 'update', 2)
+    assert [entry['site'] for entry in response.json['most_frequent']] in (['Task.save'], ['Task.archive'])
@@ -0,0 +1,32 @@
+from fmlib.models.events import Event, EventBus, RobotPositionUpdated, TaskEvent, TaskStatusChanged
+
+
+def test_subscribers_receive_subtypes():
+    bus = EventBus()
+    all_events, task_events, status_events = list(), list(), list()
+    bus.subscribe(Event, all_events.append)
+    bus.subscribe(TaskEvent, task_events.append)
+    bus.subscribe(TaskStatusChanged, status_events.append)
+
+    bus.publish(TaskStatusChanged('task_1', 2))
+    bus.publish(RobotPositionUpdated('ropod_001', 1.0, 2.0, 0.0))
+
+    assert len(all_events) == 2
+    assert len(task_events) == 1
+    assert status_events[0].status == 2
+
+
+def test_failing_subscriber_does_not_stop_delivery():
+    bus = EventBus()
+    received = list()
+
+    def fail(event):
+        raise RuntimeError
+
+    bus.subscribe(TaskStatusChanged, fail)
+    bus.subscribe(TaskStatusChanged, received.append)
+    bus.publish(TaskStatusChanged('task_1', 2))
+    bus.unsubscribe(TaskStatusChanged, received.append)
+    bus.publish(TaskStatusChanged('task_1', 3))
+
+    assert [event.status for event in received] == [2]
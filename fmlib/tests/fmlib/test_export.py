@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('mongomock')
+pytest.importorskip('numpy')
+
+
+def test_archive_export_to_npz(store, tmp_path):
+    from fmlib.db.export import export_archive, read_npz
+    from fmlib.models.tasks import TransportationTask
+    from ropod.structs.status import TaskStatus as TaskStatusConst
+
+    for robot_ids in (['ropod_001', 'ropod_002'], ['ropod_003']):
+        task = TransportationTask.create_new(assigned_robots=robot_ids)
+        task.update_schedule({'start_time': datetime(2020, 3, 5), 'finish_time': datetime(2020, 3, 5, 1)})
+        task.update_status(TaskStatusConst.COMPLETED)
+
+    path = str(tmp_path / 'tasks.npz')
+    assert export_archive(path, chunk_size=1) == 2
+    columns = read_npz(path)
+    assert columns['status'].tolist() == [TaskStatusConst.COMPLETED] * 2
+    assert columns['robot_offsets'].tolist() == [0, 2, 3]
+    assert columns['assigned_robots'].tolist() == ['ropod_001', 'ropod_002', 'ropod_003']
+    assert str(columns['finish_time'][0]) == '2020-03-05T01:00:00.000000'
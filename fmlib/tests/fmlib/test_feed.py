@@ -0,0 +1,107 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('falcon')
+
+
+def read_jsonl(stream, count):
+    return [json.loads(next(stream)) for _ in range(count)]
+
+
+def test_changes_are_fanned_out_to_every_subscription():
+    from fmlib.api.rest.feed import ChangeFeed
+
+    feed = ChangeFeed()
+    first, second = feed.subscribe(), feed.subscribe()
+    feed.publish('task-status', {'status': 1})
+    feed.publish('task-status', {'status': 2})
+    feed.unsubscribe(second)
+    feed.publish('task-status', {'status': 3})
+
+    entries, dropped = first.get(0)
+    assert [sequence for sequence, _, _ in entries] == [1, 2, 3]
+    assert dropped == 0
+    entries, dropped = second.get(0)
+    assert entries == [(1, 'task-status', {'status': 1}), (2, 'task-status', {'status': 2})]
+    assert feed.sequence == 3
+
+
+def test_slow_client_is_told_how_many_changes_were_dropped():
+    from fmlib.api.rest.feed import ChangeFeed, TaskStatusStream
+
+    feed = ChangeFeed()
+    stream = TaskStatusStream(feed=feed, heartbeat=0)
+    subscription = feed.subscribe(buffer_size=2)
+    for status in range(5):
+        feed.publish('task-status', {'status': status})
+
+    lines = read_jsonl(stream._stream(subscription, stream._encode_jsonl, b'\n'), 3)
+    assert lines[0] == {'seq': None, 'event': 'overflow', 'data': {'dropped': 3}}
+    assert [line['seq'] for line in lines[1:]] == [4, 5]
+
+
+def test_subscription_resumes_from_the_history():
+    from fmlib.api.rest.feed import ChangeFeed
+
+    feed = ChangeFeed(history_size=3)
+    for status in range(5):
+        feed.publish('task-status', {'status': status})
+
+    entries, dropped = feed.subscribe(since=3).get(0)
+    assert [sequence for sequence, _, _ in entries] == [4, 5]
+    assert dropped == 0
+    # Changes 2 to 5 were missed, 2 is not in the history anymore
+    entries, dropped = feed.subscribe(since=1).get(0)
+    assert [sequence for sequence, _, _ in entries] == [3, 4, 5]
+    assert dropped == 1
+
+
+def test_closing_the_feed_ends_the_streams():
+    from fmlib.api.rest.feed import ChangeFeed, TaskStatusStream
+
+    feed = ChangeFeed()
+    stream = TaskStatusStream(feed=feed, heartbeat=60)
+    subscription = feed.subscribe()
+    feed.publish('task-status', {'status': 1})
+    lines = list()
+
+    def read():
+        for line in stream._stream(subscription, stream._encode_jsonl, b'\n'):
+            lines.append(json.loads(line))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    stream.close()
+    reader.join(5)
+    assert not reader.is_alive()
+    assert [line['seq'] for line in lines] == [1]
+    # The feed still accepts new clients
+    feed.publish('task-status', {'status': 2})
+    assert feed.subscribe(since=1).get(0)[0][0][0] == 2
+
+
+def test_shutdown_ends_the_open_streams():
+    from http.client import HTTPConnection
+    from fmlib.api.rest.feed import ChangeFeed, TaskStatusStream
+    from fmlib.api.rest.interface import RESTInterface
+
+    feed = ChangeFeed()
+    interface = RESTInterface({'mode': 'threaded', 'port': 0})
+    interface.add_route('/tasks/stream', TaskStatusStream, feed=feed, heartbeat=60)
+    interface.start()
+    connection = HTTPConnection('127.0.0.1', interface.server.server_port, timeout=5)
+    feed.publish('task-status', {'status': 1})
+    try:
+        # The headers are only sent with the first change
+        connection.request('GET', '/tasks/stream?format=jsonl&since=0')
+        response = connection.getresponse()
+        assert json.loads(response.fp.readline())['seq'] == 1
+        interface.shutdown()
+        # The stream ends instead of waiting for the next heartbeat
+        assert response.read() == b''
+    finally:
+        connection.close()
+        interface.shutdown()
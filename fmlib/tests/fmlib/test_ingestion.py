@@ -0,0 +1,62 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('mongomock')
+
+
+def test_ingestion_resumes_from_checkpoint(tmp_path):
+    from fmlib.db.memory import MemoryStore
+    from fmlib.models.requests import TransportationRequest
+    from fmlib.models.tasks import TaskStatus, TransportationTask
+    from fmlib.requests.ingestion import ingest
+
+    MemoryStore('fmlib_test_ingestion')
+    now = datetime.now()
+    path = tmp_path / 'requests.jsonl'
+    with open(str(path), 'w') as file_handle:
+        for i in range(5):
+            payload = {'requestId': str(uuid.uuid4()), 'pickupLocation': 'AMK_D_L-1_C39',
+                       'earliestPickupTime': (now + timedelta(minutes=i)).isoformat(),
+                       'latestPickupTime': (now + timedelta(minutes=i + 1)).isoformat()}
+            file_handle.write(json.dumps(payload) + '\n')
+        file_handle.write('{"requestId": "not-a-uuid"}\n')
+    checkpoint = str(tmp_path / 'checkpoint')
+
+    for progress in ingest(str(path), chunk_size=2, checkpoint=checkpoint):
+        break
+    assert progress.requests == 2
+
+    progress_list = [(progress.requests, len(progress.errors)) for progress in
+                     ingest(str(path), chunk_size=2, checkpoint=checkpoint)]
+    assert progress_list == [(4, 0), (5, 1)]
+    assert TransportationRequest.objects.count() == 5
+    assert TransportationTask.objects.count() == 5
+    assert TaskStatus.objects.unallocated().count() == 5
+
+
+def test_ingestion_reports_duplicates(tmp_path):
+    from fmlib.db.memory import MemoryStore
+    from fmlib.models.requests import TransportationRequest
+    from fmlib.models.tasks import TransportationTask
+    from fmlib.requests.ingestion import ingest
+
+    MemoryStore('fmlib_test_ingestion_duplicates')
+    now = datetime.now()
+    payload = {'requestId': str(uuid.uuid4()), 'earliestPickupTime': now.isoformat(),
+               'latestPickupTime': (now + timedelta(minutes=1)).isoformat(), 'hardConstraints': 'false'}
+    path = str(tmp_path / 'requests.jsonl')
+    with open(path, 'w') as file_handle:
+        file_handle.write(json.dumps(payload) + '\n')
+        file_handle.write(json.dumps(payload) + '\n')
+
+    progress_list = [(progress.requests, len(progress.errors)) for progress in ingest(path)]
+    assert progress_list == [(1, 1)]
+    # Imported again
+    progress_list = [(progress.requests, len(progress.errors)) for progress in ingest(path)]
+    assert progress_list == [(0, 2)]
+    assert TransportationTask.objects.count() == 1
+    assert TransportationRequest.objects.get({}).hard_constraints is False
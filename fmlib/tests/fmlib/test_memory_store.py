@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('mongomock')
+
+
+def test_memory_store_recovers_from_snapshot_and_journal(tmp_path):
+    from fmlib.db.memory import MemoryStore
+    from fmlib.models.tasks import Task, TaskConstraints, TaskStatus
+    from ropod.structs.status import TaskStatus as TaskStatusConst
+
+    store = MemoryStore('fmlib_test', path=str(tmp_path))
+    first = Task.create_new(constraints=TaskConstraints())
+    store.snapshot()
+    second = Task.create_new(constraints=TaskConstraints())
+    second.update_status(TaskStatusConst.ALLOCATED)
+
+    MemoryStore('fmlib_test', path=str(tmp_path))
+    assert Task.get_task(first.task_id).task_id == first.task_id
+    allocated = TaskStatus.objects.by_status(TaskStatusConst.ALLOCATED)
+    assert [status.task.task_id for status in allocated] == [second.task_id]
+
+
+def test_memory_store_replays_bulk_writes_and_drops(tmp_path):
+    from fmlib.db.memory import MemoryStore
+    from pymodm import connection
+    from pymongo import ReplaceOne
+
+    MemoryStore('fmlib_test', path=str(tmp_path))
+    database = connection._get_db()
+    database.get_collection('statistics').bulk_write([ReplaceOne({'_id': 'GOTO'}, {'mean': 2.0}, upsert=True)])
+    database.get_collection('old').insert_one({'_id': 1})
+    database.drop_collection('old')
+
+    MemoryStore('fmlib_test', path=str(tmp_path))
+    database = connection._get_db()
+    assert database.get_collection('statistics').find_one({'_id': 'GOTO'})['mean'] == 2.0
+    assert 'old' not in database.list_collection_names()
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+pytest.importorskip('ropod')
+
+
+def test_message_cache_is_invalidated_by_every_mutator():
+    from fmlib.utils.messages import Message
+
+    msg = Message({'taskId': '1'}, message_type='TASK')
+    assert msg.to_json() is msg.to_json()
+
+    msg['extra'] = 1
+    assert json.loads(msg.to_json())['extra'] == 1
+    msg.pop('extra')
+    assert 'extra' not in json.loads(msg.to_json())
+    msg.setdefault('extra', 2)
+    assert json.loads(msg.to_json())['extra'] == 2
+    del msg['extra']
+    assert 'extra' not in json.loads(msg.to_json())
+    msg.clear()
+    assert msg.to_json() == '{}'
+
+
+def test_message_refresh_changes_the_serialized_header():
+    from fmlib.utils.messages import Message
+
+    msg = Message({'taskId': '1'}, message_type='TASK')
+    msg_id = json.loads(msg.to_json())['header']['msgId']
+    msg.refresh()
+    assert json.loads(msg.to_json())['header']['msgId'] != msg_id
@@ -0,0 +1,60 @@
+import pytest
+
+from fmlib.monitoring.metrics import Registry
+
+
+def test_disabled_registry_records_nothing():
+    registry = Registry()
+    counter = registry.counter('messages_total', 'Messages', ['type'])
+    counter.inc('TASK')
+    with registry.histogram('latency_seconds', 'Latency').time():
+        pass
+    assert counter.get('TASK') == 0
+    assert registry.get('latency_seconds').get() == (0.0, 0)
+
+
+def test_render_exposition_format():
+    registry = Registry(enabled=True)
+    registry.counter('messages_total', 'Messages', ['type']).inc('TASK', amount=2)
+    histogram = registry.histogram('latency_seconds', 'Latency', ['type'], buckets=(0.1, 1.0))
+    histogram.observe(0.5, 'TASK')
+
+    lines = registry.render().splitlines()
+    assert 'messages_total{type="TASK"} 2' in lines
+    assert 'latency_seconds_bucket{type="TASK",le="0.1"} 0' in lines
+    assert 'latency_seconds_bucket{type="TASK",le="+Inf"} 1' in lines
+    assert 'latency_seconds_count{type="TASK"} 1' in lines
+
+
+def test_summary_quantiles():
+    registry = Registry(enabled=True)
+    summary = registry.summary('hop_seconds', 'Hop latency', ['hop'], window=100)
+    for value in range(200):
+        summary.observe(value, 'transit')
+
+    assert summary.quantile(0.5, 'transit') == 150
+    assert 'hop_seconds{hop="transit",quantile="0.99"} 199' in registry.render().splitlines()
+
+
+def test_metric_without_samples_rendering_is_abstract():
+    from fmlib.monitoring.metrics import Metric
+
+    class Gauge(Metric):
+        type = 'gauge'
+
+    with pytest.raises(TypeError):
+        Gauge('robots', 'Robots', registry=Registry())
+
+
+def test_model_save_is_timed(store):
+    from fmlib.models.tasks import Task
+    from fmlib.monitoring.metrics import model_operation_seconds, registry
+
+    task = Task.create_new()
+    registry.enable()
+    try:
+        _, before = model_operation_seconds.get('save', 'Task')
+        task.save()
+        assert model_operation_seconds.get('save', 'Task')[1] == before + 1
+    finally:
+        registry.disable()
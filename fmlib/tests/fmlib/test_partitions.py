@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('mongomock')
+
+
+def test_archive_is_partitioned_by_finish_time(store):
+    from fmlib.models.tasks import task_archive, task_status_archive, TransportationTask
+    from ropod.structs.status import TaskStatus as TaskStatusConst
+
+    tasks = list()
+    for month in (1, 2, 3):
+        task = TransportationTask.create_new()
+        task.update_schedule({'start_time': datetime(2020, month, 5), 'finish_time': datetime(2020, month, 5, 1)})
+        task.update_status(TaskStatusConst.COMPLETED)
+        tasks.append(task)
+
+    assert task_status_archive.partitions() == ['task_status_archive_2020_01', 'task_status_archive_2020_02',
+                                                'task_status_archive_2020_03']
+    february = list(task_archive.find(start=datetime(2020, 2, 1), end=datetime(2020, 3, 1)))
+    assert [document['_id'] for document in february] == [tasks[1].task_id]
+    assert task_archive.drop(before=datetime(2020, 3, 1)) == ['task_archive_2020_01', 'task_archive_2020_02']
+    assert task_archive.count() == 1
+
+
+def test_archive_partition_indexes_are_created_after_reconnect(store, monkeypatch):
+    from fmlib.db.spool import breaker, CLOSED, OPEN
+    from fmlib.models.tasks import task_archive, TransportationTask
+
+    monkeypatch.setattr(breaker, 'enabled', True)
+    monkeypatch.setattr(breaker, 'state', OPEN)
+    key = (TransportationTask._mongometa.connection_alias, 'task_archive_2019_07')
+    with task_archive.partition(TransportationTask, datetime(2019, 7, 5)):
+        pass
+    assert key not in task_archive._indexed
+
+    breaker.state = CLOSED
+    with task_archive.partition(TransportationTask, datetime(2019, 7, 5)) as model:
+        assert 'finish_time_1' in model._mongometa.collection.index_information()
+    assert key in task_archive._indexed
@@ -0,0 +1,251 @@
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('numpy')
+
+
+def test_fleet_state_queries():
+    from fmlib.planning.fleet import FleetState
+    from ropod.structs.status import AvailabilityStatus
+
+    fleet = FleetState(capacity=2)
+    for i, (x, y) in enumerate([(0, 0), (1, 0), (5, 5), (2, 0)]):
+        fleet.update_position('ropod_%s' % i, x, y, 0.0)
+        fleet.update_status('ropod_%s' % i, availability=AvailabilityStatus.IDLE)
+    fleet.update_status('ropod_1', availability=AvailabilityStatus.BUSY)
+    fleet.update_status('ropod_4', availability=AvailabilityStatus.IDLE)
+
+    idle = dict(availability=AvailabilityStatus.IDLE)
+    assert [robot for robot, _ in fleet.nearest(0, 0, k=2, **idle)] == ['ropod_0', 'ropod_3']
+    assert [robot for robot, _ in fleet.within(0, 0, 1.5)] == ['ropod_0', 'ropod_1']
+
+    fleet.remove('ropod_0')
+    assert 'ropod_0' not in fleet
+    assert fleet.pose('ropod_3') == (2.0, 0.0, 0.0)
+    assert fleet.robots(fleet.mask(**idle)) == ['ropod_4', 'ropod_2', 'ropod_3']
+
+
+def test_fleet_state_added_robot_does_not_inherit_a_removed_row():
+    from fmlib.planning.fleet import FleetState
+    from ropod.structs.status import AvailabilityStatus, ComponentStatus
+
+    fleet = FleetState()
+    fleet.update_position('a', 0, 0, 0.0)
+    fleet.update_status('b', availability=AvailabilityStatus.IDLE, component_status=ComponentStatus.OPTIMAL + 1)
+    fleet.remove('a')
+    fleet.update_position('c', 1, 0, 0.0)
+
+    assert fleet.availability.tolist() == [AvailabilityStatus.IDLE, AvailabilityStatus.NO_COMMUNICATION]
+    assert fleet.component_status.tolist()[1] == ComponentStatus.OPTIMAL
+    assert fleet.nearest(0, 0, availability=AvailabilityStatus.IDLE) == list()
+
+
+def test_grid_index_matches_fleet_state():
+    import random
+    from fmlib.planning.fleet import FleetState
+    from fmlib.planning.spatial import GridIndex
+    from ropod.structs.status import AvailabilityStatus
+
+    random.seed(0)
+    fleet = FleetState()
+    for i in range(200):
+        fleet.update_position('ropod_%s' % i, random.uniform(0, 100), random.uniform(0, 100), 0.0)
+        fleet.update_status('ropod_%s' % i, random.choice([AvailabilityStatus.IDLE, AvailabilityStatus.BUSY]))
+    index = GridIndex.from_fleet(fleet, cell_size=7.0)
+
+    for _ in range(50):
+        x, y = random.uniform(-10, 110), random.uniform(-10, 110)
+        expected = fleet.nearest(x, y, k=5, availability=AvailabilityStatus.IDLE)
+        assert [robot for robot, _ in index.nearest(x, y, k=5)] == [robot for robot, _ in expected]
+        expected = fleet.within(x, y, 15, availability=AvailabilityStatus.IDLE)
+        assert [robot for robot, _ in index.within(x, y, 15)] == [robot for robot, _ in expected]
+
+    robot_id = index.nearest(50, 50)[0][0]
+    index.update_status(robot_id, AvailabilityStatus.BUSY)
+    assert robot_id not in index
+
+
+def test_grid_index_nearest_far_from_robots():
+    import time
+    from fmlib.planning.spatial import GridIndex
+    from ropod.structs.status import AvailabilityStatus
+
+    index = GridIndex(cell_size=1.0)
+    for robot_id, x in [('ropod_001', 0.0), ('ropod_002', 2000.0)]:
+        index.update_position(robot_id, x, 0.0)
+        index.update_status(robot_id, AvailabilityStatus.IDLE)
+
+    start = time.perf_counter()
+    assert [robot_id for robot_id, _ in index.nearest(1990.0, 0.0, k=2)] == ['ropod_002', 'ropod_001']
+    assert time.perf_counter() - start < 0.1
+
+
+def test_interval_tree_queries():
+    import random
+    from fmlib.planning.intervals import IntervalTree
+
+    random.seed(0)
+    tree, intervals = IntervalTree(), dict()
+    for key in range(500):
+        start = random.uniform(0, 1000)
+        intervals[key] = (start, start + random.uniform(0, 20))
+        tree.add(key, *intervals[key])
+    for key in range(0, 500, 3):
+        tree.remove(key)
+        del intervals[key]
+    tree.add(1, 5.0, 6.0)
+    intervals[1] = (5.0, 6.0)
+
+    def ordered(keys):
+        return sorted(keys, key=lambda key: (intervals[key][0], key))
+
+    for _ in range(50):
+        start = random.uniform(-10, 1010)
+        end = start + random.uniform(0, 50)
+        overlapping = [key for key, (s, e) in intervals.items() if s <= end and e >= start]
+        assert [key for key, _, _ in tree.overlapping(start, end)] == ordered(overlapping)
+        before = [key for key, (s, _) in intervals.items() if s <= start]
+        assert [key for key, _, _ in tree.starting_before(start)] == ordered(before)
+    assert tree.earliest()[0] == ordered(intervals)[0]
+
+
+def test_find_conflicts_and_gaps():
+    from datetime import datetime, timedelta
+
+    import numpy as np
+    from fmlib.planning.conflicts import find_conflicts
+
+    start = datetime(2020, 1, 1)
+    schedule = [('ropod_1', 'long', 0, 60), ('ropod_1', 'inside', 10, 20), ('ropod_1', 'after', 30, 70),
+                ('ropod_1', 'later', 100, 110), ('ropod_2', 'other', 0, 10), ('ropod_2', 'next', 11, 20)]
+    robots, tasks, starts, finishes = zip(*[(robot, task, start + timedelta(minutes=s), start + timedelta(minutes=f))
+                                            for robot, task, s, f in schedule])
+    report = find_conflicts(np.array(robots, dtype=object), np.array(tasks, dtype=object),
+                            np.array(starts, dtype='datetime64[us]'), np.array(finishes, dtype='datetime64[us]'),
+                            min_gap=timedelta(minutes=5))
+
+    assert report['ropod_1']['conflicts'] == [('long', 'inside', 600.0), ('long', 'after', 1800.0)]
+    assert report['ropod_1']['gaps'] == [('after', 'later', 1800.0)]
+    assert report['ropod_2'] == {'conflicts': [], 'gaps': []}
+
+
+def test_load_schedules_keeps_the_caller_filter(store):
+    from datetime import datetime
+    from fmlib.models.tasks import Task
+    from fmlib.planning.conflicts import load_schedules
+
+    early = Task.create_new(start_time=datetime(2020, 1, 1), assigned_robots=['ropod_1'])
+    late = Task.create_new(start_time=datetime(2020, 1, 2), assigned_robots=['ropod_1', 'ropod_2'])
+    Task.create_new(assigned_robots=['ropod_1'])
+    Task.create_new(start_time=datetime(2020, 1, 3))
+
+    robot_ids, task_ids, _, _ = load_schedules()
+    assert sorted(set(task_ids)) == sorted([early.task_id, late.task_id])
+    robot_ids, task_ids, _, _ = load_schedules({'start_time': {'$gte': datetime(2020, 1, 2)}})
+    assert list(robot_ids) == ['ropod_1', 'ropod_2']
+    assert list(task_ids) == [late.task_id, late.task_id]
+
+
+def test_merged_duration_statistics_match_batch_statistics():
+    import numpy as np
+    from fmlib.planning.durations import merge
+
+    durations = np.random.RandomState(0).uniform(10, 100, 50)
+    count, mean, m2 = 0, 0.0, 0.0
+    for batch in np.split(durations, [7, 20, 21]):
+        batch_mean = batch.mean()
+        count, mean, m2 = merge(count, mean, m2, len(batch), batch_mean, ((batch - batch_mean) ** 2).sum())
+
+    assert count == 50
+    assert np.isclose(mean, durations.mean())
+    assert np.isclose(m2 / (count - 1), durations.var(ddof=1))
+
+
+def test_duration_learner_observes_change_stream_events():
+    import uuid
+    from datetime import datetime, timedelta
+    from types import SimpleNamespace
+    from fmlib.models.events import CHANGE_STREAM, TaskProgressUpdated
+    from fmlib.planning.durations import DurationLearner
+    from ropod.structs.status import ActionStatus
+
+    action_id, start = uuid.uuid4(), datetime(2020, 3, 5)
+    action = SimpleNamespace(start_time=start, finish_time=start + timedelta(seconds=30))
+    model = SimpleNamespace(progress=SimpleNamespace(get_action=lambda requested_id: action))
+    learner = DurationLearner()
+    learner.on_progress(TaskProgressUpdated('task_1', action_id, ActionStatus.COMPLETED, model=model,
+                                            source=CHANGE_STREAM))
+    assert learner._pending == [(action_id, 30.0)]
+
+
+def test_ready_queue_rekeys_and_cancels():
+    from fmlib.planning.ready_queue import ReadyQueue
+
+    now = [0]
+    queue = ReadyQueue(callback=None, clock=lambda: now[0])
+    queue.schedule('task_1', 10)
+    queue.schedule('task_2', 5)
+    queue.schedule('task_3', 7)
+    queue.schedule('task_2', 20)
+    queue.cancel('task_3')
+
+    assert queue.next_start_time() == 10
+    now[0] = 15
+    assert queue.pop_ready() == ['task_1']
+    assert queue.pop_ready() == []
+    now[0] = 20
+    assert queue.pop_ready() == ['task_2']
+    assert len(queue) == 0
+
+
+def test_ready_queue_timer_wakes_up_for_an_earlier_task():
+    import threading
+    from datetime import datetime, timedelta
+    from fmlib.planning.ready_queue import ReadyQueue
+
+    ready, fired = list(), threading.Event()
+
+    def callback(task_id):
+        ready.append(task_id)
+        fired.set()
+
+    queue = ReadyQueue(callback)
+    queue.start()
+    try:
+        queue.schedule('later', datetime.now() + timedelta(minutes=10))
+        # The timer thread is sleeping until the later task
+        queue.schedule('soon', datetime.now() + timedelta(milliseconds=50))
+        assert fired.wait(2)
+    finally:
+        queue.stop()
+    assert ready == ['soon']
+
+
+def test_ready_queue_follows_the_scheduled_status():
+    pytest.importorskip('mongomock')
+    from datetime import datetime
+    from fmlib.db.memory import MemoryStore
+    from fmlib.models.events import EventBus, ScheduleUpdated, TaskStatusChanged
+    from fmlib.models.tasks import Task
+    from fmlib.planning.ready_queue import ReadyQueue
+    from ropod.structs.status import TaskStatus as TaskStatusConst
+
+    MemoryStore('fmlib_test_ready_queue')
+    bus = EventBus()
+    queue = ReadyQueue(callback=None)
+    queue.subscribe(bus)
+    start_time = datetime(2020, 1, 1, 10)
+    task = Task.create_new()
+    task.update_schedule({'start_time': start_time, 'finish_time': start_time})
+
+    # The schedule was set while the task was not SCHEDULED yet
+    bus.publish(ScheduleUpdated(task.task_id, task.start_time, task.finish_time))
+    assert task.task_id not in queue
+
+    task.update_status(TaskStatusConst.SCHEDULED)
+    bus.publish(TaskStatusChanged(task.task_id, TaskStatusConst.SCHEDULED))
+    assert queue.next_start_time() == start_time
+    assert task.task_id in ReadyQueue.from_db(callback=None)
+
+    bus.publish(TaskStatusChanged(task.task_id, TaskStatusConst.DISPATCHED))
+    assert task.task_id not in queue
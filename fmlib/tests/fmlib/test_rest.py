@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('ropod')
+
+
+def test_task_status_stream_is_only_served_threaded():
+    from fmlib.api.rest.feed import TaskStatusStream
+    from fmlib.api.rest.interface import RESTInterface
+
+    for mode in ('simple', 'gunicorn'):
+        with pytest.raises(ValueError):
+            RESTInterface({'mode': mode}).add_route('/tasks/stream', TaskStatusStream)
+    RESTInterface({'mode': 'threaded'}).add_route('/tasks/stream', TaskStatusStream)
+
+
+def test_collection_page_projects_the_query(store):
+    from fmlib.api.rest.resources import Tasks, TaskStatuses
+    from fmlib.models.tasks import Task, TaskStatus
+
+    tasks = sorted((Task.create_new(start_time=datetime(2020, 3, 5)) for _ in range(3)),
+                   key=lambda task: task.task_id)
+
+    page = json.loads(Tasks().get_page(None, 2, ['taskId', 'startTime']).decode('utf-8'))
+    assert page['items'] == [{'taskId': str(task.task_id), 'startTime': '2020-03-05 00:00:00'}
+                             for task in tasks[:2]]
+    assert page['next'] == str(tasks[1].task_id)
+    page = json.loads(Tasks().get_page(page['next'], 2, ['startTime']).decode('utf-8'))
+    assert page == {'items': [{'startTime': '2020-03-05 00:00:00'}], 'next': None}
+
+    # Projected items have the keys and values of the full items
+    full = json.loads(Tasks().get_page(None, 1).decode('utf-8'))['items'][0]
+    projected = json.loads(Tasks().get_page(None, 1, ['taskId', 'constraints']).decode('utf-8'))['items'][0]
+    assert projected == {'taskId': full['taskId'], 'constraints': full['constraints']}
+    full = json.loads(TaskStatuses().get_page(None, 3).decode('utf-8'))['items']
+    projected = json.loads(TaskStatuses().get_page(None, 3, ['taskId', 'status']).decode('utf-8'))['items']
+    assert projected == [{'taskId': item['taskId'], 'status': item['status']} for item in full]
+    assert TaskStatus.objects.count() == 3
+
+
+def test_collection_conditional_requests(store):
+    from falcon import testing
+    from fmlib.api.rest.interface import RESTInterface
+    from fmlib.api.rest.resources import Tasks
+    from fmlib.models.tasks import Task
+
+    Task.create_new()
+    interface = RESTInterface({'mode': 'threaded'})
+    interface.add_route('/tasks', Tasks, cache_ttl=0)
+    client = testing.TestClient(interface.app)
+
+    response = client.simulate_get('/tasks')
+    assert response.status_code == 200
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert client.simulate_get('/tasks', headers={'If-None-Match': etag}).status_code == 304
+    assert client.simulate_get('/tasks', headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert client.simulate_get('/tasks', headers={'If-None-Match': '"other"'}).status_code == 200
+
+    Task.create_new()
+    response = client.simulate_get('/tasks', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.json['items']) == 2
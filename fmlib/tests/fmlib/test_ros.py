@@ -0,0 +1,96 @@
+import sys
+import types
+
+import pytest
+
+pytest.importorskip('ropod')
+
+
+class ROSException(Exception):
+    pass
+
+
+class ROSInterruptException(ROSException):
+    pass
+
+
+class StubTime:
+    def __init__(self, secs=0, nsecs=0):
+        self.secs = secs
+        self.nsecs = nsecs
+
+    @classmethod
+    def from_sec(cls, value):
+        return cls(int(value), int((value - int(value)) * 1e9))
+
+
+class StubPublisher:
+    def __init__(self, topic, msg_class, queue_size=None):
+        self.topic = topic
+        self.msg_class = msg_class
+        self.published = list()
+
+    def publish(self, msg):
+        if msg.task_id == 'unserializable':
+            raise ROSException("Could not serialize")
+        self.published.append(msg)
+
+
+def stub_message(name, slots, slot_types):
+    def __init__(self):
+        for slot in slots:
+            setattr(self, slot, None)
+    return type(name, (object,), {'__slots__': slots, '_slot_types': slot_types, '__init__': __init__})
+
+
+@pytest.fixture
+def ros_interface(monkeypatch):
+    rospy = types.ModuleType('rospy')
+    rospy.Time = rospy.Duration = StubTime
+    rospy.Publisher = StubPublisher
+    rospy.ROSException = ROSException
+    rospy.ROSInterruptException = ROSInterruptException
+    for name in ['init_node', 'on_shutdown', 'loginfo', 'logerr']:
+        setattr(rospy, name, lambda *args, **kwargs: None)
+    rospy.is_shutdown = lambda: False
+
+    msg_module = types.ModuleType('stub_msgs.msg')
+    msg_module.Pose = stub_message('Pose', ['x', 'y'], ['float64', 'float64'])
+    msg_module.Task = stub_message('Task', ['task_id', 'start_time', 'poses'],
+                                   ['string', 'time', 'stub_msgs/Pose[]'])
+
+    monkeypatch.setitem(sys.modules, 'rospy', rospy)
+    monkeypatch.setitem(sys.modules, 'stub_msgs', types.ModuleType('stub_msgs'))
+    monkeypatch.setitem(sys.modules, 'stub_msgs.msg', msg_module)
+    monkeypatch.delitem(sys.modules, 'fmlib.api.ros', raising=False)
+
+    from fmlib.api.ros import ROSInterface
+    publishers = [{'topic': '/task', 'msg_type': 'Task', 'msg_module': 'stub_msgs.msg'}]
+    return ROSInterface(publishers=publishers, publish={'task': {'method': 'publish', 'topic': '/task'}},
+                        batch_size=2)
+
+
+def test_publish_converts_payload(ros_interface):
+    msg = {'header': {'type': 'TASK'},
+           'payload': {'taskId': 'abc', 'startTime': 1.5, 'poses': [{'x': 1.0, 'y': 2.0}]}}
+    for _ in range(3):
+        ros_interface.publish(msg)
+
+    ros_interface.run()
+    published = ros_interface._publisher_dict['/task'].published
+    assert len(published) == 2
+
+    ros_interface.run()
+    assert len(published) == 3
+    assert published[0].task_id == 'abc'
+    assert published[0].start_time.secs == 1
+    assert published[0].poses[0].y == 2.0
+
+
+def test_failed_publish_does_not_drop_the_batch(ros_interface):
+    for task_id in ['abc', 'unserializable', 'def']:
+        ros_interface.publish({'header': {'type': 'TASK'}, 'payload': {'taskId': task_id}})
+
+    assert ros_interface.flush() == 2
+    published = ros_interface._publisher_dict['/task'].published
+    assert [msg.task_id for msg in published] == ['abc', 'def']
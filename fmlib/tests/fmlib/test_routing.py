@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('ropod')
+
+LATE_IMPORT = '''
+from fmlib.db import mongo
+mongo.breaker.configure = lambda *args, **kwargs: None
+mongo.MongoStore('fmlib_test', routes={'hot': {'db_name': 'fmlib_test_hot'}})
+from fmlib.models.tasks import Task
+print(Task._mongometa.connection_alias)
+'''
+
+
+def test_models_imported_after_the_store_are_routed():
+    output = subprocess.check_output([sys.executable, '-c', LATE_IMPORT], env=dict(os.environ),
+                                     cwd=os.path.dirname(os.path.dirname(os.path.dirname(
+                                         os.path.dirname(os.path.abspath(__file__))))))
+    assert output.decode().split() == ['hot']
+
+
+def test_routes_take_the_pool_options_of_the_store(monkeypatch):
+    from pymodm import connection
+    from fmlib.db import mongo
+    from fmlib.db.routing import router
+    from fmlib.models.tasks import Task, TaskStatus
+
+    monkeypatch.setattr(mongo.breaker, 'configure', lambda *args, **kwargs: None)
+    try:
+        mongo.MongoStore('fmlib_test', alias='fmlib_test', maxPoolSize=20, w=1,
+                         routes={'fmlib_test_archive': {'db_name': 'fmlib_test_archive', 'maxPoolSize': 5,
+                                                        'collections': ['task_archive']}})
+        client = connection._get_db('fmlib_test_archive').client
+        assert client.options.pool_options.max_pool_size == 5
+        assert client.write_concern.document == {'w': 1}
+        assert router.alias('task_archive') == 'fmlib_test_archive'
+        assert Task._mongometa.connection_alias == 'default'
+        assert TaskStatus._mongometa.connection_alias == 'default'
+    finally:
+        router.clear()
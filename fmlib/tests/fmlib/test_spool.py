@@ -0,0 +1,131 @@
+import time
+
+import pytest
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+
+from fmlib.db.spool import CircuitBreaker, DELETE, OPEN, SAVE, StoreUnavailable, WriteSpool
+
+
+def unavailable():
+    raise ConnectionFailure
+
+
+@pytest.fixture
+def breaker():
+    breaker = CircuitBreaker()
+    breaker.configure(unavailable, reconnect_interval=60)
+    yield breaker
+    breaker.stop()
+
+
+def test_reads_fail_fast_while_the_circuit_is_open(breaker):
+    calls = list()
+
+    def slow_read():
+        calls.append(1)
+        time.sleep(1)
+
+    breaker.trip()
+    start = time.perf_counter()
+    with pytest.raises(StoreUnavailable):
+        breaker.read(slow_read)
+    assert time.perf_counter() - start < 0.1
+    assert calls == list()
+
+
+def test_failed_read_opens_the_circuit(breaker):
+    def timeout():
+        raise ServerSelectionTimeoutError
+
+    with pytest.raises(StoreUnavailable):
+        breaker.read(timeout)
+    assert breaker.state == OPEN
+
+
+class Store:
+    """A MongoDB available or not, and the model written to it
+    """
+
+    def __init__(self):
+        pytest.importorskip('mongomock')
+        from pymodm import fields, MongoModel
+        from fmlib.db.memory import MemoryStore
+
+        class Item(MongoModel):
+            item_id = fields.IntegerField(primary_key=True)
+            name = fields.CharField()
+
+            class Meta:
+                connection_alias = 'fmlib_test_spool'
+                collection_name = 'item'
+                final = True
+
+        MemoryStore('fmlib_test_spool', alias='fmlib_test_spool')
+        self.model = Item
+        self.available = False
+
+    def ping(self):
+        if not self.available:
+            raise ConnectionFailure
+
+    def save(self, breaker, item):
+        breaker.write(item, SAVE, item.save)
+
+    @property
+    def documents(self):
+        return list(self.model._mongometa.collection.find(sort=[('_id', 1)]))
+
+
+def wait_closed(breaker, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not breaker.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return breaker.closed
+
+
+def test_writes_are_spooled_while_open_and_replayed_in_order():
+    store = Store()
+    breaker = CircuitBreaker()
+    breaker.configure(store.ping, reconnect_interval=0.01)
+    breaker.trip()
+    first, second = store.model(1, 'first'), store.model(2, 'second')
+    store.save(breaker, first)
+    store.save(breaker, second)
+    first.name = 'updated'
+    store.save(breaker, first)
+    breaker.write(second, DELETE, second.delete)
+    assert len(breaker.spool) == 4
+    assert store.documents == list()
+
+    store.available = True
+    assert wait_closed(breaker)
+    assert store.documents == [{'_id': 1, 'name': 'updated'}]
+    assert len(breaker.spool) == 0
+
+    # Trips right after closing start a new reconnect thread
+    store.available = False
+    breaker.trip()
+    store.save(breaker, second)
+    store.available = True
+    assert wait_closed(breaker)
+    assert [document['_id'] for document in store.documents] == [1, 2]
+    breaker.stop()
+
+
+def test_spool_survives_a_restart(tmp_path):
+    store = Store()
+    path = str(tmp_path / 'spool')
+    breaker = CircuitBreaker()
+    breaker.configure(store.ping, WriteSpool(path), reconnect_interval=60)
+    breaker.trip()
+    store.save(breaker, store.model(1, 'spooled'))
+    breaker.stop()
+
+    restarted = CircuitBreaker()
+    store.available = True
+    restarted.configure(store.ping, WriteSpool(path), reconnect_interval=0.01)
+    assert restarted.state == OPEN
+    assert wait_closed(restarted)
+    assert store.documents == [{'_id': 1, 'name': 'spooled'}]
+    assert len(WriteSpool(path)) == 0
+    restarted.stop()
@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('ropod')
+pytest.importorskip('mongomock')
+
+
+def test_create_new_saves_once_and_defaults_constraints(store, monkeypatch):
+    from fmlib.models.tasks import Task, TaskStatus, TransportationTask
+
+    saves = list()
+    save = Task.save
+
+    def counting_save(self, *args, **kwargs):
+        saves.append(self.task_id)
+        return save(self, *args, **kwargs)
+
+    monkeypatch.setattr(Task, 'save', counting_save)
+    task_id = uuid.uuid4()
+    task = TransportationTask.create_new(task_id=task_id)
+
+    assert saves == [task_id]
+    assert TransportationTask.get_task(task_id).pickup_constraint is not None
+    assert TaskStatus.objects.unallocated().count() == 1
+    assert task.task_id == task_id
+
+
+def test_create_new_defaults_task_id_and_constraints(store):
+    from fmlib.models.tasks import Task, TaskConstraints
+
+    task = Task.create_new()
+
+    assert isinstance(task.task_id, uuid.UUID)
+    assert isinstance(Task.get_task(task.task_id).constraints, TaskConstraints)
+
+
+def test_create_many_inserts_tasks_and_statuses(store):
+    from fmlib.models.requests import TransportationRequest
+    from fmlib.models.tasks import TaskStatus, TransportationTask
+
+    now = datetime.now()
+    requests = [TransportationRequest(request_id=uuid.uuid4(), earliest_pickup_time=now + timedelta(minutes=i),
+                                      latest_pickup_time=now + timedelta(minutes=i + 1)) for i in range(3)]
+    for request in requests:
+        request.save()
+    tasks = TransportationTask.create_many(requests)
+
+    assert [task.request.request_id for task in tasks] == [request.request_id for request in requests]
+    task = TransportationTask.get_task(tasks[2].task_id)
+    assert task.pickup_constraint.earliest_time.minute == requests[2].earliest_pickup_time.minute
+    assert TaskStatus.objects.unallocated().count() == 3
+
+
+def test_progress_update_does_not_load_the_task(store, monkeypatch):
+    import pymodm.common
+    from pymodm.dereference import dereference_id
+    from fmlib.models.actions import Action
+    from fmlib.models.events import event_bus, TaskProgressUpdated
+    from fmlib.models.tasks import Task, TaskPlan
+    from ropod.structs.status import ActionStatus
+
+    actions = [Action.create_new(type='GOTO'), Action.create_new(type='DOCK')]
+    task = Task.create_new()
+    task.update_plan(TaskPlan(actions=actions))
+    status = Task.get_task_status(task.task_id)
+    status.update_progress(actions[0].action_id, ActionStatus.ONGOING)
+
+    dereferenced, received = list(), list()
+    # pymodm looks the function up in its import cache
+    monkeypatch.setitem(pymodm.common._IMPORT_CACHE, 'pymodm.dereference.dereference_id',
+                        lambda *args: dereferenced.append(args[0]) or dereference_id(*args))
+    # Refreshing and saving with cascade load the task by themselves
+    status = Task.get_task_status(task.task_id)
+    status.refresh_from_db()
+    status.save(cascade=True)
+    saved = [model for model in dereferenced if issubclass(model, Task)]
+    del dereferenced[:]
+    status = Task.get_task_status(task.task_id)
+    event_bus.subscribe(TaskProgressUpdated, received.append)
+    try:
+        status.update_progress(actions[0].action_id, ActionStatus.COMPLETED)
+    finally:
+        event_bus.unsubscribe(TaskProgressUpdated, received.append)
+    assert [model for model in dereferenced if issubclass(model, Task)] == saved
+    assert [event.task_id for event in received] == [task.task_id]
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from fmlib.monitoring import tracing
+from fmlib.monitoring.metrics import Registry
+from fmlib.monitoring.tracing import Tracer
+
+
+class Clock:
+    """Stands in for perf_counter, advanced by the test
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tracing, 'time', SimpleNamespace(perf_counter=clock))
+    return clock
+
+
+def message(msg_type, msg_id, timestamp=None):
+    return {'header': {'type': msg_type, 'msgId': msg_id, 'timestamp': timestamp}, 'payload': dict()}
+
+
+def test_hop_latencies_of_a_received_message(clock):
+    tracer = Tracer(Registry(enabled=True))
+    sent = (datetime.now(timezone.utc) - timedelta(seconds=2)).isoformat()
+
+    context = tracer.received(message('TASK-REQUEST', 'request', sent))
+    assert tracer.current is context
+    clock.now += 0.25
+    tracer.callback_started(context)
+    tracer.add_db_time(0.5)
+    tracer.add_db_time(0.25)
+    clock.now += 1.5
+    tracer.finished(context)
+
+    transit, count = tracer.hop_seconds.get('TASK-REQUEST', 'transit')
+    assert count == 1 and 2 <= transit < 3
+    assert tracer.hop_seconds.get('TASK-REQUEST', 'dispatch') == (0.25, 1)
+    assert tracer.hop_seconds.get('TASK-REQUEST', 'callback') == (1.5, 1)
+    assert tracer.hop_seconds.get('TASK-REQUEST', 'db') == (0.75, 1)
+    assert tracer.round_trips.get('TASK-REQUEST') == (2, 1)
+    assert tracer.current is None
+
+
+def test_transit_of_a_naive_timestamp(clock):
+    tracer = Tracer(Registry(enabled=True))
+    sent = (datetime.now() - timedelta(seconds=5)).isoformat()
+    tracer.finished(tracer.received(message('TASK', 'task', sent)))
+
+    transit, count = tracer.hop_seconds.get('TASK', 'transit')
+    assert count == 1 and 5 <= transit < 6
+
+
+def test_invalid_timestamp_skips_the_transit_hop(clock):
+    tracer = Tracer(Registry(enabled=True))
+    tracer.finished(tracer.received(message('TASK', 'task', 'not a timestamp')))
+
+    assert tracer.hop_seconds.get('TASK', 'transit') == (0.0, 0)
+    assert tracer.hop_seconds.get('TASK', 'db') == (0.0, 1)
+
+
+def test_published_messages_are_chained_to_the_received_one(clock):
+    tracer = Tracer(Registry(enabled=True))
+    context = tracer.received(message('TASK-REQUEST', 'request'))
+    clock.now += 0.5
+    tracer.published(message('TASK', 'task'))
+    tracer.finished(context)
+    # Published outside of a callback, not linked
+    tracer.published(message('TASK', 'orphan'))
+
+    context = tracer.received(message('TASK', 'task'))
+    clock.now += 0.125
+    tracer.published(message('ROBOT-ASSIGNMENT', 'assignment'))
+    tracer.finished(context)
+
+    assert tracer.chain('assignment') == ['request', 'task', 'assignment']
+    assert tracer.chain('orphan') == ['orphan']
+    assert tracer.chain_seconds.get('TASK-REQUEST', 'TASK') == (0.5, 1)
+    assert tracer.chain_seconds.get('TASK', 'ROBOT-ASSIGNMENT') == (0.125, 1)
+
+
+def test_oldest_links_are_forgotten(clock):
+    tracer = Tracer(Registry(enabled=True), max_links=2)
+    for i in range(3):
+        context = tracer.received(message('TASK', str(i)))
+        tracer.published(message('TASK', str(i + 1)))
+        tracer.finished(context)
+
+    assert tracer.chain('3') == ['1', '2', '3']
+
+
+def test_disabled_registry_does_not_trace(clock):
+    tracer = Tracer(Registry())
+    context = tracer.received(message('TASK', 'task', datetime.now().isoformat()))
+    tracer.callback_started(context)
+    tracer.published(message('TASK', 'next'))
+    tracer.finished(context)
+
+    assert context is None
+    assert tracer.chain('next') == ['next']
+    assert tracer.hop_seconds.labels() == []
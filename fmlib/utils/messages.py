@@ -66,8 +66,20 @@ class Payload:
 
 
 class Message(dict):
+    """A message with a header and a payload
+
+    The JSON string of the message is computed once and cached, so that
+    publishing the same message through several middlewares or to several
+    recipients pays the serialization cost only once. Every change of a top level key, and
+    :meth:`refresh`, invalidates the cache.
+
+    The header and payload dicts are not tracked: once the message was
+    serialized they must be treated as frozen, or :meth:`invalidate` must be
+    called after changing them in place.
+    """
 
     def __init__(self, payload, header=None, **kwargs):
+        self.invalidate()
         super().__init__()
 
         if header:
@@ -81,6 +93,46 @@ class Message(dict):
     def __str__(self):
         return json.dumps(self, indent=2)
 
+    def __setitem__(self, key, value):
+        self.invalidate()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.invalidate()
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self.invalidate()
+        super().update(*args, **kwargs)
+
+    def pop(self, *args):
+        self.invalidate()
+        return super().pop(*args)
+
+    def popitem(self):
+        self.invalidate()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.invalidate()
+        return super().setdefault(key, default)
+
+    def clear(self):
+        self.invalidate()
+        super().clear()
+
+    def invalidate(self):
+        """Discards the cached serialized message
+        """
+        self._json = None
+
+    def to_json(self):
+        """Returns the message as a JSON string, serializing it only once
+        """
+        if self._json is None:
+            self._json = json.dumps(self)
+        return self._json
+
     @property
     def type(self):
         if self.get('header'):
@@ -100,6 +152,12 @@ class Message(dict):
     def timestamp(self):
         return self.get('header').get('timestamp')
 
+    @classmethod
+    def from_dict(cls, msg_dict):
+        msg = cls(msg_dict.get('payload'), msg_dict.get('header'))
+        msg.update(msg_dict)
+        return msg
+
     @classmethod
     def from_model(cls, model, **kwargs):
         meta_model_prefix = kwargs.get('meta_model_prefix')
@@ -111,6 +169,7 @@ class Message(dict):
         """
         self['header']['timestamp'] = TimeStamp().to_str()
         self['header']['msgId'] = str(generate_uuid())
+        self.invalidate()
 
 
 class MessageFactory: